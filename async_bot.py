@@ -0,0 +1,15 @@
+import os
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from bot import TOKEN, TELEGRAM_API_URL
+
+# Асинхронный режим (python main.py --async): все апдейты обрабатываются в одном цикле событий,
+# а одновременные запросы к Bot API ограничены только пулом соединений aiohttp
+ASYNC_REQUEST_LIMIT = int(os.getenv("ASYNC_REQUEST_LIMIT", 100))
+
+asyncio_helper.REQUEST_LIMIT = ASYNC_REQUEST_LIMIT
+if TELEGRAM_API_URL:
+    asyncio_helper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+    asyncio_helper.FILE_URL = TELEGRAM_API_URL + "/file/bot{0}/{1}"
+
+bot = AsyncTeleBot(TOKEN)
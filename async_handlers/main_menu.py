@@ -0,0 +1,23 @@
+from handlers.main_menu import MENU_CAPTION, MENU_PHOTO, main_menu_markup
+from utils.aio import async_router as router, async_views, blocking, send_photo
+from utils.messages import tracker
+from utils.storage import ensure_user
+
+
+async def show_main_menu(user_id, call_data, chat_id, message_id=None):
+    markup = main_menu_markup()
+    if call_data == 'main_new':
+        # пользователь впервые открывает меню - отправляем фото (по file_id, если уже загружали)
+        tracker.clear(chat_id, user_id)
+        return await send_photo(chat_id, MENU_PHOTO, caption=MENU_CAPTION,
+                                reply_markup=markup, parse_mode='html')
+    # пользователь возвращается к меню - редактируем сообщение
+    return await async_views.edit_caption(chat_id, message_id, caption=MENU_CAPTION, reply_markup=markup)
+
+
+@router.prefix('main_')
+async def callback_main(call):
+    await blocking(ensure_user, call.from_user.id, call.from_user.first_name,
+                   call.from_user.last_name)
+    await show_main_menu(call.from_user.id, call.data,
+                         call.message.chat.id, call.message.message_id)
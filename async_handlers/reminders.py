@@ -0,0 +1,15 @@
+from async_bot import bot
+from handlers.reminders import remind_reply
+from utils.aio import async_outbound, blocking
+from utils.messages import tracker
+
+
+@bot.message_handler(commands=['remind'])
+async def command_remind(message):
+    """
+    Включает или выключает напоминания о блоках (подписка пишется в файл - в пуле потоков).
+    """
+    chat_id = message.chat.id
+    text = await blocking(remind_reply, message.from_user.id, chat_id, message.text or '')
+    msg = await async_outbound.call(chat_id, bot.send_message, chat_id, text)
+    tracker.track(message.from_user.id, msg.message_id)
@@ -0,0 +1,183 @@
+from typing import Optional
+from async_bot import bot
+from handlers.schedule import DAYS_CUT, SCHEDULE_CAPTION, block_add_choice_markup, block_delete_choice_markup, \
+    day_actions_markup, day_grid_markup, render_day_text, session_day, select_day, begin_block_action, \
+    block_entry_step, undo_or_redo, change_result_text, free_reply, is_block_entry
+from utils.aio import async_outbound, async_router as router, async_views, blocking
+from utils.locks import serialized_by_user_async
+from utils.logger import logger
+from utils.messages import tracker
+from utils.schedule import copy_day, clear_day
+
+
+async def ask(user_id, chat_id, text):
+    """
+    Отправляет сообщение пользователю и сохраняет его ID через MessageTracker
+    """
+    msg = await async_outbound.call(chat_id, bot.send_message, chat_id, text)
+    tracker.track(user_id, msg.message_id)
+    return msg
+
+
+async def refresh_day_view(user_id: int, chat_id: int, message_id: int, day_cut: str):
+    """
+    Обновляет сообщение с расписанием дня day_cut и стандартными кнопками управления.
+    """
+    day = DAYS_CUT[day_cut]
+    try:
+        caption = await blocking(render_day_text, user_id, day)
+        await async_views.edit_caption(chat_id, message_id, caption=caption,
+                                       reply_markup=day_actions_markup(day_cut))
+    except Exception as e:
+        logger.warning(f'Не удалось обновить день {day} пользователя {user_id}: {e}')
+
+
+@router.route('schedule')
+async def callback_schedule(call):
+    """
+    Отображает меню выбора дня недели.
+    """
+    await async_views.edit_caption(call.message.chat.id, call.message.message_id,
+                                   caption=SCHEDULE_CAPTION, reply_markup=day_grid_markup())
+
+
+async def resolve_day(call, day_cut: str = '') -> Optional[str]:
+    """
+    День кнопки (сессия читается, только если дня нет в callback_data).
+    Если день неизвестен, снова показывает выбор дня и возвращает None.
+    """
+    if day_cut not in DAYS_CUT:
+        day_cut = await blocking(session_day, call.from_user.id)
+    if day_cut is None:
+        await callback_schedule(call)
+    return day_cut
+
+
+@router.route(*DAYS_CUT)
+@serialized_by_user_async
+async def callback_day(call):
+    """
+    Обработчик кнопки выбора дня недели.
+    """
+    caption = await blocking(select_day, call.from_user.id, call.data, call.message.message_id)
+    await async_views.edit_caption(call.message.chat.id, call.message.message_id,
+                                   caption=caption, reply_markup=day_actions_markup(call.data))
+
+
+@router.route('block_add_choice')
+async def callback_block_add_choice(call, day_cut=''):
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    await async_views.edit_reply_markup(call.message.chat.id, call.message.message_id,
+                                        reply_markup=block_add_choice_markup(day_cut))
+
+
+@router.route('block_delete_choice')
+async def callback_block_delete_choice(call, day_cut=''):
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    await async_views.edit_reply_markup(call.message.chat.id, call.message.message_id,
+                                        reply_markup=block_delete_choice_markup(day_cut))
+
+
+@router.route('block_copy')
+async def callback_block_copy(call, day_cut=''):
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    await async_views.edit_reply_markup(
+        call.message.chat.id, call.message.message_id,
+        reply_markup=day_grid_markup(f'block_add_choice:{day_cut}', suffix=f'_copy:{day_cut}'))
+
+
+@router.route('day_clear')
+@serialized_by_user_async
+async def callback_day_clear(call, day_cut=''):
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    await blocking(clear_day, call.from_user.id, DAYS_CUT[day_cut])
+    await refresh_day_view(call.from_user.id, call.message.chat.id, call.message.message_id, day_cut)
+
+
+@router.route('day_undo', 'day_redo')
+@serialized_by_user_async
+async def callback_day_undo(call, day_cut=''):
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    nothing = await blocking(undo_or_redo, call.from_user.id, DAYS_CUT[day_cut],
+                             call.data.startswith('day_redo'))
+    if nothing is None:
+        await refresh_day_view(call.from_user.id, call.message.chat.id, call.message.message_id, day_cut)
+    else:
+        await async_outbound.call(call.message.chat.id, bot.answer_callback_query, call.id, nothing)
+
+
+@router.route(*(f'{cut}_copy' for cut in DAYS_CUT))
+@serialized_by_user_async
+async def callback_day_copy(call, day_cut=''):
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    day_from = DAYS_CUT[call.data.partition(':')[0].removesuffix('_copy')]
+    done = await blocking(copy_day, call.from_user.id, DAYS_CUT[day_cut], day_from)
+    await ask(call.from_user.id, call.message.chat.id, change_result_text(done))
+    tracker.clear(call.message.chat.id, call.from_user.id)
+    await refresh_day_view(call.from_user.id, call.message.chat.id, call.message.message_id, day_cut)
+
+
+async def start_block_action(call, action: str, day_cut: str) -> None:
+    day_cut = await resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    prompt = await blocking(begin_block_action, call.from_user.id, action, day_cut, call.message.message_id)
+    await ask(call.from_user.id, call.message.chat.id, prompt)
+
+
+@router.route('block_add')
+@serialized_by_user_async
+async def callback_block_add(call, day_cut=''):
+    await start_block_action(call, 'add', day_cut)
+
+
+@router.route('block_add_bulk')
+@serialized_by_user_async
+async def callback_block_add_bulk(call, day_cut=''):
+    await start_block_action(call, 'add_bulk', day_cut)
+
+
+@router.route('block_edit')
+@serialized_by_user_async
+async def callback_block_edit(call, day_cut=''):
+    await start_block_action(call, 'edit', day_cut)
+
+
+@router.route('block_delete')
+@serialized_by_user_async
+async def callback_block_delete(call, day_cut=''):
+    await start_block_action(call, 'delete', day_cut)
+
+
+@bot.message_handler(commands=['free'])
+async def command_free(message):
+    text = await blocking(free_reply, message.from_user, message.text or '')
+    await ask(message.from_user.id, message.chat.id, text)
+
+
+@bot.message_handler(func=is_block_entry)
+@serialized_by_user_async
+async def handle_block_entry(message):
+    """
+    Шаг сценария блоков: состояние и хранилище - в пуле потоков, ответы - через AsyncTeleBot.
+    """
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    replies, day_view = await blocking(block_entry_step, user_id, message.message_id, message.text)
+    for text in replies:
+        await ask(user_id, chat_id, text)
+    if day_view is not None:
+        tracker.clear(chat_id, user_id)
+        await refresh_day_view(user_id, chat_id, day_view[1], day_view[0])
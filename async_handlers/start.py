@@ -0,0 +1,15 @@
+from async_bot import bot
+from handlers.start import start_markup, start_text
+from utils.aio import async_outbound, blocking
+from utils.messages import tracker
+from utils.storage import ensure_user
+
+
+@bot.message_handler(commands=['start'])
+async def start(message):
+    await blocking(ensure_user, message.from_user.id,
+                   message.from_user.first_name, message.from_user.last_name)
+    msg = await async_outbound.call(message.chat.id, bot.send_message, message.chat.id,
+                                    start_text(message.from_user.first_name),
+                                    reply_markup=start_markup())
+    tracker.track(message.from_user.id, msg.message_id)
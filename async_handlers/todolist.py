@@ -0,0 +1,90 @@
+from async_bot import bot
+from handlers.todolist import TODO_ADD_PROMPT, parse_page_args, todo_page, begin_todo_add, todo_entry_step, \
+    is_todo_entry
+from utils.aio import async_outbound, async_router as router, async_views, blocking
+from utils.locks import serialized_by_user_async
+from utils.logger import logger
+from utils.messages import tracker
+from utils.storage import ensure_user
+from utils.todolist import OPEN, toggle_item, complete_all, clear_done
+
+
+async def show_todo_page(user_id: int, chat_id: int, message_id: int, view: str = OPEN, page: int = 0) -> None:
+    """
+    Показывает страницу списка дел в сообщении меню (индекс дел строится в пуле потоков).
+    """
+    caption, markup = await blocking(todo_page, user_id, view, page)
+    await async_views.edit_caption(chat_id, message_id, caption=caption, reply_markup=markup)
+
+
+@router.route('todolist')
+async def callback_todolist(call):
+    await blocking(ensure_user, call.from_user.id, call.from_user.first_name, call.from_user.last_name)
+    await show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id)
+
+
+@router.route('todo_page')
+async def callback_todo_page(call, *args):
+    await show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                         *parse_page_args(*args))
+
+
+@router.route('todo_noop')
+async def callback_todo_noop(call):
+    """Кнопка с номером страницы ничего не делает."""
+
+
+@router.route('todo_toggle')
+@serialized_by_user_async
+async def callback_todo_toggle(call, view=OPEN, page='0', item_id=''):
+    if item_id.isdigit():
+        await blocking(toggle_item, call.from_user.id, int(item_id))
+    await show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                         *parse_page_args(view, page))
+
+
+@router.route('todo_complete_all')
+@serialized_by_user_async
+async def callback_todo_complete_all(call, *args):
+    await blocking(complete_all, call.from_user.id)
+    await show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                         *parse_page_args(*args))
+
+
+@router.route('todo_clear_done')
+@serialized_by_user_async
+async def callback_todo_clear_done(call, *args):
+    await blocking(clear_done, call.from_user.id)
+    await show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                         *parse_page_args(*args))
+
+
+@router.route('todo_add')
+@serialized_by_user_async
+async def callback_todo_add(call, *args):
+    await blocking(begin_todo_add, call.from_user.id, call.message.message_id, *parse_page_args(*args))
+    msg = await async_outbound.call(call.message.chat.id, bot.send_message, call.message.chat.id, TODO_ADD_PROMPT)
+    tracker.track(call.from_user.id, msg.message_id)
+
+
+@bot.message_handler(func=is_todo_entry)
+@serialized_by_user_async
+async def handle_todo_entry(message):
+    """
+    Добавляет дела из сообщения одной записью и обновляет страницу списка.
+    """
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    warning, data = await blocking(todo_entry_step, user_id, message.message_id, message.text)
+    if data is None:
+        msg = await async_outbound.call(chat_id, bot.send_message, chat_id, warning)
+        tracker.track(user_id, msg.message_id)
+        return
+    if warning is not None:
+        await async_outbound.call(chat_id, bot.send_message, chat_id, warning)
+    tracker.clear(chat_id, user_id)
+    if data.get('message_id'):
+        try:
+            await show_todo_page(user_id, chat_id, data['message_id'], data.get('view', OPEN), data.get('page', 0))
+        except Exception as e:
+            logger.warning(f'Не удалось обновить список дел пользователя {user_id}: {e}')
@@ -1,9 +1,21 @@
 import telebot
 import os
 from dotenv import load_dotenv
+from telebot import apihelper
 
 load_dotenv()
 
 TOKEN = os.getenv("BOT_TOKEN")
+# Размер пула потоков обработки апдейтов. Обработчики синхронные и держат поток
+# на время запросов к Bot API и к хранилищу, поэтому для большего числа одновременных
+# пользователей увеличивают BOT_NUM_THREADS (или число процессов, BOT_SHARDS)
+NUM_THREADS = int(os.getenv("BOT_NUM_THREADS", 2))
+# Адрес Bot API; для нагрузочных тестов - локальный фейковый сервер (tools/fake_telegram.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
 
-bot = telebot.TeleBot(TOKEN)
+if TELEGRAM_API_URL:
+    apihelper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+    apihelper.FILE_URL = TELEGRAM_API_URL + "/file/bot{0}/{1}"
+
+# Классовые middleware нужны для проверки доступа до обработчиков (utils/access.py)
+bot = telebot.TeleBot(TOKEN, num_threads=NUM_THREADS, use_class_middlewares=True)
@@ -1,9 +1,16 @@
 from telebot import types
-from main import bot
 from utils.storage import ensure_user
 from utils.messages import tracker
+from utils.media import media_cache
+from utils.keyboards import memoized_markup
+from utils.render import views
+from utils.router import router
 
+MENU_PHOTO = 'img/menu.jpg'
+MENU_CAPTION = 'Главное меню.'
 
+
+@memoized_markup
 def main_menu_markup() -> types.InlineKeyboardMarkup:
     markup = types.InlineKeyboardMarkup()
     markup.add(
@@ -16,28 +23,26 @@ def main_menu_markup() -> types.InlineKeyboardMarkup:
 def show_main_menu(user_id, call_data, chat_id, message_id=None):
     markup = main_menu_markup()
     if call_data == 'main_new':
-        # пользователь впервые открывает меню - загружаем фото
+        # пользователь впервые открывает меню - отправляем фото (по file_id, если уже загружали)
         tracker.clear(chat_id, user_id)
-        with open('img/menu.jpg', 'rb') as photo:
-            return bot.send_photo(
-                caption='Главное меню.',
-                chat_id=chat_id,
-                photo=photo,
-                reply_markup=markup,
-                parse_mode='html'
-            )
-    else:
-        # пользователь возвращается к меню - редактируем сообщение
-        return bot.edit_message_caption(
-            caption='Главное меню.',
-            chat_id=chat_id,
-            message_id=message_id,
+        return media_cache.send_photo(
+            chat_id,
+            MENU_PHOTO,
+            caption=MENU_CAPTION,
             reply_markup=markup,
             parse_mode='html'
         )
+    else:
+        # пользователь возвращается к меню - редактируем сообщение
+        return views.edit_caption(
+            chat_id,
+            message_id,
+            caption=MENU_CAPTION,
+            reply_markup=markup
+        )
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('main_'))
+@router.prefix('main_')
 def callback_main(call):
     ensure_user(call.from_user.id, call.from_user.first_name,
                 call.from_user.last_name)
@@ -0,0 +1,32 @@
+from main import bot
+from utils.messages import tracker
+from utils.outbound import outbound
+from utils.reminders import reminders, REMINDER_DEFAULT_MINUTES, REMINDER_MAX_MINUTES
+
+
+def remind_reply(user_id: int, chat_id: int, text: str) -> str:
+    """
+    Включает или выключает напоминания по аргументам /remind и возвращает ответ.
+    """
+    args = text.split()[1:]
+    if args and args[0].lower() in ('off', 'выкл'):
+        if reminders.unsubscribe(user_id):
+            return '🔕 Напоминания выключены.'
+        return 'Напоминания и так выключены.'
+    if not args or (args[0].isdigit() and int(args[0]) <= REMINDER_MAX_MINUTES):
+        minutes = int(args[0]) if args else REMINDER_DEFAULT_MINUTES
+        reminders.subscribe(user_id, chat_id, minutes)
+        return f'🔔 Буду напоминать о блоках за {minutes} мин. до начала.'
+    return f'⚠️ Использование: /remind [минуты до {REMINDER_MAX_MINUTES}] или /remind off'
+
+
+@bot.message_handler(commands=['remind'])
+def command_remind(message):
+    """
+    Включает или выключает напоминания о блоках.
+    /remind - за 15 минут (по умолчанию), /remind 30 - за 30 минут, /remind off - выключить.
+    """
+    chat_id = message.chat.id
+    text = remind_reply(message.from_user.id, chat_id, message.text or '')
+    msg = outbound.call(chat_id, bot.send_message, chat_id, text)
+    tracker.track(message.from_user.id, msg.message_id)
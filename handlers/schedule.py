@@ -1,12 +1,21 @@
+import os
 from enum import IntEnum
 from telebot import types
-from typing import Callable
+from typing import Callable, List, Optional, Tuple
 from main import bot
-from utils.storage import load_users, save_users
-from utils.session import set_user_session, get_user_session, clear_user_state
-from utils.validation import normalize_time, is_end_after_start
+from utils.session import set_user_session, get_user_session, clear_user_state, has_active_action, update_session
+from utils.validation import normalize_time, is_end_after_start, minutes_to_time, time_to_minutes, parse_block_line
 from utils.messages import tracker
-from utils.schedule import add_block, edit_block, delete_block, copy_day
+from utils.locks import serialized_by_user
+from utils.outbound import outbound
+from utils.keyboards import memoized_markup
+from utils.render import RenderCache, views
+from utils.router import router
+from utils.logger import logger
+from utils.model import Block
+from utils.schedule import add_block, add_blocks, edit_block, delete_block, copy_day, clear_day, get_day, \
+    day_version, find_conflicts, find_batch_conflicts, free_slots, undo_day, redo_day
+from utils.storage import ensure_user
 
 
 DAYS_RU = {
@@ -30,33 +39,71 @@ DAYS_CUT = {
 }
 
 
+# Поиск свободного времени (/free): окно дня и минимальная длина промежутка по умолчанию
+FREE_DAY_START = time_to_minutes(os.getenv('FREE_DAY_START', '08:00'))
+FREE_DAY_END = time_to_minutes(os.getenv('FREE_DAY_END', '22:00')) or 24 * 60
+FREE_MIN_DURATION = int(os.getenv('FREE_MIN_DURATION', 30))
+
+# /free пн, /free mon, /free понедельник
+DAYS_BY_NAME = {name.lower(): day for day, name in DAYS_RU.items()}
+DAYS_BY_NAME.update(zip(('пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс'), DAYS_RU))
+DAYS_BY_NAME.update({cut.removeprefix('day_'): day for cut, day in DAYS_CUT.items()})
+
+
+# Действия сценария блоков; остальные (например, todo_add) обрабатывают свои модули
+BLOCK_ACTIONS = ('add', 'add_bulk', 'edit', 'delete')
+
+
 class BlockStep(IntEnum):
     DELETE = -1
     ASK_INDEX = 0
     ASK_TITLE = 1
     ASK_START = 2
     ASK_END = 3
+    ASK_BULK = 4
+
+
+# С какого шага начинается действие и что спросить у пользователя
+BLOCK_ACTION_STEPS = {
+    'add': BlockStep.ASK_TITLE,
+    'add_bulk': BlockStep.ASK_BULK,
+    'edit': BlockStep.ASK_INDEX,
+    'delete': BlockStep.DELETE,
+}
+BLOCK_ACTION_PROMPTS = {
+    'add': 'Введите название блока (макс. 20 символов):',
+    'add_bulk': 'Введите блоки, по одному на строку:\n'
+                '09:00-10:30 Лекция\n'
+                '11:00-12:00 Спортзал',
+    'edit': 'Введите номер блока, который нужно изменить:',
+    'delete': 'Введите номер блока, который нужно удалить:',
+}
+
+# Сколько ошибок пакетного ввода показывать в одном ответе
+BULK_ERRORS_SHOWN = 20
+
+SCHEDULE_CAPTION = 'Выбери день недели:'
+FREE_USAGE = '⚠️ Использование: /free [день] [минимум минут], например /free ср 60'
 
 
 def ask(user_id, chat_id, text):
     """
     Отправляет сообщение пользователю и сохраняет его ID через MessageTracker
     """
-    msg = bot.send_message(chat_id, text)
+    msg = outbound.call(chat_id, bot.send_message, chat_id, text)
     tracker.track(user_id, msg.message_id)
     return msg
 
 
+def change_result_text(done: bool) -> str:
+    return '✅ Действие выполнено успешно.' if done else '❌ Не удалось выполнить действие'
+
+
 def is_change_action_complete(user_id: int, chat_id: int, check_func: Callable[..., bool]) -> None:
     """
     check_func - любая функция, возвращающая bool.
     """
-    if check_func:
-        ask(user_id, chat_id,
-            f'✅ Действие выполнено успешно.')
-    else:
-        ask(user_id, chat_id,
-            f'❌ Не удалось выполнить действие')
+    ask(user_id, chat_id, change_result_text(check_func()))
     tracker.clear(chat_id, user_id)
 
 
@@ -88,190 +135,285 @@ def build_day_buttons(back_to: str = 'main_back', suffix: str = ''):
     return rows
 
 
-def day_actions_markup(back_to: str = 'schedule') -> types.InlineKeyboardMarkup:
+@memoized_markup
+def day_grid_markup(back_to: str = 'main_back', suffix: str = '') -> types.InlineKeyboardMarkup:
+    """
+    Клавиатура выбора дня недели (строится один раз на каждую пару back_to/suffix).
+    """
+    markup = types.InlineKeyboardMarkup()
+    for row in build_day_buttons(back_to, suffix):
+        markup.row(*row)
+    return markup
+
+
+@memoized_markup
+def block_add_choice_markup(day_cut: str) -> types.InlineKeyboardMarkup:
+    """
+    Подменю 'Добавить': добавить блок, несколько блоков сразу или скопировать день.
+    day_cut - callback_data выбранного дня: он передаётся в кнопки, "Назад" ведёт к нему.
+    """
+    markup = types.InlineKeyboardMarkup()
+    markup.add(
+        types.InlineKeyboardButton(
+            '➕ Добавить блок', callback_data=f'block_add:{day_cut}'),
+        types.InlineKeyboardButton(
+            '📋 Копировать день', callback_data=f'block_copy:{day_cut}')
+    )
+    markup.add(
+        types.InlineKeyboardButton(
+            '📝 Несколько блоков', callback_data=f'block_add_bulk:{day_cut}')
+    )
+    markup.add(
+        types.InlineKeyboardButton('⬅️ Назад', callback_data=day_cut)
+    )
+    return markup
+
+
+@memoized_markup
+def block_delete_choice_markup(day_cut: str) -> types.InlineKeyboardMarkup:
+    """
+    Подменю 'Удалить': удалить блок или очистить весь день.
+    day_cut - callback_data выбранного дня: он передаётся в кнопки, "Назад" ведёт к нему.
+    """
+    markup = types.InlineKeyboardMarkup()
+    markup.add(
+        types.InlineKeyboardButton(
+            '✖️ Удалить блок', callback_data=f'block_delete:{day_cut}'),
+        types.InlineKeyboardButton(
+            '🧹 Очистить день', callback_data=f'day_clear:{day_cut}')
+    )
+    markup.add(
+        types.InlineKeyboardButton('⬅️ Назад', callback_data=day_cut)
+    )
+    return markup
+
+
+@memoized_markup
+def day_actions_markup(day_cut: str, back_to: str = 'schedule') -> types.InlineKeyboardMarkup:
     """
     Возвращает список кнопок редактирования для выбранного дня недели + кнопку "Назад".
+    День передаётся в callback_data кнопок, поэтому клавиатура работает
+    и после того, как сессия пользователя истекла или бот перезапустился.
     """
     markup = types.InlineKeyboardMarkup(row_width=2)
     markup.add(
         types.InlineKeyboardButton(
-            '➕ Добавить', callback_data='block_add_choice'),
+            '➕ Добавить', callback_data=f'block_add_choice:{day_cut}'),
         types.InlineKeyboardButton(
-            '✏️ Редактировать', callback_data='block_edit')
+            '✏️ Редактировать', callback_data=f'block_edit:{day_cut}')
     )
     markup.add(
         types.InlineKeyboardButton(
-            '✖️ Удалить', callback_data='block_delete_choice'),
+            '✖️ Удалить', callback_data=f'block_delete_choice:{day_cut}'),
         types.InlineKeyboardButton('⬅️ Назад', callback_data=back_to)
     )
+    markup.add(
+        types.InlineKeyboardButton('↩️ Отменить', callback_data=f'day_undo:{day_cut}'),
+        types.InlineKeyboardButton('↪️ Повторить', callback_data=f'day_redo:{day_cut}')
+    )
     return markup
 
 
-def format_day_text(day_name: str, day_data: list) -> str:
+def format_day_text(day_name: str, day_data: List[Block]) -> str:
     """
     Форматирует текст выбранного дня
     """
-    text = f'📅 <b>{day_name}</b>:\n<pre>'
-    for i, block in enumerate(day_data, 1):
-        text += f'{i}. {block["title"]}\n⏰ {block["start"]} – {block["end"]}\n\n'
-    text += '</pre>'
-    return text
+    blocks = ''.join(
+        f'{i}. {block.title}\n⏰ {minutes_to_time(block.start)} – {minutes_to_time(block.end)}\n\n'
+        for i, block in enumerate(day_data, 1))
+    return f'📅 <b>{day_name}</b>:\n<pre>{blocks}</pre>'
+
+
+day_texts = RenderCache()
 
 
-def refresh_day_view(user_id: int, chat_id: int, message_id: int):
+def render_day_text(user_id: int, day: str) -> str:
     """
-    Обновляет сообщение с расписанием выбранного дня
+    Текст дня из кэша; перерисовывается только после изменения дня.
+    """
+    return day_texts.get((user_id, day), day_version(user_id, day),
+                         lambda: format_day_text(DAYS_RU[day], get_day(user_id, day)))
+
+
+def refresh_day_view(user_id: int, chat_id: int, message_id: int, day_cut: str):
+    """
+    Обновляет сообщение с расписанием дня day_cut
     и стандартными кнопками управления.
+    Если содержимое не изменилось, запрос в Telegram не отправляется.
     """
-    users = load_users()
-    state_day = get_user_session(user_id, 'day')
-    day = DAYS_CUT[state_day]
-    day_name = DAYS_RU[day]
-    day_data = users[str(user_id)]['schedule'][day]
+    day = DAYS_CUT[day_cut]
     try:
-        bot.edit_message_caption(
-            caption=format_day_text(day_name, day_data),
-            chat_id=chat_id,
-            message_id=message_id,
-            reply_markup=day_actions_markup(back_to='schedule'),
-            parse_mode='html'
-        )
-    except:
-        pass
+        views.edit_caption(chat_id, message_id,
+                           caption=render_day_text(user_id, day),
+                           reply_markup=day_actions_markup(day_cut))
+    except Exception as e:
+        logger.warning(f'Не удалось обновить день {day} пользователя {user_id}: {e}')
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'schedule')
+@router.route('schedule')
 def callback_schedule(call):
     """
     Отображает меню выбора дня недели.
     """
-    markup = types.InlineKeyboardMarkup()
-    for row in build_day_buttons():
-        markup.row(*row)
-    bot.edit_message_caption(
-        caption='Выбери день недели:',
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id,
-        reply_markup=markup,
-        parse_mode='html'
+    views.edit_caption(
+        call.message.chat.id,
+        call.message.message_id,
+        caption=SCHEDULE_CAPTION,
+        reply_markup=day_grid_markup()
     )
 
 
-@bot.callback_query_handler(func=lambda call: call.data in DAYS_CUT.keys())
+def session_day(user_id: int, day_cut: str = '') -> Optional[str]:
+    """
+    Возвращает день кнопки: из callback_data, а для клавиатур, отправленных
+    до появления дня в callback_data, - из сессии. None - день неизвестен (сессия истекла).
+    """
+    if day_cut not in DAYS_CUT:
+        day_cut = get_user_session(user_id, 'day')
+    return day_cut if day_cut in DAYS_CUT else None
+
+
+def resolve_day(call, day_cut: str = '') -> Optional[str]:
+    """
+    День кнопки (см. session_day). Если день неизвестен, снова показывает выбор дня и возвращает None.
+    """
+    day_cut = session_day(call.from_user.id, day_cut)
+    if day_cut is None:
+        callback_schedule(call)
+    return day_cut
+
+
+def select_day(user_id: int, day_cut: str, message_id: int) -> str:
+    """
+    Сохраняет выбранный день и ID "основного" сообщения с расписанием.
+    Возвращает текст дня.
+    """
+    with update_session(user_id) as state:
+        state['day'] = day_cut
+        state['day_message_id'] = message_id
+    return render_day_text(user_id, DAYS_CUT[day_cut])
+
+
+@router.route(*DAYS_CUT)
+@serialized_by_user
 def callback_day(call):
     """
     Обработчик кнопки выбора дня недели.
     Сохраняет выбранный день и обновляет сообщение с расписанием.
     """
-    set_user_session(call.from_user.id, 'day', call.data)
-    # Сохраняем ID "основного" сообщения с расписанием
-    set_user_session(call.from_user.id, 'day_message_id',
-                     call.message.message_id)
-
-    day_name = DAYS_RU.get(DAYS_CUT[call.data], 'Неизвестный день')
-    users = load_users()
-    day_data = users[str(call.from_user.id)]['schedule'][DAYS_CUT[call.data]]
-
-    bot.edit_message_caption(
-        caption=format_day_text(day_name, day_data),
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id,
-        reply_markup=day_actions_markup(back_to='schedule'),
-        parse_mode='html'
+    views.edit_caption(
+        call.message.chat.id,
+        call.message.message_id,
+        caption=select_day(call.from_user.id, call.data, call.message.message_id),
+        reply_markup=day_actions_markup(call.data)
     )
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'block_add_choice')
-def callback_block_add_choice(call):
+@router.route('block_add_choice')
+def callback_block_add_choice(call, day_cut=''):
     """
     Обработчик кнопки 'Добавить'.
     Отображает подменю: добавить блок или скопировать день.
     """
-    markup = types.InlineKeyboardMarkup()
-    markup.add(
-        types.InlineKeyboardButton(
-            '➕ Добавить блок', callback_data='block_add'),
-        types.InlineKeyboardButton(
-            '📋 Копировать день', callback_data='block_copy')
-    )
-    markup.add(
-        types.InlineKeyboardButton('⬅️ Назад', callback_data=get_user_session(
-            call.from_user.id, 'day'))
-    )
-
-    bot.edit_message_reply_markup(
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id,
-        reply_markup=markup
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    views.edit_reply_markup(
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=block_add_choice_markup(day_cut)
     )
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'block_delete_choice')
-def callback_block_delete_choice(call):
+@router.route('block_delete_choice')
+def callback_block_delete_choice(call, day_cut=''):
     """
     Обработчик кнопки 'Удалить'.
     Отображает подменю: удалить блок или очистить весь день.
     """
-    markup = types.InlineKeyboardMarkup()
-    markup.add(
-        types.InlineKeyboardButton(
-            '✖️ Удалить блок', callback_data='block_delete'),
-        types.InlineKeyboardButton(
-            '🧹 Очистить день', callback_data='day_clear')
-    )
-    markup.add(
-        types.InlineKeyboardButton('⬅️ Назад', callback_data=get_user_session(
-            call.from_user.id, 'day'))
-    )
-
-    bot.edit_message_reply_markup(
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id,
-        reply_markup=markup
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    views.edit_reply_markup(
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=block_delete_choice_markup(day_cut)
     )
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'block_copy')
-def callback_block_copy(call):
+@router.route('block_copy')
+def callback_block_copy(call, day_cut=''):
     """
     Обработчик кнопки 'Копировать день'.
     Отображает список дней для выбора источника копирования.
     """
-    markup = types.InlineKeyboardMarkup()
-    for row in build_day_buttons('block_add_choice', suffix='_copy'):
-        markup.row(*row)
-
-    bot.edit_message_reply_markup(
-        chat_id=call.message.chat.id,
-        message_id=call.message.message_id,
-        reply_markup=markup,
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    views.edit_reply_markup(
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=day_grid_markup(f'block_add_choice:{day_cut}', suffix=f'_copy:{day_cut}'),
     )
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'day_clear')
-def callback_day_clear(call):
+@router.route('day_clear')
+@serialized_by_user
+def callback_day_clear(call, day_cut=''):
     """
     Обработчик кнопки 'Очистить день'.
     Удаляет все блоки выбранного дня и обновляет сообщение.
     """
-    users = load_users()
-    day = DAYS_CUT[get_user_session(call.from_user.id, 'day')]
-    users[str(call.from_user.id)]['schedule'][day] = []
-    save_users(users)
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    clear_day(call.from_user.id, DAYS_CUT[day_cut])
     refresh_day_view(call.from_user.id, call.message.chat.id,
-                     call.message.message_id)
+                     call.message.message_id, day_cut)
+
 
+@router.route('day_undo', 'day_redo')
+@serialized_by_user
+def callback_day_undo(call, day_cut=''):
+    """
+    Обработчик кнопок 'Отменить' и 'Повторить'.
+    Возвращает выбранный день к состоянию до последнего изменения (или отмены).
+    """
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    nothing = undo_or_redo(call.from_user.id, DAYS_CUT[day_cut], call.data.startswith('day_redo'))
+    if nothing is None:
+        refresh_day_view(call.from_user.id, call.message.chat.id,
+                         call.message.message_id, day_cut)
+    else:
+        outbound.call(call.message.chat.id, bot.answer_callback_query, call.id, nothing)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('day_') and call.data.endswith('_copy'))
-def callback_day_copy(call):
+
+def undo_or_redo(user_id: int, day: str, redo: bool) -> Optional[str]:
+    """
+    Отменяет (или повторяет) изменение дня. Возвращает None,
+    а если отменять (повторять) нечего - текст подсказки.
+    """
+    if redo:
+        return None if redo_day(user_id, day) else 'Нечего повторять'
+    return None if undo_day(user_id, day) else 'Нечего отменять'
+
+
+@router.route(*(f'{cut}_copy' for cut in DAYS_CUT))
+@serialized_by_user
+def callback_day_copy(call, day_cut=''):
     """
     Обработчик копирования дня.
     Копирует содержимое одного дня расписания в другой.
     """
     # День, выбранный ранее
-    day_to = DAYS_CUT[get_user_session(call.from_user.id, 'day')]
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    day_to = DAYS_CUT[day_cut]
     # Откуда копируем
-    day_from = DAYS_CUT[call.data.removesuffix('_copy')]
+    day_from = DAYS_CUT[call.data.partition(':')[0].removesuffix('_copy')]
 
     is_change_action_complete(
         call.from_user.id,
@@ -282,153 +424,260 @@ def callback_day_copy(call):
         )
     )
     refresh_day_view(call.from_user.id, call.message.chat.id,
-                     call.message.message_id)
+                     call.message.message_id, day_cut)
+
+
+def begin_block_action(user_id: int, action: str, day_cut: str, message_id: int) -> str:
+    """
+    Переводит пользователя в состояние действия action (add, add_bulk, edit, delete)
+    с днём day_cut. Возвращает первый вопрос сценария.
+    """
+    with update_session(user_id) as state:
+        state.update({
+            'action': action,
+            'day': day_cut,
+            'day_message_id': message_id,
+            'step': BLOCK_ACTION_STEPS[action],
+            'data': {'title': '', 'start': '', 'end': '', 'index': ''},
+        })
+    return BLOCK_ACTION_PROMPTS[action]
+
+
+def start_block_action(call, action: str, day_cut: str) -> None:
+    day_cut = resolve_day(call, day_cut)
+    if day_cut is None:
+        return
+    ask(call.from_user.id, call.message.chat.id,
+        begin_block_action(call.from_user.id, action, day_cut, call.message.message_id))
 
 
 # Добавление блока
-@bot.callback_query_handler(func=lambda call: call.data == 'block_add')
-def callback_block_add(call):
+@router.route('block_add')
+@serialized_by_user
+def callback_block_add(call, day_cut=''):
     """
     Обработчик кнопки 'Добавить блок'.
     Переводит пользователя в состояние добавления блока.
     """
-    user_id = call.from_user.id
-    day = get_user_session(user_id, 'day')
-    day_message_id = get_user_session(user_id, 'day_message_id')
-    set_user_session(user_id, 'state', {
-        'action': 'add',
-        'day': day,
-        'day_message_id': day_message_id,
-        'step': BlockStep.ASK_TITLE,
-        'data': {'title': '', 'start': '', 'end': '', 'index': ''},
-    })
-    ask(user_id, call.message.chat.id,
-        'Введите название блока (макс. 20 символов):')
+    start_block_action(call, 'add', day_cut)
+
+
+# Добавление нескольких блоков одним сообщением
+@router.route('block_add_bulk')
+@serialized_by_user
+def callback_block_add_bulk(call, day_cut=''):
+    """
+    Обработчик кнопки 'Несколько блоков'.
+    Переводит пользователя в состояние пакетного ввода блоков.
+    """
+    start_block_action(call, 'add_bulk', day_cut)
+
+
+def parse_bulk_blocks(user_id: int, day: str, text: str) -> Tuple[List[Block], List[str]]:
+    """
+    Разбирает блоки пакетного ввода и проверяет их все до добавления.
+    Возвращает блоки и ошибки по строкам (номера строк - как в сообщении):
+    формат и время строки, пересечения с блоками дня и между строками пакета.
+    """
+    numbers, blocks, errors = [], [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            blocks.append(Block.parse(*parse_block_line(line)))
+            numbers.append(number)
+        except ValueError as e:
+            errors.append((number, str(e)))
+    for number, conflicts in zip(numbers, find_batch_conflicts(user_id, day, blocks)):
+        if conflicts:
+            busy = ', '.join(f'«{block.title}» {minutes_to_time(block.start)} – {minutes_to_time(block.end)}'
+                             for block in conflicts[:3])
+            errors.append((number, f'пересекается с {busy}'))
+    return blocks, [f'строка {number}: {error}' for number, error in sorted(errors)]
 
 
 # Редактирование блока
-@bot.callback_query_handler(func=lambda call: call.data == 'block_edit')
-def callback_block_edit(call):
+@router.route('block_edit')
+@serialized_by_user
+def callback_block_edit(call, day_cut=''):
     """
     Обработчик кнопки 'Редактировать блок'.
     Переводит пользователя в состояние редактирования блока.
     """
-    user_id = call.from_user.id
-    day = get_user_session(user_id, 'day')
-    day_message_id = get_user_session(user_id, 'day_message_id')
-    set_user_session(user_id, 'state', {
-        'action': 'edit',
-        'day': day,
-        'day_message_id': day_message_id,
-        'step': BlockStep.ASK_INDEX,
-        'data': {'title': '', 'start': '', 'end': '', 'index': ''},
-    })
-    ask(user_id, call.message.chat.id,
-        'Введите номер блока, который нужно изменить:')
+    start_block_action(call, 'edit', day_cut)
 
 
 # Удаление блока
-@bot.callback_query_handler(func=lambda call: call.data == 'block_delete')
-def callback_block_delete(call):
+@router.route('block_delete')
+@serialized_by_user
+def callback_block_delete(call, day_cut=''):
     """
     Обработчик кнопки 'Удалить блок'.
     Переводит пользователя в состояние удаления блока.
     """
-    user_id = call.from_user.id
-    day = get_user_session(user_id, 'day')
-    day_message_id = get_user_session(user_id, 'day_message_id')
-    set_user_session(user_id, 'state', {
-        'action': 'delete',
-        'day': day,
-        'day_message_id': day_message_id,
-        'step': BlockStep.DELETE,
-        'data': {'title': '', 'start': '', 'end': '', 'index': ''},
-    })
-    ask(user_id, call.message.chat.id,
-        'Введите номер блока, который нужно удалить:')
+    start_block_action(call, 'delete', day_cut)
 
 
-# Обработка сообщений пользователя
-@bot.message_handler(func=lambda message: get_user_session(message.from_user.id, 'state') is not None and not message.text == '/start')
-def handle_block_entry(message):
+def format_free_slots(slots: dict) -> str:
     """
-    Обрабатывает текстовые сообщения пользователя
-    во время добавления, редактирования или удаления блока.
-    Выполняет пошаговый сценарий по состоянию (step).
+    Форматирует свободные промежутки по дням.
+    """
+    lines = []
+    for day, day_slots in slots.items():
+        lines.append(f'📅 {DAYS_RU[day]}:')
+        if day_slots:
+            lines.extend(f'  {minutes_to_time(start)} – {minutes_to_time(end)}'
+                         for start, end in day_slots)
+        else:
+            lines.append('  нет свободного времени')
+    return '\n'.join(lines)
+
+
+def parse_free_args(text: str):
+    """
+    Разбирает аргументы /free [день] [минуты].
+    Возвращает (дни, минимальная длина) или None, если аргументы некорректны.
+    """
+    days, min_duration = tuple(DAYS_RU), FREE_MIN_DURATION
+    for arg in text.split()[1:]:
+        arg = arg.lower()
+        if arg.isdigit():
+            min_duration = int(arg)
+        elif arg in DAYS_BY_NAME:
+            days = (DAYS_BY_NAME[arg],)
+        else:
+            return None
+    return days, min_duration
+
+
+def free_reply(from_user, text: str) -> str:
+    """
+    Ответ на /free: свободные промежутки или подсказка по аргументам.
+    """
+    args = parse_free_args(text)
+    if args is None:
+        return FREE_USAGE
+    days, min_duration = args
+    ensure_user(from_user.id, from_user.first_name, from_user.last_name)
+    slots = free_slots(from_user.id, days, min_duration, FREE_DAY_START, FREE_DAY_END)
+    return f'🕒 Свободное время (от {min_duration} мин.):\n{format_free_slots(slots)}'
+
+
+@bot.message_handler(commands=['free'])
+def command_free(message):
+    """
+    Показывает свободные промежутки дня или всей недели.
+    /free - вся неделя, /free ср 60 - среда, промежутки от часа.
+    """
+    ask(message.from_user.id, message.chat.id, free_reply(message.from_user, message.text or ''))
+
+
+def block_entry_step(user_id: int, message_id: int, text: str) -> Tuple[List[str], Optional[Tuple[str, int]]]:
+    """
+    Шаг сценария добавления, редактирования или удаления блока по состоянию (step),
+    без обращений к Telegram (общий для обоих режимов).
+    Возвращает ответы пользователю по порядку и, если действие завершено,
+    (день, ID сообщения с расписанием) для обновления расписания.
     """
-    user_id = message.from_user.id
-    chat_id = message.chat.id
     state = get_user_session(user_id, 'state')
+    if state.get('day') not in DAYS_CUT:
+        # сценарий начат клавиатурой без дня, а сессия с днём уже истекла
+        clear_user_state(user_id)
+        return ['⚠️ День не выбран. Откройте расписание и выберите день заново.'], None
     day = DAYS_CUT[state['day']]
 
     step = state['step']
     if step is not None:
         step = BlockStep(step)
 
-    tracker.track(user_id, message.message_id)
+    tracker.track(user_id, message_id)
 
-    if step == BlockStep.DELETE:
-        state['data']['index'] = int(message.text)
-        is_change_action_complete(user_id, chat_id, lambda: delete_block(
-            user_id, day, state['data']['index']))
-        refresh_day_view(message.from_user.id,
-                         message.chat.id, get_user_session(user_id, 'day_message_id'))
-        clear_user_state(user_id)
-        tracker.clear(chat_id, user_id)
+    if step == BlockStep.ASK_BULK:
+        blocks, errors = parse_bulk_blocks(user_id, day, text or '')
+        if errors or not blocks:
+            shown = errors[:BULK_ERRORS_SHOWN]
+            if len(errors) > len(shown):
+                shown.append(f'… и ещё ошибок: {len(errors) - len(shown)}')
+            return ['⚠️ Блоки не добавлены:\n' + '\n'.join(shown or ['нет ни одной строки']) +
+                    '\nИсправьте и отправьте все строки заново.'], None
+        done = add_blocks(user_id, day, blocks)
+
+    elif step == BlockStep.DELETE:
+        state['data']['index'] = int(text)
+        done = delete_block(user_id, day, state['data']['index'])
 
     elif step == BlockStep.ASK_INDEX:
-        state['data']['index'] = int(message.text)
+        state['data']['index'] = int(text)
         state['step'] = BlockStep.ASK_TITLE
         set_user_session(user_id, 'state', state)
-        ask(user_id, chat_id, 'Введите название блока (максимум 20 символов):')
+        return ['Введите название блока (максимум 20 символов):'], None
 
     elif step == BlockStep.ASK_TITLE:
-        state['data']['title'] = message.text[:20]
+        state['data']['title'] = text[:20]
         state['step'] = BlockStep.ASK_START
         set_user_session(user_id, 'state', state)
-        ask(user_id, chat_id, 'Введите время начала (ЧЧ:ММ):')
+        return ['Введите время начала (ЧЧ:ММ):'], None
 
     elif step == BlockStep.ASK_START:
-        start = normalize_time(message.text)
-        if start:
-            state['data']['start'] = start
-            state['step'] = BlockStep.ASK_END
-            set_user_session(user_id, 'state', state)
-            ask(user_id, chat_id, 'Введите время окончания (ЧЧ:ММ):')
-        else:
-            ask(user_id, chat_id, '⚠️ Введите корректное время начала (например 09:30).')
+        start = normalize_time(text)
+        if not start:
+            return ['⚠️ Введите корректное время начала (например 09:30).'], None
+        state['data']['start'] = start
+        state['step'] = BlockStep.ASK_END
+        set_user_session(user_id, 'state', state)
+        return ['Введите время окончания (ЧЧ:ММ):'], None
 
     elif step == BlockStep.ASK_END:
-        end = normalize_time(message.text)
-        if end:
-            state['data']['end'] = end
-            if is_end_after_start(state['data']['start'], end):
-                if state['action'] == 'add':
-                    is_change_action_complete(user_id, chat_id,
-                                              lambda: add_block(
-                                                  user_id=user_id,
-                                                  day=day,
-                                                  title=state['data']['title'],
-                                                  start=state['data']['start'],
-                                                  end=end))
-                    refresh_day_view(message.from_user.id,
-                                     message.chat.id, get_user_session(user_id, 'day_message_id'))
-                elif state['action'] == 'edit':
-                    is_change_action_complete(user_id, chat_id,
-                                              lambda: edit_block(
-                                                  user_id=user_id,
-                                                  day=day,
-                                                  index=state['data']['index'],
-                                                  title=state['data']['title'],
-                                                  start=state['data']['start'],
-                                                  end=end))
-                    refresh_day_view(message.from_user.id,
-                                     message.chat.id, get_user_session(user_id, 'day_message_id'))
-                clear_user_state(user_id)  # очистка
-                tracker.clear(chat_id, user_id)
-            else:
-                ask(user_id, chat_id,
-                    '⚠️ Время окончания не может быть меньше времени начала. Попробуйте ещё раз.')
+        end = normalize_time(text)
+        if not end:
+            return ['⚠️ Введите корректное время окончания (например 10:00).'], None
+        state['data']['end'] = end
+        if not is_end_after_start(state['data']['start'], end):
+            return ['⚠️ Время окончания не может быть меньше времени начала. Попробуйте ещё раз.'], None
+        exclude = state['data']['index'] if state['action'] == 'edit' else None
+        conflicts = find_conflicts(user_id, day, state['data']['start'], end, exclude)
+        if conflicts:
+            busy = ', '.join(f'«{block.title}» {minutes_to_time(block.start)} – {minutes_to_time(block.end)}'
+                             for block in conflicts[:3])
+            state['step'] = BlockStep.ASK_START
+            set_user_session(user_id, 'state', state)
+            return [f'⚠️ Блок пересекается с: {busy}.\nВведите время начала заново (ЧЧ:ММ):'], None
+        if state['action'] == 'add':
+            done = add_block(user_id=user_id, day=day, title=state['data']['title'],
+                             start=state['data']['start'], end=end)
         else:
-            ask(user_id, chat_id,
-                '⚠️ Введите корректное время окончания (например 10:00).')
+            done = edit_block(user_id=user_id, day=day, index=state['data']['index'],
+                              title=state['data']['title'], start=state['data']['start'], end=end)
+
+    else:
+        return [], None
+
+    clear_user_state(user_id)  # очистка
+    return [change_result_text(done)], (state['day'], state.get('day_message_id'))
+
+
+def is_block_entry(message) -> bool:
+    """
+    Фильтр сообщений сценария блоков.
+    Команды (/start, /free, /remind) не считаются вводом, даже посреди сценария.
+    """
+    return has_active_action(message.from_user.id, BLOCK_ACTIONS) and not (message.text or '').startswith('/')
+
+
+# Обработка сообщений пользователя
+@bot.message_handler(func=is_block_entry)
+@serialized_by_user
+def handle_block_entry(message):
+    """
+    Обрабатывает текстовые сообщения пользователя
+    во время добавления, редактирования или удаления блока.
+    Выполняет пошаговый сценарий по состоянию (step).
+    """
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    replies, day_view = block_entry_step(user_id, message.message_id, message.text)
+    for text in replies:
+        ask(user_id, chat_id, text)
+    if day_view is not None:
+        tracker.clear(chat_id, user_id)
+        refresh_day_view(user_id, chat_id, day_view[1], day_view[0])
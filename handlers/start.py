@@ -1,17 +1,28 @@
 from telebot import types
 from utils.storage import ensure_user
+from utils.keyboards import memoized_markup
 from bot import bot
 from handlers.schedule import tracker
+from utils.outbound import outbound
+
+
+@memoized_markup
+def start_markup() -> types.InlineKeyboardMarkup:
+    markup = types.InlineKeyboardMarkup()
+    markup.add(types.InlineKeyboardButton(
+        'Главное меню', callback_data='main_new'))
+    return markup
+
+
+def start_text(first_name: str) -> str:
+    return f'Привет, {first_name}. Я бот в котором можно составить личное расписание на любой день недели.\n\nДля начала работы со мной нажми на кнопку ниже.'
 
 
 @bot.message_handler(commands=['start'])
 def start(message):
     ensure_user(message.from_user.id,
                 message.from_user.first_name, message.from_user.last_name)
-    markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton(
-        'Главное меню', callback_data='main_new'))
-    msg = bot.send_message(message.chat.id,
-                           f'Привет, {message.from_user.first_name}. Я бот в котором можно составить личное расписание на любой день недели.\n\nДля начала работы со мной нажми на кнопку ниже.',
-                           reply_markup=markup)
+    msg = outbound.call(message.chat.id, bot.send_message, message.chat.id,
+                        start_text(message.from_user.first_name),
+                        reply_markup=start_markup())
     tracker.track(message.from_user.id, msg.message_id)
@@ -1,11 +1,253 @@
+import os
+import re
+from datetime import date
+from typing import List, Optional, Tuple
 from telebot import types
 from main import bot
+from utils.keyboards import FrozenMarkup
+from utils.locks import serialized_by_user
+from utils.logger import logger
+from utils.messages import tracker
+from utils.outbound import outbound
+from utils.render import RenderCache, views
+from utils.router import router
+from utils.session import update_session, get_user_session, clear_user_state, has_active_action
+from utils.storage import ensure_user
+from utils.todolist import OPEN, DONE, TODO_MAX_ITEMS, todo_index, todo_version, add_items, toggle_item, \
+    complete_all, clear_done
 
+TODO_PAGE_SIZE = int(os.getenv('TODO_PAGE_SIZE', 8))
+TODO_TEXT_LIMIT = 100
+# длина текста дела на кнопке: длинные подписи Telegram обрезает по ширине экрана
+TODO_BUTTON_TEXT_LIMIT = 40
+
+TODO_ADD_PROMPT = ('Введите дело (можно несколько - по одному на строку).\n'
+                   'Срок можно указать в конце: «Купить молоко 25.12».')
+
+# Срок в конце строки: "Купить молоко 25.12" или "... 25.12.2026"
+DUE_PATTERN = re.compile(r'\s+(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?$')
+
+
+def parse_todo_line(line: str, today: date) -> Optional[Tuple[str, Optional[date]]]:
+    """
+    Разбирает строку дела: текст и необязательный срок ДД.ММ[.ГГГГ].
+    Срок без года, который в этом году уже прошёл, относится к следующему году.
+    Возвращает None для пустой строки.
+    """
+    line = line.strip()
+    due = None
+    match = DUE_PATTERN.search(line)
+    if match:
+        day, month, year = int(match[1]), int(match[2]), match[3]
+        try:
+            due = date(int(year) if year else today.year, month, day)
+            if not year and due < today:
+                due = due.replace(year=today.year + 1)
+            line = line[:match.start()]
+        except ValueError:
+            due = None  # не дата (например, 31.02) - оставляем как часть текста
+    text = line.strip()[:TODO_TEXT_LIMIT]
+    return (text, due) if text else None
+
+
+def parse_todo_entries(text: str, today: date) -> List[Tuple[str, Optional[date]]]:
+    """
+    Дела из сообщения: по одному на строку.
+    """
+    return [entry for entry in (parse_todo_line(line, today) for line in text.splitlines())
+            if entry is not None]
+
+
+def format_todo_button(item: dict, today: date) -> str:
+    text = item['text']
+    if len(text) > TODO_BUTTON_TEXT_LIMIT:
+        text = text[:TODO_BUTTON_TEXT_LIMIT - 1] + '…'
+    label = f'{"✅" if item["done"] else "⬜"} {text}'
+    if item['due'] and not item['done']:
+        due = date.fromisoformat(item['due'])
+        label += f' · {due:%d.%m}' + (' ❗' if due < today else '')
+    return label
+
+
+def render_todo_page(user_id: int, view: str, page: int, today: date) -> Tuple[str, FrozenMarkup, int]:
+    """
+    Подпись и клавиатура одной страницы списка дел.
+    Строятся только кнопки этой страницы: дела берутся срезом из индекса.
+    Возвращает также номер страницы, приведённый к допустимому диапазону.
+    """
+    index = todo_index(user_id)
+    items, page = index.page(view, page, TODO_PAGE_SIZE)
+    pages = index.pages(view, TODO_PAGE_SIZE)
+
+    lines = ['📝 <b>Список дел</b>',
+             f'Текущих: {len(index.open)} · выполнено: {len(index.done)}']
+    overdue, due_today = index.overdue(today), index.due_today(today)
+    if overdue or due_today:
+        lines.append(f'На сегодня: {due_today} · просрочено: {overdue}')
+    if not items:
+        lines.append('')
+        lines.append('Пока пусто. Нажмите «➕ Добавить».' if view == OPEN else 'Выполненных дел нет.')
+    caption = '\n'.join(lines)
 
-@bot.callback_query_handler(func=lambda call: call.data == 'todolist')
-def callback_todolist(call):
     markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton(
-        '⬅️ Назад', callback_data='main_back'))
-    bot.edit_message_caption('В разработке...', call.message.chat.id,
-                             call.message.message_id, reply_markup=markup)
+    for item in items:
+        markup.row(types.InlineKeyboardButton(
+            format_todo_button(item, today), callback_data=f'todo_toggle:{view}:{page}:{item["id"]}'))
+    if pages > 1:
+        markup.row(
+            types.InlineKeyboardButton('◀️', callback_data=f'todo_page:{view}:{(page - 1) % pages}'),
+            types.InlineKeyboardButton(f'{page + 1}/{pages}', callback_data='todo_noop'),
+            types.InlineKeyboardButton('▶️', callback_data=f'todo_page:{view}:{(page + 1) % pages}'))
+    if view == OPEN:
+        switch = types.InlineKeyboardButton(f'✅ Выполненные ({len(index.done)})', callback_data=f'todo_page:{DONE}:0')
+    else:
+        switch = types.InlineKeyboardButton(f'📋 Текущие ({len(index.open)})', callback_data=f'todo_page:{OPEN}:0')
+    markup.row(types.InlineKeyboardButton('➕ Добавить', callback_data=f'todo_add:{view}:{page}'), switch)
+    bulk = []
+    if view == OPEN and index.open:
+        bulk.append(types.InlineKeyboardButton('☑️ Выполнить все', callback_data=f'todo_complete_all:{view}:{page}'))
+    if index.done:
+        bulk.append(types.InlineKeyboardButton('🧹 Удалить выполненные', callback_data=f'todo_clear_done:{view}:{page}'))
+    if bulk:
+        markup.row(*bulk)
+    markup.row(types.InlineKeyboardButton('⬅️ Назад', callback_data='main_back'))
+    return caption, FrozenMarkup(markup), page
+
+
+todo_pages = RenderCache()
+
+
+def todo_page(user_id: int, view: str = OPEN, page: int = 0) -> Tuple[str, FrozenMarkup]:
+    """
+    Подпись и клавиатура страницы списка дел.
+    Страница перерисовывается только после изменения списка (или смены дня - из-за сроков).
+    """
+    view = DONE if view == DONE else OPEN
+    today = date.today()
+    caption, markup, _ = todo_pages.get((user_id, view, page, today), todo_version(user_id),
+                                        lambda: render_todo_page(user_id, view, page, today))
+    return caption, markup
+
+
+def show_todo_page(user_id: int, chat_id: int, message_id: int, view: str = OPEN, page: int = 0) -> None:
+    """
+    Показывает страницу списка дел в сообщении меню.
+    """
+    caption, markup = todo_page(user_id, view, page)
+    views.edit_caption(chat_id, message_id, caption=caption, reply_markup=markup)
+
+
+def parse_page_args(view: str = OPEN, page: str = '0') -> Tuple[str, int]:
+    return view, int(page) if page.isdigit() else 0
+
+
+@router.route('todolist')
+def callback_todolist(call):
+    ensure_user(call.from_user.id, call.from_user.first_name, call.from_user.last_name)
+    show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id)
+
+
+@router.route('todo_page')
+def callback_todo_page(call, *args):
+    view, page = parse_page_args(*args)
+    show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id, view, page)
+
+
+@router.route('todo_noop')
+def callback_todo_noop(call):
+    """Кнопка с номером страницы ничего не делает."""
+
+
+@router.route('todo_toggle')
+@serialized_by_user
+def callback_todo_toggle(call, view=OPEN, page='0', item_id=''):
+    if item_id.isdigit():
+        toggle_item(call.from_user.id, int(item_id))
+    show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                   *parse_page_args(view, page))
+
+
+@router.route('todo_complete_all')
+@serialized_by_user
+def callback_todo_complete_all(call, *args):
+    """Отмечает выполненными все текущие дела (одна запись в хранилище)."""
+    complete_all(call.from_user.id)
+    show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                   *parse_page_args(*args))
+
+
+@router.route('todo_clear_done')
+@serialized_by_user
+def callback_todo_clear_done(call, *args):
+    """Удаляет выполненные дела (одна запись в хранилище)."""
+    clear_done(call.from_user.id)
+    show_todo_page(call.from_user.id, call.message.chat.id, call.message.message_id,
+                   *parse_page_args(*args))
+
+
+def begin_todo_add(user_id: int, message_id: int, view: str, page: int) -> None:
+    """
+    Состояние ввода дел; message_id, view и page - страница, которую обновить после ввода.
+    """
+    with update_session(user_id) as state:
+        state.update({
+            'action': 'todo_add',
+            'step': None,
+            'data': {'message_id': message_id, 'view': view, 'page': page},
+        })
+
+
+@router.route('todo_add')
+@serialized_by_user
+def callback_todo_add(call, *args):
+    """
+    Переводит пользователя в состояние ввода новых дел.
+    """
+    begin_todo_add(call.from_user.id, call.message.message_id, *parse_page_args(*args))
+    msg = outbound.call(call.message.chat.id, bot.send_message, call.message.chat.id, TODO_ADD_PROMPT)
+    tracker.track(call.from_user.id, msg.message_id)
+
+
+def todo_entry_step(user_id: int, message_id: int, text: str) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Добавляет дела из сообщения одной записью, без обращений к Telegram (общий для обоих режимов).
+    Возвращает предупреждение пользователю (или None) и, если ввод завершён,
+    данные сессии со страницей списка, которую нужно обновить.
+    """
+    data = get_user_session(user_id, 'data') or {}
+    tracker.track(user_id, message_id)
+    entries = parse_todo_entries(text or '', date.today())
+    if not entries:
+        return '⚠️ Введите текст дела.', None
+    added = add_items(user_id, entries)
+    clear_user_state(user_id)
+    if added < len(entries):
+        return f'⚠️ Добавлено дел: {added} из {len(entries)} (в списке не больше {TODO_MAX_ITEMS}).', data
+    return None, data
+
+
+def is_todo_entry(message) -> bool:
+    return has_active_action(message.from_user.id, ('todo_add',)) and not (message.text or '').startswith('/')
+
+
+@bot.message_handler(func=is_todo_entry)
+@serialized_by_user
+def handle_todo_entry(message):
+    """
+    Добавляет дела из сообщения одной записью и обновляет страницу списка.
+    """
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    warning, data = todo_entry_step(user_id, message.message_id, message.text)
+    if data is None:
+        msg = outbound.call(chat_id, bot.send_message, chat_id, warning)
+        tracker.track(user_id, msg.message_id)
+        return
+    if warning is not None:
+        outbound.call(chat_id, bot.send_message, chat_id, warning)
+    tracker.clear(chat_id, user_id)
+    if data.get('message_id'):
+        try:
+            show_todo_page(user_id, chat_id, data['message_id'], data.get('view', OPEN), data.get('page', 0))
+        except Exception as e:
+            logger.warning(f'Не удалось обновить список дел пользователя {user_id}: {e}')
@@ -1,8 +1,55 @@
+import argparse
+import signal
 from bot import bot
+from utils.sharding import BOT_SHARDS, interrupt_on_signal
+from utils.storage import flush_users
+from utils.session import flush_sessions
+from utils.messages import deletions
+from utils.reminders import reminders
+from utils.metrics import instrument_message_handlers, start_metrics_server
+from utils.logger import bind_message_handlers
+from utils.access import setup_access
 import handlers.start
 import handlers.main_menu
 import handlers.schedule
 import handlers.todolist
+import handlers.reminders
 
 if __name__ == "__main__":
-    bot.infinity_polling()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--webhook', action='store_true',
+                        help='получать апдейты через вебхук (встроенный HTTP-сервер)')
+    parser.add_argument('--shards', type=int, default=BOT_SHARDS,
+                        help='число процессов-обработчиков (пользователи делятся между ними по id)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='обрабатывать апдейты корутинами AsyncTeleBot (async_handlers/*.py)')
+    args = parser.parse_args()
+    if args.use_async and (args.webhook or args.shards > 1):
+        parser.error('--async работает только с long polling в одном процессе')
+    if args.shards > 1:
+        from utils.sharding import run_sharded
+        run_sharded(args.shards, webhook=args.webhook)
+        raise SystemExit
+    # docker stop / systemctl stop: без обработчика процесс умер бы без сброса хранилища
+    signal.signal(signal.SIGTERM, interrupt_on_signal)
+    if args.use_async:
+        from utils.async_runtime import run_async
+        run_async()
+        raise SystemExit
+    setup_access(bot)
+    bind_message_handlers(bot)
+    instrument_message_handlers(bot)
+    start_metrics_server()
+    deletions.start()  # удаления, запланированные до перезапуска
+    reminders.start()
+    try:
+        if args.webhook:
+            from utils.webhook import run_webhook
+            run_webhook()
+        else:
+            bot.infinity_polling()
+    finally:
+        reminders.stop()
+        deletions.stop()
+        flush_sessions()
+        flush_users()
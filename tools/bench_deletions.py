@@ -0,0 +1,73 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+
+def wait_for_calls(api, method: str, expected: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while api.calls[method] < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def run(users: int, messages: int, delay: float, timeout: float) -> None:
+    """
+    Удаление отслеживаемых сообщений: users пользователей одновременно очищают
+    по messages сообщений через delay секунд. Сравнивает прежнюю схему
+    (threading.Timer на каждый clear и deleteMessage на каждое сообщение)
+    с DeletionScheduler: сколько потоков добавилось и сколько вызовов API ушло.
+    """
+    from tools.fake_telegram import FakeTelegram
+    api = FakeTelegram()
+    api.start()
+    os.environ['TELEGRAM_API_URL'] = api.url
+    from bot import bot
+    from utils.messages import MessageTracker, deletions
+    from utils.outbound import outbound, BACKGROUND
+
+    def timers_clear(chat_id: int, msg_ids: list) -> None:
+        # прежний MessageTracker.clear
+        def delete_msgs():
+            for msg_id in msg_ids:
+                outbound.submit(chat_id, bot.delete_message, chat_id, msg_id, priority=BACKGROUND)
+        threading.Timer(delay, delete_msgs).start()
+
+    baseline = threading.active_count()
+    for user_id in range(1, users + 1):
+        timers_clear(user_id, list(range(1, messages + 1)))
+    timer_threads = threading.active_count() - baseline
+    wait_for_calls(api, 'deleteMessage', users * messages, delay + timeout)
+
+    tracker = MessageTracker()
+    baseline = threading.active_count()
+    for user_id in range(1, users + 1):
+        for msg_id in range(1, messages + 1):
+            tracker.track(user_id, msg_id)
+        tracker.clear(user_id, user_id, delay=delay)
+    scheduler_threads = threading.active_count() - baseline
+    wait_for_calls(api, 'deleteMessages', users, delay + timeout)
+    deletions.stop()
+    api.stop()
+
+    print(f'{users} пользователей по {messages} сообщений, удаление через {delay:g} с')
+    print(f'{"схема":<22} {"потоков":>8} {"вызовов API":>12}')
+    print(f'{"Timer на clear":<22} {timer_threads:>8} {api.calls["deleteMessage"]:>12}')
+    print(f'{"DeletionScheduler":<22} {scheduler_threads:>8} {api.calls["deleteMessages"]:>12}')
+
+
+def main() -> None:
+    # python -m tools.bench_deletions [--users 50] [--messages 3] [--delay 1]
+    parser = argparse.ArgumentParser(description='Потоки и вызовы API при отложенном удалении сообщений')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=3, help='сообщений на пользователя')
+    parser.add_argument('--delay', type=float, default=1, help='задержка удаления, с')
+    parser.add_argument('--timeout', type=float, default=30, help='ожидание вызовов API, с')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(DATA_DIR=data_dir, BOT_TOKEN=os.getenv('BOT_TOKEN', '123456:bench'))
+        run(args.users, args.messages, args.delay, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import inspect
+import os
+import tempfile
+import timeit
+
+
+def run(number: int) -> None:
+    """
+    Построение и сериализация клавиатуры на одну отправку (как делает telebot):
+    построитель без кэша против memoized_markup.
+    """
+    from telebot import apihelper
+    from handlers.main_menu import main_menu_markup
+    from handlers.schedule import (block_add_choice_markup, block_delete_choice_markup,
+                                   day_actions_markup, day_grid_markup)
+
+    cases = [
+        ('главное меню', main_menu_markup, ()),
+        ('сетка дней', day_grid_markup, ('main_back',)),
+        ('действия дня', day_actions_markup, ('day_mon',)),
+        ('меню добавления', block_add_choice_markup, ('day_mon',)),
+        ('меню удаления', block_delete_choice_markup, ('day_mon',)),
+    ]
+    print(f'{"клавиатура":<18} {"без кэша, мкс":>14} {"с кэшем, мкс":>13}')
+    for name, memoized, args in cases:
+        builder = inspect.unwrap(memoized)
+        plain = timeit.timeit(lambda: apihelper._convert_markup(builder(*args)), number=number)
+        cached = timeit.timeit(lambda: apihelper._convert_markup(memoized(*args)), number=number)
+        print(f'{name:<18} {plain / number * 1e6:>14.2f} {cached / number * 1e6:>13.2f}')
+
+
+def main() -> None:
+    # python -m tools.bench_keyboards [--number 20000]
+    parser = argparse.ArgumentParser(description='Стоимость построения inline-клавиатур на одну отправку')
+    parser.add_argument('--number', type=int, default=20000, help='повторов на замер')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(DATA_DIR=data_dir, BOT_TOKEN=os.getenv('BOT_TOKEN', '123456:bench'))
+        run(args.number)
+
+
+if __name__ == '__main__':
+    main()
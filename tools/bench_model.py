@@ -0,0 +1,109 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import time as dt_time
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def synthetic_users(users: int, blocks: int, seed: int = 1) -> dict:
+    """
+    Пользователи в формате users.json: в среднем blocks блоков на пользователя,
+    разбросанных по дням недели, время - строки HH:MM.
+    """
+    from utils.storage import create_user_template
+    rnd = random.Random(seed)
+    data = {}
+    for user_id in range(1, users + 1):
+        user = create_user_template('Имя', 'Фамилия')
+        for i in range(rnd.randint(0, 2 * blocks)):
+            start = rnd.randrange(24 * 60 - 60)
+            end = start + rnd.randrange(5, 60)
+            user['schedule'][rnd.choice(DAYS)].append({
+                'title': f'Блок {i}',
+                'start': f'{start // 60:02d}:{start % 60:02d}',
+                'end': f'{end // 60:02d}:{end % 60:02d}'})
+        data[str(user_id)] = user
+    return data
+
+
+def traced_load(raw: str, decode: bool) -> tuple:
+    """
+    Загружает users.json как JsonStorage (decode - с переводом блоков в Block)
+    и возвращает (пользователи, байт памяти под ними).
+    """
+    from utils.model import decode_user
+    gc.collect()
+    tracemalloc.start()
+    users = json.loads(raw)
+    if decode:
+        for user in users.values():
+            decode_user(user)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return users, size
+
+
+def old_is_end_after_start(start: str, end: str) -> bool:
+    # прежняя проверка из utils/validation.py: нормализация строк и datetime.time
+    from utils.validation import normalize_time
+    start_norm = normalize_time(start)
+    end_norm = normalize_time(end)
+    if not start_norm or not end_norm:
+        return False
+    start_h, start_m = map(int, start_norm.split(':'))
+    end_h, end_m = map(int, end_norm.split(':'))
+    return dt_time(end_h, end_m) >= dt_time(start_h, start_m)
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run(users: int, blocks: int) -> None:
+    """
+    Синтетический набор users пользователей: память под загруженными данными
+    (блоки-словари со строками времени против Block) и стоимость сравнений времени
+    по всем блокам - проверки "конец не раньше начала" и сортировки дней по началу.
+    """
+    from utils.model import Block, sorted_blocks
+    from utils.validation import normalize_time
+
+    raw = json.dumps(synthetic_users(users, blocks), ensure_ascii=False)
+    as_dicts, dict_bytes = traced_load(raw, decode=False)
+    days = [day for user in as_dicts.values() for day in user['schedule'].values()]
+    total = sum(len(day) for day in days)
+    old_check = timed(lambda: [old_is_end_after_start(b['start'], b['end']) for day in days for b in day])
+    old_sort = timed(lambda: [sorted(day, key=lambda b: normalize_time(b['start'])) for day in days])
+    del as_dicts, days
+
+    as_blocks, block_bytes = traced_load(raw, decode=True)
+    days = [day for user in as_blocks.values() for day in user['schedule'].values()]
+    new_check = timed(lambda: [b.end >= b.start for day in days for b in day])
+    new_sort = timed(lambda: [sorted_blocks(day) for day in days])
+    assert all(isinstance(b, Block) for day in days for b in day)
+
+    print(f'{users} пользователей, {total} блоков')
+    print(f'{"":<34} {"словари":>10} {"Block":>10}')
+    print(f'{"память на пользователя, Б":<34} {dict_bytes / users:>10.0f} {block_bytes / users:>10.0f}')
+    print(f'{"проверка конец >= начало, мкс":<34} {old_check / total * 1e6:>10.2f} {new_check / total * 1e6:>10.2f}')
+    print(f'{"сортировка всех дней, мс":<34} {old_sort * 1e3:>10.0f} {new_sort * 1e3:>10.0f}')
+
+
+def main() -> None:
+    # python -m tools.bench_model [--users 100000] [--blocks 10]
+    parser = argparse.ArgumentParser(description='Память и сравнения времени: блоки-словари против Block')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--blocks', type=int, default=10, help='блоков на пользователя в среднем')
+    args = parser.parse_args()
+    run(args.users, args.blocks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import os
+import tempfile
+import timeit
+from types import SimpleNamespace
+
+
+def run(sizes, number: int) -> None:
+    """
+    Поиск обработчика callback_data в худшем случае (подходит последний из N):
+    перебор фильтров func telebot, как до CallbackRouter, против CallbackRouter.resolve.
+    """
+    from bot import bot
+    from utils.router import CallbackRouter
+
+    def handler(call, *params):
+        pass
+
+    print(f'{"N":>6} {"перебор func, мкс":>18} {"роутер, мкс":>12} {"роутер с параметром, мкс":>25}')
+    for size in sizes:
+        keys = [f'route_{i}' for i in range(size)]
+        handlers = [bot._build_handler_dict(handler, func=lambda call, key=key: call.data == key)
+                    for key in keys]
+        router = CallbackRouter()
+        for key in keys:
+            router.route(key)(handler)
+        call = SimpleNamespace(data=keys[-1])
+
+        def scan():
+            for handler_dict in handlers:
+                if bot._test_message_handler(handler_dict, call):
+                    return handler_dict
+
+        scanned = timeit.timeit(scan, number=number)
+        resolved = timeit.timeit(lambda: router.resolve(call.data), number=number)
+        with_params = timeit.timeit(lambda: router.resolve(f'{call.data}:day_mon'), number=number)
+        print(f'{size:>6} {scanned / number * 1e6:>18.2f} {resolved / number * 1e6:>12.2f} '
+              f'{with_params / number * 1e6:>25.2f}')
+
+
+def main() -> None:
+    # python -m tools.bench_router [--sizes 12 100 1000] [--number 2000]
+    parser = argparse.ArgumentParser(description='Время поиска обработчика callback-запроса')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[12, 100, 1000], help='число обработчиков')
+    parser.add_argument('--number', type=int, default=2000, help='повторов на замер')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(DATA_DIR=data_dir, BOT_TOKEN=os.getenv('BOT_TOKEN', '123456:bench'))
+        run(args.sizes, args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def per_call(func, number: int) -> float:
+    started = time.perf_counter()
+    for i in range(number):
+        func(i)
+    return (time.perf_counter() - started) / number
+
+
+def run(sizes, number: int) -> None:
+    """
+    Отрисовка страницы списка дел из n дел: по индексу TodoIndex против сортировки
+    всего списка на каждую страницу; переключение отметки дела с перерисовкой
+    при инкрементальном обновлении индекса и при его полной перестройке.
+    Бэкенд хранилища - из STORAGE_BACKEND.
+    """
+    from utils import todolist
+    from utils.storage import STORAGE_BACKEND, ensure_user, storage
+    from handlers.todolist import TODO_PAGE_SIZE, render_todo_page
+
+    rnd = random.Random(1)
+    today = date.today()
+    print(f'Бэкенд {STORAGE_BACKEND}, страница из {TODO_PAGE_SIZE} дел')
+    print(f'{"n":>6} {"страница, мкс":>14} {"сортировка, мс":>15} '
+          f'{"отметка, мс":>12} {"отметка с перестройкой, мс":>27}')
+    for user_id, size in enumerate(sizes, start=1):
+        ensure_user(user_id)
+        todolist.add_items(user_id, [
+            (f'Дело {i}', today + timedelta(days=rnd.randint(-30, 60)) if i % 3 else None)
+            for i in range(size)])
+        pages = max(1, size // TODO_PAGE_SIZE)
+        render_todo_page(user_id, todolist.OPEN, 0, today)  # индекс строится один раз
+
+        page = per_call(lambda i: render_todo_page(user_id, todolist.OPEN, i % pages, today), number)
+
+        items = storage.get_todolist(user_id)
+
+        def sorted_page(i: int) -> list:
+            view = sorted((item for item in items if not item['done']), key=todolist._open_key)
+            return view[i % pages * TODO_PAGE_SIZE:(i % pages + 1) * TODO_PAGE_SIZE]
+
+        full_sort = per_call(sorted_page, number)
+
+        def toggle(i: int) -> None:
+            todolist.toggle_item(user_id, 1)
+            render_todo_page(user_id, todolist.OPEN, 0, today)
+
+        def toggle_rebuild(i: int) -> None:
+            todolist.toggle_item(user_id, 1)
+            todolist._versions[user_id] += 1  # индекс не найдётся в кэше и перестроится
+            render_todo_page(user_id, todolist.OPEN, 0, today)
+
+        toggles = max(number // 10, 2)
+        incremental = per_call(toggle, toggles)
+        rebuild = per_call(toggle_rebuild, toggles)
+        print(f'{size:>6} {page * 1e6:>14.0f} {full_sort * 1e3:>15.2f} '
+              f'{incremental * 1e3:>12.2f} {rebuild * 1e3:>27.2f}')
+
+
+def main() -> None:
+    # python -m tools.bench_todolist [--sizes 100 1000 10000]; STORAGE_BACKEND=sqlite - другой бэкенд
+    parser = argparse.ArgumentParser(description='Время отрисовки страниц и отметки дел в списке дел')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='число дел')
+    parser.add_argument('--number', type=int, default=200, help='повторов на замер')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(DATA_DIR=data_dir, BOT_TOKEN=os.getenv('BOT_TOKEN', '123456:bench'))
+        os.environ.pop('SQLITE_FILE', None)
+        run(args.sizes, args.number)
+
+
+if __name__ == '__main__':
+    main()
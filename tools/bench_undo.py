@@ -0,0 +1,88 @@
+import argparse
+import copy
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ('json', 'journal', 'sqlite')
+USER_ID = 1
+
+
+def traced(func) -> int:
+    """Сколько байт памяти остаётся занятым после func() (вместе с её результатом)."""
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def run_backend(sizes, number: int, adds: int) -> None:
+    """
+    Выполняется в дочернем процессе со STORAGE_BACKEND из окружения:
+    память одной записи истории отмены для дня из n блоков (снимок из хранилища
+    против копии дня словарями), время add_block + undo_day и время adds
+    последовательных add_block в один день.
+    """
+    from utils import schedule
+    from utils.history import DayHistory
+    from utils.model import Block, blocks_to_dicts
+    from utils.storage import STORAGE_BACKEND, ensure_user, flush_users, storage
+
+    ensure_user(USER_ID)
+    for size in sizes:
+        storage.set_day(USER_ID, 'monday', [Block.parse(f'блок {i}', '00:00', '00:01') for i in range(size)])
+        history = DayHistory()
+        snapshot = traced(lambda: history.push(tuple(storage.get_day(USER_ID, 'monday'))))
+        dicts = traced(lambda: copy.deepcopy(blocks_to_dicts(storage.get_day(USER_ID, 'monday'))))
+        print(f'{STORAGE_BACKEND:<8} n={size:<5} запись истории {snapshot:>7} Б, копия словарями {dicts:>7} Б')
+
+    started = time.perf_counter()
+    for _ in range(number):
+        schedule.add_block(USER_ID, 'tuesday', 'x', '00:00', '00:00')
+        schedule.undo_day(USER_ID, 'tuesday')
+    undo = (time.perf_counter() - started) / number
+
+    started = time.perf_counter()
+    for i in range(adds):
+        minute = i % (24 * 60 - 1)
+        schedule.add_block(USER_ID, 'wednesday', f'{i}', f'{minute // 60:02d}:{minute % 60:02d}',
+                           f'{(minute + 1) // 60:02d}:{(minute + 1) % 60:02d}')
+    sequential = time.perf_counter() - started
+    flush_users()
+    print(f'{STORAGE_BACKEND:<8} add_block + undo_day {undo * 1e6:.0f} мкс, '
+          f'{adds} add_block подряд {sequential:.2f} с')
+
+
+def main() -> None:
+    # python -m tools.bench_undo [--sizes 10 100] [--number 2000] [--adds 1000] [--backend sqlite]
+    parser = argparse.ArgumentParser(description='Память и время истории отмены изменений дня')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100], help='блоков в дне')
+    parser.add_argument('--number', type=int, default=2000, help='повторов add_block + undo_day')
+    parser.add_argument('--adds', type=int, default=1000, help='последовательных add_block')
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='бэкенд хранилища (можно несколько; по умолчанию все)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_backend(args.sizes, args.number, args.adds)
+        return
+
+    for backend in args.backend or BACKENDS:
+        # хранилище создаётся при импорте по окружению, поэтому каждый бэкенд - в своём процессе
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = dict(os.environ, DATA_DIR=data_dir, STORAGE_BACKEND=backend,
+                       BOT_TOKEN=os.getenv('BOT_TOKEN', '123456:bench'))
+            env.pop('SQLITE_FILE', None)
+            subprocess.check_call([sys.executable, '-m', 'tools.bench_undo', '--child',
+                                   '--sizes', *map(str, args.sizes), '--number', str(args.number),
+                                   '--adds', str(args.adds)], cwd=REPO_DIR, env=env)
+
+
+if __name__ == '__main__':
+    main()
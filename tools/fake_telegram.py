@@ -0,0 +1,205 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+# методы, которые возвращают отправленное или изменённое сообщение
+MESSAGE_METHODS = {'sendMessage', 'sendPhoto', 'editMessageCaption', 'editMessageReplyMarkup',
+                   'editMessageText'}
+TRUE_METHODS = {'deleteMessage', 'deleteMessages', 'answerCallbackQuery', 'deleteWebhook',
+                'setWebhook', 'close', 'logOut'}
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """
+    Разбирает запрос Bot API (параметры в строке запроса, форме или multipart)
+    и передаёт его FakeTelegram.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == '/updates' and self.command == 'POST':
+            # не часть Bot API: так апдейты кладутся в сервер, запущенный отдельно
+            update_id = self.server.api.push_update(self._read_body())
+            return self._reply(200, {'ok': True, 'result': update_id})
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+        params = dict(parse_qsl(url.query))
+        params.update(self._read_body())
+        status, body = self.server.api.handle(parts[1], params)
+        self._reply(status, body)
+
+    def _read_body(self) -> Dict[str, str]:
+        length = int(self.headers.get('Content-Length', 0))
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return dict(parse_qsl(body.decode('utf-8')))
+        if content_type.startswith('application/json'):
+            return json.loads(body)
+        if content_type.startswith('multipart/form-data'):
+            message = BytesParser(policy=HTTP).parsebytes(
+                f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+            fields = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                if part.get_filename() is None:
+                    fields[name] = part.get_content().strip()
+                else:
+                    fields[name] = part.get_filename()
+            return fields
+        return {}
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegram:
+    """
+    Локальная замена Bot API для нагрузочных тестов.
+    Апдейты кладутся через push_update и отдаются боту через getUpdates (long polling).
+    Исходящие методы отвечают правдоподобными объектами после задержки latency ± jitter,
+    а с вероятностью error_rate - ошибкой 429 с retry_after.
+    Каждый вызов передаётся подписчикам on_call(method, params, received_at).
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, retry_after: int = 1) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self.listeners: List[Callable[[str, dict, float], None]] = []
+        self._updates: List[dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+        self._cond = threading.Condition()
+        self.polled = threading.Event()
+        self.httpd = ThreadingHTTPServer((host, port), FakeTelegramHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.api = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def push_update(self, update: dict) -> int:
+        """
+        Ставит апдейт в очередь getUpdates и возвращает его update_id.
+        """
+        with self._cond:
+            update = dict(update, update_id=next(self._update_ids))
+            self._updates.append(update)
+            self._cond.notify_all()
+        return update['update_id']
+
+    def handle(self, method: str, params: dict) -> Tuple[int, dict]:
+        received_at = time.perf_counter()
+        with self._cond:
+            self.calls[method] += 1
+        for listener in self.listeners:
+            listener(method, params, received_at)
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self._get_updates(params)}
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.error_rate and random.random() < self.error_rate:
+            with self._cond:
+                self.throttled += 1
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': BOT_USER}
+        if method in TRUE_METHODS:
+            return 200, {'ok': True, 'result': True}
+        if method in MESSAGE_METHODS:
+            return 200, {'ok': True, 'result': self._message(method, params)}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+
+    def _get_updates(self, params: dict) -> List[dict]:
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        self.polled.set()
+        with self._cond:
+            # подтверждённые апдейты (update_id < offset) больше не нужны
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._updates[:limit]
+
+    def _message(self, method: str, params: dict) -> dict:
+        chat_id = int(params.get('chat_id') or 0)
+        message_id = int(params.get('message_id') or next(self._message_ids))
+        message = {'message_id': message_id, 'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER}
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        if method in ('sendPhoto', 'editMessageCaption'):
+            message['photo'] = [{'file_id': f'fake-photo-{message_id}', 'file_unique_id': f'p{message_id}',
+                                 'width': 640, 'height': 480}]
+        return message
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Фейковый сервер Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0, help='задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=0, help='случайная добавка к задержке, мс')
+    parser.add_argument('--error-rate', type=float, default=0, help='доля ответов 429')
+    args = parser.parse_args()
+    api = FakeTelegram(args.host, args.port, args.latency / 1000, args.jitter / 1000, args.error_rate)
+    print(f'Bot API: {api.url} (TELEGRAM_API_URL={api.url})')
+    api.httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
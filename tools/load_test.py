@@ -0,0 +1,187 @@
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from tools.fake_telegram import FakeTelegram
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAYS = ('day_mon', 'day_tue', 'day_wed', 'day_thu', 'day_fri', 'day_sat', 'day_sun')
+# методы, которые не считаются ответом на апдейт (удаления идут фоном с задержкой)
+BACKGROUND_METHODS = {'deleteMessage', 'deleteMessages', 'getUpdates', 'getMe'}
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class VirtualUser:
+    """
+    Пользователь, который проходит сценарий /start -> main_new -> schedule -> день -> block_add
+    (название, начало, конец). Следующий апдейт отправляется только после ответа бота на предыдущий.
+    """
+
+    def __init__(self, api: FakeTelegram, user_id: int, timeout: float) -> None:
+        self.api = api
+        self.user_id = user_id
+        self.timeout = timeout
+        self.responses: 'queue.Queue[Tuple[str, dict, float]]' = queue.Queue()
+        self.menu_message_id = 1
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts = 0
+        self._message_ids = iter(range(1, 10 ** 9))
+
+    def _from(self) -> dict:
+        return {'id': self.user_id, 'is_bot': False, 'first_name': f'User{self.user_id}'}
+
+    def _message(self, text: str) -> dict:
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': self.user_id, 'type': 'private'}, 'from': self._from(), 'text': text}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        return {'message': message}
+
+    def _callback(self, data: str) -> dict:
+        return {'callback_query': {
+            'id': f'{self.user_id}-{next(self._message_ids)}', 'from': self._from(),
+            'chat_instance': str(self.user_id), 'data': data,
+            'message': {'message_id': self.menu_message_id, 'date': int(time.time()),
+                        'chat': {'id': self.user_id, 'type': 'private'},
+                        'photo': [{'file_id': 'menu', 'file_unique_id': 'menu', 'width': 1, 'height': 1}]}}}
+
+    def step(self, label: str, update: dict, expected: str) -> Optional[dict]:
+        """
+        Отправляет апдейт и ждёт вызова expected в этом чате. Возвращает его параметры.
+        """
+        while not self.responses.empty():
+            self.responses.get_nowait()
+        started = time.perf_counter()
+        self.api.push_update(update)
+        deadline = started + self.timeout
+        while True:
+            try:
+                method, params, received_at = self.responses.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                self.timeouts += 1
+                return None
+            if method == expected:
+                self.latencies[label].append(received_at - started)
+                return params
+
+    def run(self, flows: int) -> None:
+        for i in range(flows):
+            start_hour = i % 23
+            self.step('/start', self._message('/start'), 'sendMessage')
+            self.step('main_new', self._callback('main_new'), 'sendPhoto')
+            self.step('schedule', self._callback('schedule'), 'editMessageCaption')
+            day = DAYS[(self.user_id + i) % 7]
+            self.step('day', self._callback(day), 'editMessageCaption')
+            self.step('block_add', self._callback(f'block_add:{day}'), 'sendMessage')
+            self.step('title', self._message(f'Блок {i}'), 'sendMessage')
+            self.step('start_time', self._message(f'{start_hour:02d}:00'), 'sendMessage')
+            self.step('end_time', self._message(f'{start_hour:02d}:30'), 'sendMessage')
+
+
+def spawn_bot(api_url: str, workdir: str, threads: Optional[int] = None, shards: int = 1,
+              use_async: bool = False) -> subprocess.Popen:
+    """
+    Запускает main.py в отдельном процессе против фейкового API, данные - во временной папке.
+    """
+    os.symlink(os.path.join(REPO_DIR, 'img'), os.path.join(workdir, 'img'))
+    env = dict(os.environ, TELEGRAM_API_URL=api_url, BOT_TOKEN='123456:load-test')
+    if threads is not None:
+        env['BOT_NUM_THREADS'] = str(threads)
+    args = [sys.executable, os.path.join(REPO_DIR, 'main.py')]
+    if shards > 1:
+        args.extend(('--shards', str(shards)))
+    if use_async:
+        args.append('--async')
+    return subprocess.Popen(args, cwd=workdir, env=env)
+
+
+def main() -> None:
+    # python -m tools.load_test --users 50 --flows 3 --latency 20 --error-rate 0.01
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота против фейкового Bot API')
+    parser.add_argument('--users', type=int, default=20, help='число одновременных пользователей')
+    parser.add_argument('--flows', type=int, default=3, help='сколько раз каждый проходит сценарий')
+    parser.add_argument('--latency', type=float, default=20, help='задержка ответа API, мс')
+    parser.add_argument('--jitter', type=float, default=10, help='случайная добавка к задержке, мс')
+    parser.add_argument('--error-rate', type=float, default=0, help='доля ответов 429')
+    parser.add_argument('--timeout', type=float, default=30, help='ожидание ответа бота, с')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='BOT_NUM_THREADS бота (по умолчанию - из окружения)')
+    parser.add_argument('--shards', type=int, default=1, help='запустить бота в многопроцессном режиме')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='запустить бота в асинхронном режиме (AsyncTeleBot)')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--no-spawn', action='store_true',
+                        help='не запускать бота: он уже запущен с TELEGRAM_API_URL на --port')
+    args = parser.parse_args()
+
+    api = FakeTelegram(port=args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                       error_rate=args.error_rate)
+    users = {user_id: VirtualUser(api, user_id, args.timeout) for user_id in range(1, args.users + 1)}
+
+    def route(method: str, params: dict, received_at: float) -> None:
+        if method in BACKGROUND_METHODS:
+            return
+        user = users.get(int(params.get('chat_id') or 0))
+        if user is not None:
+            user.responses.put((method, params, received_at))
+
+    api.listeners.append(route)
+    api.start()
+    print(f'Фейковый Bot API: {api.url}')
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if not args.no_spawn:
+                process = spawn_bot(api.url, workdir, args.threads, args.shards, args.use_async)
+            if not api.polled.wait(60):
+                sys.exit('Бот не начал опрашивать getUpdates')
+            started = time.perf_counter()
+            threads = [threading.Thread(target=user.run, args=(args.flows,)) for user in users.values()]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            if process is not None:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+            api.stop()
+
+    report(users.values(), elapsed, api)
+
+
+def report(users, elapsed: float, api: FakeTelegram) -> None:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    timeouts = 0
+    for user in users:
+        timeouts += user.timeouts
+        for label, values in user.latencies.items():
+            latencies[label].extend(values)
+    total = sum(len(values) for values in latencies.values())
+    print(f'{"шаг":<12}{"n":>7}{"p50, мс":>10}{"p99, мс":>10}{"max, мс":>10}')
+    for label, values in latencies.items():
+        print(f'{label:<12}{len(values):>7}{percentile(values, 50) * 1000:>10.1f}'
+              f'{percentile(values, 99) * 1000:>10.1f}{max(values) * 1000:>10.1f}')
+    print(f'Апдейтов обработано: {total} за {elapsed:.1f} с ({total / elapsed:.1f} в секунду), '
+          f'без ответа: {timeouts}')
+    print(f'Вызовы API: {dict(api.calls)}, ответов 429: {api.throttled}')
+
+
+if __name__ == '__main__':
+    main()
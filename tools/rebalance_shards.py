@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, List
+from utils.sharding import shard_dir, shard_of
+from utils.storage import STORAGE_BACKEND, atomic_write, create_storage
+
+# Файлы папки данных шарда (whitelist.json общий и остаётся на месте)
+USER_FILES = ('users.json', 'users.journal', 'users.journal.old', 'users.db', 'users.db-wal', 'users.db-shm')
+SESSION_FILE = 'session.json'
+REMINDERS_FILE = 'reminders.json'
+PENDING_DELETIONS_FILE = 'pending_deletions.json'
+MEDIA_CACHE_FILE = 'media_cache.json'
+SHARD_FILES = USER_FILES + (SESSION_FILE, REMINDERS_FILE, PENDING_DELETIONS_FILE, MEDIA_CACHE_FILE)
+
+
+def read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_layout(data_dir: str, shards: int, backend: str) -> Dict[str, object]:
+    """
+    Читает данные всех шардов: пользователей, сессии, подписки на напоминания,
+    запланированные удаления и кэш file_id.
+    """
+    layout = {'users': {}, 'sessions': {}, 'reminders': {}, 'deletions': [], 'media': {}}
+    for index in range(shards):
+        directory = shard_dir(data_dir, index, shards)
+        if any(os.path.exists(os.path.join(directory, name)) for name in USER_FILES):
+            storage = create_storage(backend, directory)
+            layout['users'].update(storage.load_users())
+            storage.close()
+        layout['sessions'].update(read_json(os.path.join(directory, SESSION_FILE), {}))
+        layout['reminders'].update(read_json(os.path.join(directory, REMINDERS_FILE), {}))
+        layout['deletions'].extend(read_json(os.path.join(directory, PENDING_DELETIONS_FILE), []))
+        layout['media'].update(read_json(os.path.join(directory, MEDIA_CACHE_FILE), {}))
+    return layout
+
+
+def existing_files(data_dir: str, shards: int) -> List[str]:
+    return [os.path.join(shard_dir(data_dir, index, shards), name)
+            for index in range(shards) for name in SHARD_FILES
+            if os.path.exists(os.path.join(shard_dir(data_dir, index, shards), name))]
+
+
+def backup(files: List[str], data_dir: str) -> str:
+    """
+    Переносит старые файлы в data/rebalance-backup-<время>, сохраняя их пути внутри data.
+    """
+    backup_dir = os.path.join(data_dir, f'rebalance-backup-{time.strftime("%Y%m%d-%H%M%S")}')
+    suffix = 1
+    while os.path.exists(backup_dir):
+        backup_dir = os.path.join(data_dir, f'rebalance-backup-{time.strftime("%Y%m%d-%H%M%S")}-{suffix}')
+        suffix += 1
+    for path in files:
+        target = os.path.join(backup_dir, os.path.relpath(path, data_dir))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(path, target)
+    return backup_dir
+
+
+def write_layout(layout: Dict[str, object], data_dir: str, shards: int, backend: str) -> List[int]:
+    """
+    Раскладывает данные по shards шардам. Возвращает число пользователей в каждом.
+    """
+    def split(items: dict) -> List[dict]:
+        parts = [{} for _ in range(shards)]
+        for uid, value in items.items():
+            parts[shard_of(int(uid), shards)][uid] = value
+        return parts
+
+    users, sessions, reminders = split(layout['users']), split(layout['sessions']), split(layout['reminders'])
+    deletions = [[] for _ in range(shards)]
+    for entry in layout['deletions']:
+        # личные чаты: chat_id совпадает с id пользователя
+        deletions[shard_of(entry[1], shards)].append(entry)
+    for index in range(shards):
+        directory = shard_dir(data_dir, index, shards)
+        os.makedirs(directory, exist_ok=True)
+        if users[index]:
+            storage = create_storage(backend, directory)
+            storage.save_users(users[index])
+            storage.close()
+        if sessions[index]:
+            atomic_write(os.path.join(directory, SESSION_FILE),
+                         json.dumps(sessions[index], ensure_ascii=False, indent=4))
+        if reminders[index]:
+            atomic_write(os.path.join(directory, REMINDERS_FILE), json.dumps(reminders[index]))
+        if deletions[index]:
+            atomic_write(os.path.join(directory, PENDING_DELETIONS_FILE), json.dumps(deletions[index]))
+        if layout['media']:
+            # file_id не зависят от пользователя - кэш нужен каждому шарду
+            atomic_write(os.path.join(directory, MEDIA_CACHE_FILE),
+                         json.dumps(layout['media'], ensure_ascii=False, indent=4))
+    return [len(part) for part in users]
+
+
+def main() -> None:
+    # Запускать при остановленном боте:
+    # python -m tools.rebalance_shards --from 1 --to 4 [--data-dir data] [--backend json]
+    parser = argparse.ArgumentParser(description='Перераспределение данных пользователей между шардами')
+    parser.add_argument('--from', dest='old', type=int, required=True, help='текущее число шардов')
+    parser.add_argument('--to', dest='new', type=int, required=True, help='новое число шардов')
+    parser.add_argument('--data-dir', default=os.getenv('DATA_DIR', 'data'))
+    parser.add_argument('--backend', default=STORAGE_BACKEND, choices=('json', 'journal', 'sqlite'))
+    args = parser.parse_args()
+    if args.old < 1 or args.new < 1:
+        sys.exit('Число шардов должно быть не меньше 1')
+
+    old_files = existing_files(args.data_dir, args.old)
+    # файлы в папках новой раскладки, которые не входят в старую, были бы перезаписаны
+    stray = sorted(set(existing_files(args.data_dir, args.new)) - set(old_files))
+    if stray:
+        sys.exit(f'В папках новой раскладки уже есть данные: {", ".join(stray)}')
+    layout = load_layout(args.data_dir, args.old, args.backend)
+    backup_dir = backup(old_files, args.data_dir)
+    counts = write_layout(layout, args.data_dir, args.new, args.backend)
+    print(f'Пользователей: {len(layout["users"])}, по шардам: {counts}')
+    print(f'Сессий: {len(layout["sessions"])}, подписок на напоминания: {len(layout["reminders"])}, '
+          f'удалений: {len(layout["deletions"])}')
+    print(f'Старые файлы: {backup_dir}')
+
+
+if __name__ == '__main__':
+    main()
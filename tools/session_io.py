@@ -0,0 +1,88 @@
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+OPS = ('reads', 'writes', 'file_reads', 'file_writes')
+
+
+def run(users: int, flows: int) -> None:
+    """
+    Прогоняет сценарий /start -> main_new -> schedule -> день -> block_add -> название,
+    начало, конец для users пользователей по flows раз (апдейты обрабатываются
+    в текущем потоке, Bot API - FakeTelegram) и печатает обращения к сессиям
+    на один вызов каждого обработчика.
+    """
+    from tools.fake_telegram import FakeTelegram
+    api = FakeTelegram()
+    api.start()
+    os.environ['TELEGRAM_API_URL'] = api.url
+    from telebot import types
+    import main  # noqa: F401 - регистрирует обработчики
+    from bot import bot
+    from utils.logger import bind_message_handlers
+    from utils.session import flush_sessions, session_io
+
+    bot.threaded = False
+    bind_message_handlers(bot)
+    update_ids = itertools.count(1)
+    message_ids = itertools.count(1)
+
+    def send(user_id: int, text: str = '', data: str = '') -> None:
+        chat = {'id': user_id, 'type': 'private'}
+        sender = {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}
+        if data:
+            update = {'callback_query': {
+                'id': str(next(message_ids)), 'from': sender, 'chat_instance': str(user_id), 'data': data,
+                'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat,
+                            'photo': [{'file_id': 'menu', 'file_unique_id': 'menu', 'width': 1, 'height': 1}]}}}
+        else:
+            message = {'message_id': next(message_ids), 'date': int(time.time()), 'chat': chat,
+                       'from': sender, 'text': text}
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+            update = {'message': message}
+        bot.process_new_updates([types.Update.de_json(dict(update, update_id=next(update_ids)))])
+
+    for user_id in range(1, users + 1):
+        for i in range(flows):
+            hour = i % 23
+            send(user_id, '/start')
+            send(user_id, data='main_new')
+            send(user_id, data='schedule')
+            send(user_id, data='day_mon')
+            send(user_id, data='block_add:day_mon')
+            for text in (f'Блок {i}', f'{hour:02d}:00', f'{hour:02d}:30'):
+                send(user_id, text)
+    flush_sessions()
+    api.stop()
+
+    by_handler = defaultdict(dict)
+    for (handler, op), count in session_io.items():
+        by_handler[handler][op] = count
+    calls = users * flows
+    print(f'{users} пользователей по {flows} сценариев; обращений на вызов обработчика '
+          f'(handle_block_entry - на сообщение, их три за сценарий; "-" - на сценарий вне обработчиков: '
+          f'фильтры message_handler до выбора обработчика, поток записи сессий)')
+    print(f'{"обработчик":<26}' + ''.join(f'{op:>12}' for op in OPS))
+    for handler in sorted(by_handler):
+        per = calls * 3 if handler == 'handle_block_entry' else calls
+        print(f'{handler:<26}' + ''.join(f'{by_handler[handler].get(op, 0) / per:>12.2f}' for op in OPS))
+
+
+def main() -> None:
+    # python -m tools.session_io [--users 10] [--flows 5]
+    parser = argparse.ArgumentParser(description='Обращения к сессиям по обработчикам')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--flows', type=int, default=5, help='сценариев на пользователя')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ.update(DATA_DIR=data_dir, BOT_TOKEN=os.getenv('BOT_TOKEN', '123456:bench'))
+        os.environ.pop('SQLITE_FILE', None)
+        run(args.users, args.flows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ('json', 'journal', 'sqlite')
+USER_ID = 1
+DAY = 'monday'
+
+
+def run_backend(threads: int, adds: int) -> int:
+    """
+    Выполняется в дочернем процессе с DATA_DIR и STORAGE_BACKEND из окружения:
+    threads потоков одновременно добавляют по adds блоков одному пользователю,
+    затем хранилище закрывается и день перечитывается с диска новым экземпляром.
+    Возвращает число потерянных или лишних блоков.
+    """
+    from utils.schedule import add_block
+    from utils.storage import STORAGE_BACKEND, create_storage, ensure_user, flush_users
+
+    ensure_user(USER_ID)
+    start = threading.Barrier(threads)
+    failures = []
+
+    def worker(index: int) -> None:
+        rnd = random.Random(index)
+        start.wait()
+        for i in range(adds):
+            minute = rnd.randrange(24 * 60 - 1)
+            if not add_block(USER_ID, DAY, f'{index}-{i}',
+                             f'{minute // 60:02d}:{minute % 60:02d}', f'{(minute + 1) // 60:02d}:{(minute + 1) % 60:02d}'):
+                failures.append((index, i))
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    flush_users()
+
+    blocks = create_storage(STORAGE_BACKEND).get_day(USER_ID, DAY)
+    titles = {block.title for block in blocks}
+    expected = threads * adds
+    print(f'{STORAGE_BACKEND:<8} блоков {len(blocks)}/{expected}, уникальных {len(titles)}, '
+          f'ошибок add_block {len(failures)}, {elapsed:.2f} с')
+    return abs(expected - len(blocks)) + (expected - len(titles)) + len(failures)
+
+
+def main() -> None:
+    # Стресс-тест одновременного добавления блоков одному пользователю:
+    # python -m tools.stress_add_blocks [--threads 32] [--adds 100] [--backend sqlite]
+    parser = argparse.ArgumentParser(description='Одновременные add_block одного пользователя из многих потоков')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--adds', type=int, default=100, help='блоков на поток')
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='бэкенд хранилища (можно несколько; по умолчанию все)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        sys.exit(1 if run_backend(args.threads, args.adds) else 0)
+
+    failed = []
+    for backend in args.backend or BACKENDS:
+        # хранилище создаётся при импорте по окружению, поэтому каждый бэкенд - в своём процессе
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = dict(os.environ, DATA_DIR=data_dir, STORAGE_BACKEND=backend, BOT_TOKEN='123456:stress')
+            env.pop('SQLITE_FILE', None)
+            code = subprocess.call([sys.executable, '-m', 'tools.stress_add_blocks', '--child',
+                                    '--threads', str(args.threads), '--adds', str(args.adds)],
+                                   cwd=REPO_DIR, env=env)
+        if code:
+            failed.append(backend)
+    if failed:
+        sys.exit(f'Потеряны или задвоены блоки: {", ".join(failed)}')
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from typing import FrozenSet, Optional, Tuple
+from telebot import asyncio_handler_backends
+from telebot.async_telebot import AsyncTeleBot
+from telebot.handler_backends import BaseMiddleware, CancelUpdate
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.storage import WHITELIST_FILE, load_whitelist
+
+# Как часто (в секундах) проверять mtime файла белого списка
+WHITELIST_CHECK_INTERVAL = float(os.getenv('WHITELIST_CHECK_INTERVAL', 1))
+
+access_rejected = metrics.counter(
+    'bot_access_rejected_total', 'Апдейты от пользователей не из белого списка', ('update_type',))
+
+
+class Whitelist:
+    """
+    Белый список в памяти (frozenset id).
+    Файл перечитывается, только когда меняются его mtime или размер,
+    а сами они проверяются не чаще раза в check_interval секунд.
+    Если файла нет, доступ открыт всем (как до появления белого списка);
+    если файл есть, но не читается, доступ закрыт всем до его исправления.
+    """
+
+    def __init__(self, path: str = WHITELIST_FILE, check_interval: float = WHITELIST_CHECK_INTERVAL) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._ids: Optional[FrozenSet[int]] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            ids = None
+        else:
+            try:
+                ids = frozenset(int(user_id) for user_id in load_whitelist(self.path))
+            except (TypeError, ValueError) as e:
+                logger.warning(f'Некорректный белый список {self.path}: {e}')
+                ids = frozenset()
+        self._ids, self._stamp = ids, stamp
+        logger.info(f'Белый список: {"выключен" if ids is None else f"{len(ids)} пользователей"}')
+
+    def allows(self, user_id: int) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            # файл проверяет один поток, остальные пользуются текущим списком
+            # (при первой проверке ждут её: списка ещё нет)
+            if self._lock.acquire(blocking=self._checked_at == float('-inf')):
+                try:
+                    self._refresh()
+                    self._checked_at = now
+                finally:
+                    self._lock.release()
+        ids = self._ids
+        return ids is None or user_id in ids
+
+
+class AccessMiddleware(BaseMiddleware):
+    """
+    Отсекает апдейты пользователей не из белого списка до всех обработчиков
+    (и до их фильтров, которые читают сессии): такой апдейт стоит одной проверки в frozenset.
+    """
+
+    def __init__(self, whitelist: Whitelist) -> None:
+        super().__init__()
+        self.update_types = ['message', 'edited_message', 'callback_query']
+        self.whitelist = whitelist
+
+    def pre_process(self, update, data):
+        if is_rejected(self.whitelist, update):
+            return CancelUpdate()
+        return None
+
+    def post_process(self, update, data, exception):
+        pass
+
+
+class AsyncAccessMiddleware(asyncio_handler_backends.BaseMiddleware):
+    """
+    То же для AsyncTeleBot. Проверка не ждёт ввода-вывода: файл списка
+    проверяется через stat не чаще раза в check_interval секунд.
+    """
+
+    def __init__(self, whitelist: Whitelist) -> None:
+        super().__init__()
+        self.update_types = ['message', 'edited_message', 'callback_query']
+        self.whitelist = whitelist
+
+    async def pre_process(self, update, data):
+        if is_rejected(self.whitelist, update):
+            return asyncio_handler_backends.CancelUpdate()
+        return None
+
+    async def post_process(self, update, data, exception):
+        pass
+
+
+def is_rejected(whitelist: Whitelist, update) -> bool:
+    from_user = update.from_user
+    if from_user is not None and not whitelist.allows(from_user.id):
+        access_rejected.inc(update.__class__.__name__)
+        return True
+    return False
+
+
+whitelist = Whitelist()
+
+
+def setup_access(bot) -> None:
+    """
+    Подключает проверку доступа ко всем обработчикам бота (TeleBot или AsyncTeleBot).
+    """
+    if isinstance(bot, AsyncTeleBot):
+        bot.setup_middleware(AsyncAccessMiddleware(whitelist))
+    else:
+        bot.setup_middleware(AccessMiddleware(whitelist))
@@ -0,0 +1,158 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+from telebot.asyncio_helper import ApiTelegramException
+from async_bot import bot
+from utils.logger import logger
+from utils.media import media_cache
+from utils.metrics import telegram_seconds, telegram_errors
+from utils.outbound import OutboundDispatcher, outbound, retry_after, INTERACTIVE, OUTBOUND_MAX_RETRIES
+from utils.render import MessageViews, View, is_not_modified, views
+from utils.router import CallbackRouter
+
+# Потоки для вызовов хранилища и сессий из асинхронных обработчиков
+ASYNC_BLOCKING_THREADS = int(os.getenv('ASYNC_BLOCKING_THREADS', 8))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+async def blocking(func: Callable, /, *args, **kwargs):
+    """
+    Выполняет синхронную функцию (хранилище, сессии, файлы) в пуле потоков,
+    не останавливая цикл событий. Контекст лога (handler, user_id) переходит в поток.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(ASYNC_BLOCKING_THREADS, thread_name_prefix='blocking')
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_blocking() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+class AsyncOutbound:
+    """
+    Исходящие вызовы AsyncTeleBot с теми же правилами, что у OutboundDispatcher,
+    и на тех же вёдрах (dispatcher.reserve): глобальный лимит общий с фоновыми потоками.
+    Ожидание лимита - asyncio.sleep в задаче обработчика, без очереди и потоков;
+    токены выдаются по очереди ожидания (asyncio.Lock будит ждущих по порядку),
+    иначе при нехватке токенов отдельные вызовы ждали бы секундами.
+    Пауза чата после 429 ждётся до очереди, чтобы не задерживать остальные чаты.
+    """
+
+    def __init__(self, dispatcher: OutboundDispatcher = outbound, max_retries: int = OUTBOUND_MAX_RETRIES) -> None:
+        self.dispatcher = dispatcher
+        self.max_retries = max_retries
+        self._turn = asyncio.Lock()
+
+    async def _acquire(self, chat_id: int, priority: int) -> None:
+        pause = self.dispatcher.chat_pause(chat_id)
+        while pause > 0:
+            await asyncio.sleep(pause)
+            pause = self.dispatcher.chat_pause(chat_id)
+        async with self._turn:
+            wait = self.dispatcher.reserve(chat_id, priority)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.dispatcher.reserve(chat_id, priority)
+
+    async def call(self, chat_id: int, func: Callable, /, *args, priority: int = INTERACTIVE, **kwargs):
+        """
+        Вызывает корутину func(*args, **kwargs) с учётом лимитов и возвращает её результат.
+        """
+        attempts = 0
+        while True:
+            await self._acquire(chat_id, priority)
+            attempts += 1
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except ApiTelegramException as e:
+                telegram_errors.inc(func.__name__, str(e.error_code))
+                if e.error_code != 429 or attempts > self.max_retries:
+                    raise
+                delay = retry_after(e)
+                self.dispatcher.pause_chat(chat_id, time.monotonic() + delay)
+                logger.warning(f'429 для чата {chat_id}, повтор через {delay} с')
+            except Exception as e:
+                telegram_errors.inc(func.__name__, type(e).__name__)
+                raise
+            finally:
+                telegram_seconds.observe(time.perf_counter() - started, func.__name__)
+
+
+async_outbound = AsyncOutbound()
+
+
+class AsyncMessageViews:
+    """
+    Правки сообщений для асинхронного режима. Состояние показанного общее
+    с MessageViews: лишняя правка не отправляется в Telegram и здесь.
+    """
+
+    def __init__(self, shown: MessageViews) -> None:
+        self.shown = shown
+
+    async def _edit(self, chat_id: int, message_id: int, view: View, func: Callable, **kwargs) -> bool:
+        if not self.shown.needs_edit(chat_id, message_id, view):
+            return False
+        try:
+            await async_outbound.call(chat_id, func, chat_id=chat_id, message_id=message_id, **kwargs)
+        except ApiTelegramException as e:
+            if not is_not_modified(e):
+                raise
+        self.shown.remember(chat_id, message_id, view)
+        return True
+
+    async def edit_caption(self, chat_id: int, message_id: int, caption: str,
+                           reply_markup=None, parse_mode: Optional[str] = 'html') -> bool:
+        return await self._edit(chat_id, message_id, MessageViews.caption_view(caption, reply_markup),
+                                bot.edit_message_caption,
+                                caption=caption, reply_markup=reply_markup, parse_mode=parse_mode)
+
+    async def edit_reply_markup(self, chat_id: int, message_id: int, reply_markup=None) -> bool:
+        return await self._edit(chat_id, message_id, MessageViews.markup_view(reply_markup),
+                                bot.edit_message_reply_markup, reply_markup=reply_markup)
+
+
+async_views = AsyncMessageViews(views)
+
+
+def read_bytes(file_path: str) -> bytes:
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+
+async def send_photo(chat_id: int, file_path: str, **kwargs):
+    """
+    MediaCache.send_photo для асинхронного режима: кэш file_id тот же,
+    чтение и запись его файла - в пуле потоков.
+    """
+    file_id = await blocking(media_cache.get, file_path)
+    if file_id is not None:
+        try:
+            return await async_outbound.call(chat_id, bot.send_photo, chat_id=chat_id, photo=file_id, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            logger.warning(f'file_id для {file_path} отклонён, загружаем заново: {e}')
+            await blocking(media_cache.forget, file_path)
+    photo = await blocking(read_bytes, file_path)
+    msg = await async_outbound.call(chat_id, bot.send_photo, chat_id=chat_id, photo=photo, **kwargs)
+    await blocking(media_cache.put, file_path, msg.photo[-1].file_id)
+    return msg
+
+
+async_router = CallbackRouter()
+# Один обработчик AsyncTeleBot на все callback-запросы
+bot.callback_query_handler(func=lambda call: True)(async_router.dispatch_async)
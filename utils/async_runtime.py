@@ -0,0 +1,50 @@
+import asyncio
+from async_bot import bot
+from utils.access import setup_access
+from utils.aio import shutdown_blocking
+from utils.logger import bind_message_handlers, logger
+from utils.messages import deletions
+from utils.metrics import instrument_message_handlers, start_metrics_server
+from utils.reminders import reminders
+from utils.session import flush_sessions
+from utils.storage import flush_users
+
+
+async def serve() -> None:
+    try:
+        await bot.infinity_polling()
+    finally:
+        await bot.close_session()
+
+
+def run_async() -> None:
+    """
+    Точка входа асинхронного режима (python main.py --async).
+    Апдейты обрабатываются корутинами async_handlers/*.py в одном цикле событий:
+    ожидание Bot API не занимает потоков, хранилище и сессии - в пуле blocking().
+    Удаления сообщений и напоминания по-прежнему работают в своих потоках
+    через синхронный бот и OutboundDispatcher.
+    """
+    # порядок тот же, что у handlers/*.py в main.py: фильтры сообщений проверяются по порядку
+    import async_handlers.start  # noqa: F401
+    import async_handlers.main_menu  # noqa: F401
+    import async_handlers.schedule  # noqa: F401
+    import async_handlers.todolist  # noqa: F401
+    import async_handlers.reminders  # noqa: F401
+    setup_access(bot)
+    bind_message_handlers(bot)
+    instrument_message_handlers(bot)
+    start_metrics_server()
+    deletions.start()
+    reminders.start()
+    logger.info('Асинхронный режим (AsyncTeleBot)')
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass  # Ctrl+C или SIGTERM (interrupt_on_signal) - штатная остановка, как у infinity_polling
+    finally:
+        reminders.stop()
+        deletions.stop()
+        shutdown_blocking()
+        flush_sessions()
+        flush_users()
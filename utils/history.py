@@ -0,0 +1,48 @@
+import os
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+from utils.model import Block
+
+UNDO_HISTORY_LIMIT = int(os.getenv('UNDO_HISTORY_LIMIT', 20))
+
+# Снимок дня: неизменяемый кортеж блоков. Блоки тоже неизменяемы, поэтому снимок
+# копирует только ссылки на них и разделяет блоки с днём и с соседними снимками
+Snapshot = Tuple[Block, ...]
+
+
+class DayHistory:
+    """
+    Ограниченная история отмены и повтора изменений одного дня.
+    Хранит снимки дня до изменений (undo) и после отменённых изменений (redo);
+    старые снимки сверх limit вытесняются. Новое изменение очищает redo.
+    Вызывается под блокировкой пользователя.
+    """
+    __slots__ = ('undo_stack', 'redo_stack')
+
+    def __init__(self, limit: int = UNDO_HISTORY_LIMIT) -> None:
+        self.undo_stack: Deque[Snapshot] = deque(maxlen=limit)
+        self.redo_stack: List[Snapshot] = []
+
+    def push(self, before: Snapshot) -> None:
+        """Запоминает состояние дня перед изменением."""
+        self.undo_stack.append(before)
+        self.redo_stack.clear()
+
+    def undo(self, current: Snapshot) -> Optional[Snapshot]:
+        """
+        Возвращает состояние до последнего изменения или None, если отменять нечего.
+        current - текущее состояние дня, к нему можно будет вернуться через redo.
+        """
+        if not self.undo_stack:
+            return None
+        self.redo_stack.append(current)
+        return self.undo_stack.pop()
+
+    def redo(self, current: Snapshot) -> Optional[Snapshot]:
+        """
+        Возвращает состояние, отменённое последним undo, или None.
+        """
+        if not self.redo_stack:
+            return None
+        self.undo_stack.append(current)
+        return self.redo_stack.pop()
@@ -0,0 +1,57 @@
+from bisect import bisect_left
+from itertools import accumulate
+from typing import List, Optional, Tuple
+from utils.model import Block
+
+DAY_MINUTES = 24 * 60
+
+
+class DayIntervals:
+    """
+    Индекс интервалов одного дня для проверки пересечений и поиска свободного времени.
+    Строится по блокам, уже отсортированным по началу: массив начал
+    и префиксный максимум концов. Интервалы полуоткрытые - [start, end),
+    поэтому блок 09:00–10:00 не пересекается с блоком 10:00–11:00.
+    """
+    __slots__ = ('blocks', 'starts', 'max_ends')
+
+    def __init__(self, blocks: List[Block]) -> None:
+        self.blocks = list(blocks)  # хранилище может вернуть живой список дня
+        self.starts = [block.start for block in self.blocks]
+        self.max_ends = list(accumulate((block.end for block in self.blocks), max))
+
+    def conflicts(self, start: int, end: int, exclude: Optional[int] = None) -> List[Tuple[int, Block]]:
+        """
+        Возвращает (индекс, блок) всех блоков, пересекающихся с [start, end).
+        exclude - индекс блока, который не учитывается (при редактировании).
+        Кандидаты - блоки с началом до end (бинарный поиск); перебор идёт
+        от последнего из них и обрывается, как только префиксный максимум
+        концов перестаёт заходить за start.
+        """
+        found = []
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            block = self.blocks[i]
+            if block.end > start and i != exclude and block.start < end:
+                found.append((i, block))
+            i -= 1
+        found.reverse()
+        return found
+
+    def free_slots(self, min_duration: int = 0, day_start: int = 0,
+                   day_end: int = DAY_MINUTES) -> List[Tuple[int, int]]:
+        """
+        Возвращает свободные промежутки [start, end) внутри [day_start, day_end)
+        длиной не меньше min_duration минут.
+        """
+        slots = []
+        cursor = day_start
+        for block in self.blocks:
+            if block.start >= day_end:
+                break
+            if block.start - cursor >= max(min_duration, 1):
+                slots.append((cursor, block.start))
+            cursor = max(cursor, block.end)
+        if day_end - cursor >= max(min_duration, 1):
+            slots.append((cursor, day_end))
+        return slots
@@ -0,0 +1,258 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from utils.storage import (JsonStorage, atomic_write, replace_block, USERS_FILE, JOURNAL_FILE,
+                           JOURNAL_COMPACT_BYTES, JOURNAL_SEQ_KEY)
+from utils.logger import logger
+from utils.metrics import record_io
+from utils.model import Block, blocks_from_dicts, decode_user, encode_json, insert_block
+
+# Недописанный хвост журнала ищется с конца файла такими порциями
+JOURNAL_TAIL_CHUNK = 64 * 1024
+
+
+def truncate_torn_tail(path: str) -> None:
+    """
+    Обрезает недописанную последнюю строку журнала (падение посреди записи).
+    Иначе следующая запись дописалась бы в ту же строку и пропала при восстановлении вместе с ней.
+    """
+    with open(path, 'rb+') as f:
+        end = position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(JOURNAL_TAIL_CHUNK, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b'\n')
+            if newline >= 0:
+                position += newline + 1 - step
+                break
+            position -= step
+        if position < end:
+            f.truncate(position)
+            logger.warning(f'Обрезана недописанная запись журнала {path} ({end - position} байт)')
+
+
+def apply_record(users: dict, record: Dict) -> None:
+    """
+    Применяет запись журнала к словарю пользователей.
+    Операции над блоками повторяют соответствующие методы JsonStorage.
+    """
+    if 'user' in record:
+        users[record['u']] = decode_user(record['user'])
+    elif 'todolist' in record:
+        users[record['u']]['todolist'] = record['todolist']
+        if 'next_id' in record:
+            users[record['u']]['todo_next_id'] = record['next_id']
+    elif 'blocks' in record:
+        users[record['u']]['schedule'][record['d']] = blocks_from_dicts(record['blocks'])
+    else:
+        blocks = users[record['u']]['schedule'][record['d']]
+        if record['op'] == 'add':
+            insert_block(blocks, Block.from_dict(record['block']))
+        elif record['op'] == 'edit':
+            replace_block(blocks, record['i'], record['fields'])
+        else:
+            del blocks[record['i']]
+
+
+def copy_users(users: dict) -> dict:
+    """
+    Копия словаря пользователей для записи снимка вне блокировки:
+    копируются списки, которые меняются на месте; блоки и дела неизменяемы и разделяются.
+    """
+    return {uid: dict(user, schedule={day: list(blocks) for day, blocks in user['schedule'].items()},
+                      todolist=list(user['todolist']))
+            for uid, user in users.items()}
+
+
+class JournalStorage(JsonStorage):
+    """
+    Хранилище "снимок + журнал".
+    Снимок - обычный users.json, каждое изменение дописывается в журнал
+    одной строкой: добавление, изменение и удаление блока - самой операцией
+    (блок или индекс), замена дня целиком (копирование, очистка, отмена) - новым
+    содержимым дня, поэтому цена записи не зависит ни от числа пользователей,
+    ни от числа блоков в дне.
+    Записи пронумерованы, снимок хранит номер последней вошедшей в него записи
+    (JOURNAL_SEQ_KEY), и при восстановлении более старые записи пропускаются:
+    операции не идемпотентны, а после падения посреди сжатия старый журнал
+    остаётся рядом с уже записанным снимком.
+    Когда журнал превышает compact_bytes, фоновый поток сворачивает его в новый снимок.
+    """
+
+    def __init__(self, path: str = USERS_FILE, journal_path: str = JOURNAL_FILE,
+                 compact_bytes: int = JOURNAL_COMPACT_BYTES) -> None:
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.compact_bytes = compact_bytes
+        self._journal = None
+        self._journal_size = 0
+        self._seq = 0
+        self._compactor: Optional[threading.Thread] = None
+
+    @property
+    def _old_journal_path(self) -> str:
+        return f'{self.journal_path}.old'
+
+    def _read_file(self) -> dict:
+        """
+        Загружает снимок и проигрывает поверх него журналы.
+        """
+        users = super()._read_file()
+        self._seq = self._snapshot_seq
+        for path in (self._old_journal_path, self.journal_path):
+            if os.path.exists(path):
+                truncate_torn_tail(path)
+                self._replay(users, path)
+        return users
+
+    def _replay(self, users: dict, path: str) -> None:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f'Пропущена повреждённая запись журнала {path}')
+                    continue
+                # записи без номера - из журналов до нумерации, они идемпотентны
+                seq = record.get('s')
+                if seq is not None:
+                    if seq <= self._snapshot_seq:
+                        continue
+                    self._seq = max(self._seq, seq)
+                apply_record(users, record)
+
+    def _open_journal(self) -> None:
+        if self._journal is None:
+            if os.path.dirname(self.journal_path):
+                os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_size = self._journal.tell()
+
+    def _append(self, record: Dict) -> None:
+        """
+        Дописывает запись в журнал под очередным номером и при необходимости запускает сжатие.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._seq += 1
+            record['s'] = self._seq
+            line = json.dumps(record, ensure_ascii=False, default=encode_json) + '\n'
+            size = len(line.encode('utf-8'))
+            self._open_journal()
+            self._journal.write(line)
+            self._journal.flush()
+            self._journal_size += size
+            if self._journal_size >= self.compact_bytes and self._compactor is None:
+                self._compactor = threading.Thread(
+                    target=self._compact_in_background, name='users-compactor', daemon=True)
+                self._compactor.start()
+        record_io('journal_append', started, size)
+
+    def _log_day(self, user_id: int, day: str) -> None:
+        uid = str(user_id)
+        self._append({'u': uid, 'd': day, 'blocks': self._users[uid]['schedule'][day]})
+
+    def _mark_dirty(self, *uids: str) -> None:
+        # Изменения фиксируются журналом, периодическая перезапись файла не нужна
+        pass
+
+    def ensure_user(self, user_id: int, first_name: str = '', last_name: str = '') -> Dict:
+        uid = str(user_id)
+        with self._lock:
+            created = uid not in self._get_users()
+            user = super().ensure_user(user_id, first_name, last_name)
+            if created:
+                self._append({'u': uid, 'user': user})
+            return user
+
+    def append_block(self, user_id: int, day: str, block: Block) -> None:
+        with self._lock:
+            super().append_block(user_id, day, block)
+            self._append({'u': str(user_id), 'd': day, 'op': 'add', 'block': block})
+
+    def update_block(self, user_id: int, day: str, index: int, fields: Dict) -> None:
+        with self._lock:
+            super().update_block(user_id, day, index, fields)
+            self._append({'u': str(user_id), 'd': day, 'op': 'edit', 'i': index, 'fields': fields})
+
+    def delete_block(self, user_id: int, day: str, index: int) -> None:
+        with self._lock:
+            super().delete_block(user_id, day, index)
+            self._append({'u': str(user_id), 'd': day, 'op': 'delete', 'i': index})
+
+    def set_day(self, user_id: int, day: str, blocks: List[Block]) -> None:
+        with self._lock:
+            super().set_day(user_id, day, blocks)
+            self._log_day(user_id, day)
+
+    def set_todolist(self, user_id: int, items: List[Dict], next_id: int) -> None:
+        uid = str(user_id)
+        with self._lock:
+            super().set_todolist(user_id, items, next_id)
+            self._append({'u': uid, 'todolist': items, 'next_id': next_id})
+
+    def save_users(self, users: dict) -> None:
+        """
+        Полная замена данных сразу записывается новым снимком.
+        """
+        with self._lock:
+            self._users = users
+        self.compact()
+
+    def _compact_in_background(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f'Не удалось сжать журнал {self.journal_path}: {e}')
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def compact(self) -> None:
+        """
+        Сворачивает журнал в новый снимок.
+        Под блокировкой только копируем списки и переключаем журнал,
+        сериализация и запись снимка идут параллельно с новыми изменениями.
+        """
+        with self._write_lock:
+            started = time.perf_counter()
+            with self._lock:
+                users = copy_users(self._get_users())
+                users[JOURNAL_SEQ_KEY] = self._seq
+                if self._journal is not None:
+                    self._journal.close()
+                    self._journal = None
+                if os.path.exists(self.journal_path):
+                    if os.path.exists(self._old_journal_path):
+                        # остался от прерванного сжатия: его записи ещё не в снимке
+                        with open(self.journal_path, 'r', encoding='utf-8') as src, \
+                                open(self._old_journal_path, 'a', encoding='utf-8') as dst:
+                            dst.write(src.read())
+                        os.remove(self.journal_path)
+                    else:
+                        os.replace(self.journal_path, self._old_journal_path)
+                self._journal_size = 0
+            data = json.dumps(users, ensure_ascii=False, indent=4, default=encode_json)
+            record_io('save_users', started, atomic_write(self.path, data))
+            if os.path.exists(self._old_journal_path):
+                os.remove(self._old_journal_path)
+
+    def flush(self) -> None:
+        """
+        Гарантирует, что журнал дошёл до диска.
+        """
+        with self._lock:
+            if self._journal is not None:
+                os.fsync(self._journal.fileno())
+
+    def close(self) -> None:
+        """
+        Ждёт фонового сжатия и сворачивает журнал, чтобы следующий запуск был быстрым.
+        """
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        if self._users is not None:
+            self.compact()
@@ -0,0 +1,36 @@
+from functools import lru_cache, wraps
+from typing import Callable
+from telebot import types
+
+
+class FrozenMarkup(types.InlineKeyboardMarkup):
+    """
+    Неизменяемая inline-клавиатура: JSON собирается один раз при создании,
+    а telebot при каждой отправке получает готовую строку.
+    """
+
+    def __init__(self, markup: types.InlineKeyboardMarkup) -> None:
+        super().__init__(inline_keyboard=[list(row) for row in markup.inline_keyboard],
+                         row_width=markup.row_width)
+        self._json = super().to_json()
+
+    def to_json(self) -> str:
+        return self._json
+
+    def add(self, *args, **kwargs):
+        raise TypeError('FrozenMarkup нельзя изменять')
+
+    row = add
+
+
+def memoized_markup(builder: Callable[..., types.InlineKeyboardMarkup]):
+    """
+    Декоратор построителя клавиатуры: для каждого набора аргументов
+    клавиатура строится и сериализуется один раз, дальше отдаётся из кэша.
+    Аргументы должны быть хешируемыми (строки callback_data и т.п.).
+    """
+    @lru_cache(maxsize=256)
+    @wraps(builder)
+    def wrapper(*args, **kwargs) -> FrozenMarkup:
+        return FrozenMarkup(builder(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import threading
+from functools import wraps
+
+USER_LOCK_STRIPES = int(os.getenv('USER_LOCK_STRIPES', 64))
+
+
+class StripedLock:
+    """
+    Набор блокировок, разбитый на полосы по user_id.
+    Обновления одного пользователя выполняются последовательно,
+    обновления разных пользователей (почти всегда в разных полосах) - параллельно.
+    Блокировки реентерабельные, поэтому вложенные вызовы не зависают.
+    """
+
+    def __init__(self, stripes: int = USER_LOCK_STRIPES) -> None:
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def for_user(self, user_id: int) -> threading.RLock:
+        """
+        Возвращает блокировку полосы пользователя.
+        """
+        return self._locks[int(user_id) % len(self._locks)]
+
+
+user_locks = StripedLock()
+
+
+def user_lock(user_id: int) -> threading.RLock:
+    """
+    Блокировка пользователя для использования в with.
+    """
+    return user_locks.for_user(user_id)
+
+
+def serialized_by_user(handler):
+    """
+    Декоратор обработчика telebot: апдейты одного пользователя
+    обрабатываются по очереди, даже если пришли в разные потоки пула.
+    """
+    @wraps(handler)
+    def wrapper(update, *args, **kwargs):
+        with user_lock(update.from_user.id):
+            return handler(update, *args, **kwargs)
+    return wrapper
+
+
+class AsyncStripedLock:
+    """
+    То же для асинхронного режима: asyncio.Lock на полосу.
+    Блокировки потоков здесь не подходят - все обработчики выполняются в одном потоке цикла событий.
+    Эти блокировки не реентерабельные.
+    """
+
+    def __init__(self, stripes: int = USER_LOCK_STRIPES) -> None:
+        self._locks = [asyncio.Lock() for _ in range(stripes)]
+
+    def for_user(self, user_id: int) -> asyncio.Lock:
+        return self._locks[int(user_id) % len(self._locks)]
+
+
+async_user_locks = AsyncStripedLock()
+
+
+def serialized_by_user_async(handler):
+    """
+    Декоратор асинхронного обработчика: апдейты одного пользователя
+    обрабатываются по очереди, хотя их задачи идут в цикле событий вперемешку.
+    """
+    @wraps(handler)
+    async def wrapper(update, *args, **kwargs):
+        async with async_user_locks.for_user(update.from_user.id):
+            return await handler(update, *args, **kwargs)
+    return wrapper
@@ -1,13 +1,220 @@
+import atexit
+import inspect
+import json
 import logging
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from collections import OrderedDict
+from typing import Dict, List, Optional
 
+LOG_FILE = os.getenv('LOG_FILE', 'logs/bot.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# text - как раньше, json - одна JSON-строка на запись
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# Ротация по размеру; если задан LOG_ROTATE_WHEN (например, midnight) - по времени
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+# Не больше LOG_DUPLICATE_BURST одинаковых записей за LOG_DUPLICATE_INTERVAL секунд
+LOG_DUPLICATE_INTERVAL = float(os.getenv('LOG_DUPLICATE_INTERVAL', 60))
+LOG_DUPLICATE_BURST = int(os.getenv('LOG_DUPLICATE_BURST', 10))
+# сколько разных сообщений отслеживается, прежде чем истёкшие окна удаляются
+LOG_DUPLICATE_KEYS = 10000
 
-os.makedirs('logs', exist_ok=True)
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ('user_id', 'handler', 'latency_ms')
 
-logging.basicConfig(
-    filename='logs/bot.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Контекст текущего обработчика: handler, user_id и момент начала
+_context: ContextVar[Optional[Dict]] = ContextVar('log_context', default=None)
 
+
+@contextmanager
+def log_context(handler: str, user_id: Optional[int] = None):
+    """
+    Записи лога внутри блока получают поля handler, user_id
+    и latency_ms - сколько прошло с начала обработки.
+    """
+    token = _context.set({'handler': handler, 'user_id': user_id, 'started': time.perf_counter()})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_handler() -> Optional[str]:
+    """
+    Имя обработчика из log_context или None вне обработчика.
+    """
+    context = _context.get()
+    return context['handler'] if context is not None else None
+
+
+def bind_handler(handler):
+    """
+    Декоратор обработчика telebot: выполняет его внутри log_context
+    (обработчик может быть и корутиной - для асинхронного режима).
+    """
+    if inspect.iscoroutinefunction(handler):
+        @wraps(handler)
+        async def async_wrapper(update, *args, **kwargs):
+            from_user = getattr(update, 'from_user', None)
+            with log_context(handler.__name__, from_user.id if from_user else None):
+                return await handler(update, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(handler)
+    def wrapper(update, *args, **kwargs):
+        from_user = getattr(update, 'from_user', None)
+        with log_context(handler.__name__, from_user.id if from_user else None):
+            return handler(update, *args, **kwargs)
+    return wrapper
+
+
+def bind_message_handlers(bot) -> None:
+    """
+    Оборачивает зарегистрированные message_handler в log_context
+    (callback-запросы оборачивает router).
+    """
+    for handler in bot.message_handlers:
+        handler['function'] = bind_handler(handler['function'])
+
+
+class ContextFilter(logging.Filter):
+    """
+    Добавляет к записи поля из log_context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _context.get()
+        if context is not None:
+            record.handler = context['handler']
+            record.user_id = context['user_id']
+            record.latency_ms = round((time.perf_counter() - context['started']) * 1000, 1)
+        return True
+
+
+class DuplicateFilter(logging.Filter):
+    """
+    Ограничивает поток одинаковых записей при лавине ошибок.
+    Одинаковыми считаются записи одного уровня с одинаковым итоговым текстом,
+    поэтому разные ошибки с одного места в коде (например, для разных пользователей)
+    не подавляют друг друга. Каждая запись пропускается не больше burst раз
+    за interval секунд; число подавленных дописывается к её первому повтору
+    в следующем интервале.
+    Окна упорядочены по началу интервала: истёкшие удаляются из начала,
+    а сверх max_keys вытесняются самые старые, даже если ещё не истекли.
+    """
+
+    def __init__(self, interval: float = LOG_DUPLICATE_INTERVAL, burst: int = LOG_DUPLICATE_BURST,
+                 max_keys: int = LOG_DUPLICATE_KEYS) -> None:
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        # (уровень, текст) -> [начало интервала, пропущено, подавлено]
+        self._windows: 'OrderedDict[tuple, List]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.levelno, record.getMessage())
+        now = record.created
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                self._windows.move_to_end(key)
+                self._evict(now)
+            else:
+                if window[1] >= self.burst:
+                    window[2] += 1
+                    return False
+                window[1] += 1
+                suppressed = 0
+        if suppressed:
+            record.msg = f'{record.getMessage()} (подавлено похожих записей: {suppressed})'
+            record.args = None
+        return True
+
+    def _evict(self, now: float) -> None:
+        """Удаляет истёкшие окна и лишние сверх max_keys из начала (под self._lock)."""
+        while self._windows:
+            window = next(iter(self._windows.values()))
+            if len(self._windows) <= self.max_keys and now - window[0] < self.interval:
+                break
+            self._windows.popitem(last=False)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна JSON-строка на запись: время, уровень, логгер, сообщение
+    и поля контекста (user_id, handler, latency_ms), если они есть.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+def create_file_handler(path: str = LOG_FILE) -> logging.Handler:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if LOG_ROTATE_WHEN:
+        handler = TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN,
+                                           backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    else:
+        handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES,
+                                      backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def setup_logging() -> QueueListener:
+    """
+    Потоки обработчиков только кладут запись в очередь,
+    на диск её пишет отдельный поток QueueListener.
+    Фильтры работают в потоке, где вызван логгер: контекст берётся оттуда,
+    а подавленные дубликаты даже не попадают в очередь.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # в очередь уходит только текст сообщения, оформление - в create_file_handler
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    queue_handler.addFilter(DuplicateFilter())
+    queue_handler.addFilter(ContextFilter())
+    logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler])
+    listener = QueueListener(log_queue, create_file_handler(), respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging() -> None:
+    """
+    Дописывает оставшиеся в очереди записи и останавливает поток записи (повторный вызов безопасен).
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+listener: Optional[QueueListener] = setup_logging()
+atexit.register(stop_logging)
 logger = logging.getLogger('bot')
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from telebot.apihelper import ApiTelegramException
+from bot import bot
+from utils.logger import logger
+from utils.outbound import outbound
+from utils.storage import atomic_write, DATA_DIR
+
+MEDIA_CACHE_FILE = os.path.join(DATA_DIR, 'media_cache.json')
+
+
+class MediaCache:
+    """
+    Кэш file_id загруженных в Telegram файлов.
+    После первой загрузки файл отправляется по file_id без повторной передачи байтов.
+    Ключ - путь и sha256 содержимого, так что изменённый файл загрузится заново.
+    """
+
+    def __init__(self, path: str = MEDIA_CACHE_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._file_ids: Optional[Dict[str, str]] = None
+        # (путь, mtime, размер) -> sha256, чтобы не хешировать файл на каждую отправку
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+
+    def _load(self) -> Dict[str, str]:
+        if self._file_ids is None:
+            self._file_ids = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._file_ids = json.load(f)
+                except (json.JSONDecodeError, OSError):
+                    pass
+        return self._file_ids
+
+    def _save(self) -> None:
+        atomic_write(self.path, json.dumps(self._file_ids, ensure_ascii=False, indent=4))
+
+    def key(self, file_path: str) -> str:
+        """
+        Ключ кэша для файла: путь и хеш содержимого.
+        """
+        stat = os.stat(file_path)
+        stamp = (file_path, stat.st_mtime_ns, stat.st_size)
+        digest = self._hashes.get(stamp)
+        if digest is None:
+            with open(file_path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            self._hashes[stamp] = digest
+        return f'{file_path}:{digest}'
+
+    def get(self, file_path: str) -> Optional[str]:
+        with self._lock:
+            return self._load().get(self.key(file_path))
+
+    def put(self, file_path: str, file_id: str) -> None:
+        with self._lock:
+            self._load()[self.key(file_path)] = file_id
+            self._save()
+
+    def forget(self, file_path: str) -> None:
+        with self._lock:
+            if self._load().pop(self.key(file_path), None) is not None:
+                self._save()
+
+    def send_photo(self, chat_id: int, file_path: str, **kwargs):
+        """
+        Отправляет фото по file_id из кэша, а если его нет
+        или Telegram его отклонил - загружает файл и запоминает новый file_id.
+        Отправка идёт через очередь исходящих (лимиты и повтор при 429).
+        """
+        file_id = self.get(file_path)
+        if file_id is not None:
+            try:
+                return outbound.call(chat_id, bot.send_photo, chat_id=chat_id, photo=file_id, **kwargs)
+            except ApiTelegramException as e:
+                if e.error_code != 400:
+                    raise
+                logger.warning(f'file_id для {file_path} отклонён, загружаем заново: {e}')
+                self.forget(file_path)
+        # байты, а не открытый файл: при повторе после 429 файл отправляется заново целиком
+        with open(file_path, 'rb') as f:
+            photo = f.read()
+        msg = outbound.call(chat_id, bot.send_photo, chat_id=chat_id, photo=photo, **kwargs)
+        self.put(file_path, msg.photo[-1].file_id)
+        return msg
+
+
+media_cache = MediaCache()
@@ -1,8 +1,165 @@
+import heapq
+import itertools
+import json
+import os
 import threading
-from typing import Dict, List, Any
+import time
+from concurrent.futures import Future
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.outbound import outbound, BACKGROUND
+from utils.storage import atomic_write, DATA_DIR
 from bot import bot
 
+PENDING_DELETIONS_FILE = os.path.join(DATA_DIR, 'pending_deletions.json')
+# deleteMessages принимает не больше 100 id за раз
+BULK_DELETE_LIMIT = 100
+# удаления, до срока которых осталось меньше этого, выполняются вместе
+COALESCE_WINDOW = 0.05
+# пауза перед повторной записью файла удалений после ошибки, секунды
+PERSIST_RETRY_DELAY = 1
+
+
+class DeletionScheduler:
+    """
+    Отложенное удаление сообщений в одном потоке.
+    Сроки лежат в куче, удаления с одинаковым сроком в одном чате
+    объединяются в вызовы deleteMessages (до 100 id).
+    Невыполненные удаления сохраняются в файл и переживают перезапуск;
+    файл пишет поток удалений вне self._cond, поэтому schedule() не ждёт диска.
+    """
+
+    def __init__(self, path: str = PENDING_DELETIONS_FILE) -> None:
+        self.path = path
+        self._heap: List[Tuple[float, int, int, List[int]]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._dirty = False
+        self._stopped = False
+        self.api_calls = 0
+
+    def start(self) -> None:
+        """
+        Загружает сохранённые удаления и запускает поток.
+        """
+        with self._cond:
+            if self._thread is not None:
+                return
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        for due, chat_id, msg_ids in json.load(f):
+                            heapq.heappush(self._heap, (due, next(self._seq), chat_id, msg_ids))
+                except (json.JSONDecodeError, OSError, ValueError) as e:
+                    logger.warning(f'Не удалось загрузить {self.path}: {e}')
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='message-deleter', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Останавливает поток и сохраняет ещё не выполненные удаления.
+        """
+        with self._cond:
+            thread = self._thread
+            self._stopped = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._thread = None
+            self._dirty = True
+        self._persist()
+
+    def schedule(self, chat_id: int, msg_ids: List[int], delay: float = 0) -> None:
+        """
+        Планирует удаление сообщений чата через delay секунд.
+        """
+        if not msg_ids:
+            return
+        self.start()
+        with self._cond:
+            heapq.heappush(self._heap, (time.time() + delay, next(self._seq), chat_id, list(msg_ids)))
+            self._dirty = True
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(entry[3]) for entry in self._heap)
+
+    def _persist(self) -> None:
+        """
+        Сохраняет очередь удалений, если она менялась: копия берётся под self._cond,
+        запись идёт вне блокировки.
+        """
+        with self._write_lock:
+            with self._cond:
+                if not self._dirty:
+                    return
+                entries = [[due, chat_id, msg_ids] for due, _, chat_id, msg_ids in self._heap]
+                self._dirty = False
+            try:
+                atomic_write(self.path, json.dumps(entries))
+            except OSError:
+                with self._cond:
+                    self._dirty = True
+                raise
+
+    def _take_due(self) -> Dict[int, List[int]]:
+        """
+        Ждёт ближайшего срока и забирает все созревшие удаления, сгруппированные по чатам.
+        Возвращает пустой словарь сразу, если очередь нужно сохранить.
+        Вызывается под self._cond.
+        """
+        while not self._stopped:
+            now = time.time()
+            if self._heap and self._heap[0][0] <= now + COALESCE_WINDOW:
+                due: Dict[int, List[int]] = {}
+                while self._heap and self._heap[0][0] <= now + COALESCE_WINDOW:
+                    _, _, chat_id, msg_ids = heapq.heappop(self._heap)
+                    due.setdefault(chat_id, []).extend(msg_ids)
+                self._dirty = True
+                return due
+            if self._dirty:
+                return {}
+            self._cond.wait(self._heap[0][0] - now if self._heap else None)
+        return {}
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                due = self._take_due()
+                if self._stopped:
+                    # вернём забранное обратно, чтобы сохранить при остановке
+                    for chat_id, msg_ids in due.items():
+                        heapq.heappush(self._heap, (time.time(), next(self._seq), chat_id, msg_ids))
+                    return
+            for chat_id, msg_ids in due.items():
+                for i in range(0, len(msg_ids), BULK_DELETE_LIMIT):
+                    chunk = msg_ids[i:i + BULK_DELETE_LIMIT]
+                    self.api_calls += 1
+                    future = outbound.submit(chat_id, bot.delete_messages, chat_id, chunk,
+                                             priority=BACKGROUND)
+                    future.add_done_callback(partial(self._report, chat_id, chunk))
+            try:
+                self._persist()
+            except OSError as e:
+                logger.error(f'Не удалось сохранить {self.path}: {e}')
+                with self._cond:
+                    self._cond.wait(PERSIST_RETRY_DELAY)  # без этого поток повторял бы запись в цикле
+
+    @staticmethod
+    def _report(chat_id: int, msg_ids: List[int], future: Future) -> None:
+        if future.exception() is not None:
+            logger.warning(f'Не удалось удалить сообщения {msg_ids} в чате {chat_id}: {future.exception()}')
+
+
+deletions = DeletionScheduler()
+
 
 class MessageTracker:
     """
@@ -24,18 +181,16 @@ class MessageTracker:
         Если delay=0, удаление произойдет сразу.
         """
         messages = self.tracked_messages.pop(user_id, [])
+        deletions.schedule(chat_id, messages, delay)
 
-        def delete_msgs():
-            for msg_id in messages:
-                try:
-                    bot.delete_message(chat_id, msg_id)
-                except Exception as e:
-                    print(f'Не удалось удалить сообщение {msg_id}: {e}')
-
-        if delay > 0:
-            threading.Timer(delay, delete_msgs).start()
-        else:
-            delete_msgs()
+    def backlog(self) -> int:
+        """
+        Сколько сообщений отслеживается и ещё не передано на удаление.
+        """
+        return sum(len(msg_ids) for msg_ids in list(self.tracked_messages.values()))
 
 
 tracker = MessageTracker()
+metrics.gauge('bot_tracked_messages', 'Отслеживаемые сообщения, ещё не переданные на удаление',
+              tracker.backlog)
+metrics.gauge('bot_pending_deletions', 'Сообщения, ожидающие удаления', deletions.pending)
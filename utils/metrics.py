@@ -0,0 +1,249 @@
+import inspect
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Метрики включаются, если задан порт эндпоинта /metrics (METRICS_PORT=9100)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+METRICS_ENABLED = METRICS_PORT > 0
+
+# Границы корзин гистограмм длительности, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """
+    Монотонный счётчик с метками.
+    """
+    kind = 'counter'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str,
+                 labels: Tuple[str, ...] = ()) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        if not self.registry.enabled:
+            return
+        with self.registry.lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labels, values)} {value}'
+                for values, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами (как в Prometheus: le - верхняя граница).
+    """
+    kind = 'histogram'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, help: str,
+                 labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # метки -> [счётчики корзин..., +Inf], сумма
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        if not self.registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self.registry.lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, values)} {total[0]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, values)} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """
+    Значение, которое вычисляется функцией в момент опроса (ничего не стоит между опросами).
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]) -> None:
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def samples(self) -> List[str]:
+        return [f'{self.name} {self.func()}']
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик с выводом в текстовом формате Prometheus.
+    Если метрики выключены, inc/observe возвращаются сразу,
+    а instrument оставляет функцию без обёртки.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self._metrics: List = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(self, name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(self, name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        metric = Gauge(name, help, func)
+        self._metrics.append(metric)
+        return metric
+
+    def instrument(self, handler: Callable, name: Optional[str] = None) -> Callable:
+        """
+        Оборачивает обработчик (функцию или корутину) замером длительности и подсчётом ошибок.
+        """
+        if not self.enabled:
+            return handler
+        name = name or handler.__name__
+
+        if inspect.iscoroutinefunction(handler):
+            @wraps(handler)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await handler(*args, **kwargs)
+                except Exception:
+                    handler_errors.inc(name)
+                    raise
+                finally:
+                    handler_seconds.observe(time.perf_counter() - started, name)
+            return async_wrapper
+
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            except Exception:
+                handler_errors.inc(name)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - started, name)
+        return wrapper
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for metric in self._metrics:
+                if isinstance(metric, Gauge):
+                    continue
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                lines.extend(metric.samples())
+        # функции датчиков могут брать свои блокировки - вызываем их вне self.lock
+        for metric in self._metrics:
+            if isinstance(metric, Gauge):
+                lines.append(f'# HELP {metric.name} {metric.help}')
+                lines.append(f'# TYPE {metric.name} gauge')
+                lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+handler_seconds = metrics.histogram(
+    'bot_handler_seconds', 'Длительность обработчиков апдейтов', ('handler',))
+handler_errors = metrics.counter(
+    'bot_handler_errors_total', 'Исключения в обработчиках апдейтов', ('handler',))
+io_seconds = metrics.histogram(
+    'bot_io_seconds', 'Длительность загрузки и сохранения данных', ('op',))
+io_bytes = metrics.counter(
+    'bot_io_bytes_total', 'Прочитано и записано байт при загрузке и сохранении', ('op',))
+telegram_seconds = metrics.histogram(
+    'bot_telegram_request_seconds', 'Длительность вызовов Bot API', ('method',))
+telegram_errors = metrics.counter(
+    'bot_telegram_errors_total', 'Ошибки вызовов Bot API', ('method', 'code'))
+
+
+def record_io(op: str, started: float, size: int) -> None:
+    """
+    Учитывает операцию ввода-вывода op (load_users, save_users, load_sessions, save_sessions...),
+    начатую в started (time.perf_counter()), и её размер в байтах.
+    """
+    if not metrics.enabled:
+        return
+    io_seconds.observe(time.perf_counter() - started, op)
+    io_bytes.inc(op, amount=size)
+
+
+def instrument_message_handlers(bot) -> None:
+    """
+    Оборачивает все зарегистрированные message_handler замером длительности.
+    Вызывается после импорта handlers/*.py; callback-запросы замеряет router.
+    """
+    for handler in bot.message_handlers:
+        handler['function'] = metrics.instrument(handler['function'])
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        data = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """
+    Запускает эндпоинт /metrics в фоновом потоке (только если метрики включены).
+    """
+    if not metrics.enabled:
+        return None
+    httpd = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name='metrics', daemon=True).start()
+    return httpd
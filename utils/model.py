@@ -0,0 +1,108 @@
+from bisect import insort
+from typing import Dict, Iterable, List
+from utils.validation import time_to_minutes, minutes_to_time
+
+
+class Block:
+    """
+    Блок расписания: название и время начала/конца в минутах от полуночи.
+    Неизменяемый - правка создаёт новый блок, поэтому блоки можно
+    разделять между днями без копирования.
+    """
+    __slots__ = ('title', 'start', 'end')
+
+    def __init__(self, title: str, start: int, end: int) -> None:
+        object.__setattr__(self, 'title', title)
+        object.__setattr__(self, 'start', start)
+        object.__setattr__(self, 'end', end)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Block неизменяем, используйте replace()')
+
+    @classmethod
+    def parse(cls, title: str, start: str, end: str) -> 'Block':
+        """
+        Создаёт блок из времени в формате HH:MM.
+        """
+        start_min = time_to_minutes(start)
+        end_min = time_to_minutes(end)
+        if start_min is None or end_min is None:
+            raise ValueError(f'Некорректное время блока: {start} – {end}')
+        return cls(title, start_min, end_min)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Block':
+        return cls.parse(data['title'], data['start'], data['end'])
+
+    def to_dict(self) -> Dict:
+        """
+        Блок в формате users.json.
+        """
+        return {
+            'title': self.title,
+            'start': minutes_to_time(self.start),
+            'end': minutes_to_time(self.end)
+        }
+
+    def replace(self, **fields) -> 'Block':
+        """
+        Возвращает копию блока с изменёнными полями.
+        """
+        return Block(fields.get('title', self.title),
+                     fields.get('start', self.start),
+                     fields.get('end', self.end))
+
+    def sort_key(self):
+        return self.start, self.end
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Block):
+            return NotImplemented
+        return (self.title, self.start, self.end) == (other.title, other.start, other.end)
+
+    def __hash__(self) -> int:
+        return hash((self.title, self.start, self.end))
+
+    def __repr__(self) -> str:
+        return f'Block({self.title!r}, {minutes_to_time(self.start)}-{minutes_to_time(self.end)})'
+
+
+def insert_block(blocks: List[Block], block: Block) -> None:
+    """
+    Вставляет блок, сохраняя сортировку дня по началу (равные - в порядке добавления).
+    """
+    insort(blocks, block, key=Block.sort_key)
+
+
+def sorted_blocks(blocks: Iterable[Block]) -> List[Block]:
+    return sorted(blocks, key=Block.sort_key)
+
+
+def blocks_from_dicts(data: Iterable[Dict]) -> List[Block]:
+    """
+    Список блоков дня из users.json, отсортированный по началу.
+    """
+    return sorted_blocks(Block.from_dict(item) for item in data)
+
+
+def blocks_to_dicts(blocks: Iterable[Block]) -> List[Dict]:
+    return [block.to_dict() for block in blocks]
+
+
+def decode_user(user: Dict) -> Dict:
+    """
+    Переводит блоки пользователя из формата users.json в Block (на месте).
+    """
+    schedule = user.get('schedule', {})
+    for day, blocks in schedule.items():
+        schedule[day] = blocks_from_dicts(blocks)
+    return user
+
+
+def encode_json(value):
+    """
+    Для json.dumps(default=...): сериализует Block в формат users.json.
+    """
+    if isinstance(value, Block):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,277 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from telebot.apihelper import ApiTelegramException
+from utils.logger import logger
+from utils.metrics import metrics, telegram_seconds, telegram_errors
+
+# Лимиты Telegram: около 30 сообщений в секунду всего и около 1 в секунду в один чат.
+# Ведро чата сдерживает только фоновые рассылки (напоминания, удаления): ответы на действия
+# пользователя идут в его темпе и ждут лишь паузу чата после 429
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', 30))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', 1))
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', 10))
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', 8))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', 5))
+MAX_CHAT_BUCKETS = 10000
+
+# Приоритеты: меньше - раньше
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity накоплено.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """
+        Сколько секунд ждать до появления токена (0 - можно отправлять).
+        """
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        # интерактивные вызовы берут токен и из пустого ведра - долг не копится
+        self.tokens = max(self.tokens - 1, 0.0)
+
+    def pause(self, until: float) -> None:
+        """
+        Запрещает отправку до момента until (после ответа 429).
+        """
+        self.paused_until = max(self.paused_until, until)
+
+
+def retry_after(error: ApiTelegramException) -> int:
+    """
+    Пауза из ответа 429, секунды.
+    """
+    return (error.result_json or {}).get('parameters', {}).get('retry_after', 1)
+
+
+class Job:
+    __slots__ = ('chat_id', 'func', 'args', 'kwargs', 'priority', 'future', 'enqueued', 'attempts')
+
+    def __init__(self, chat_id: int, func: Callable, args: tuple, kwargs: dict, priority: int) -> None:
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+class OutboundDispatcher:
+    """
+    Единая очередь исходящих вызовов Bot API.
+    Поток планировщика выдаёт вызовы с учётом глобального ведра и ведра чата,
+    интерактивные вызовы идут раньше фоновых, а ответы 429 откладывают вызов
+    на retry_after секунд. Сами HTTP-запросы выполняются в пуле workers потоков.
+    Интерактивные вызовы не ждут токена ведра чата: обработчик ждёт их под
+    блокировкой пользователя, и сон из-за лимита задерживал бы каждый шаг сценария.
+    """
+
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST, workers: int = OUTBOUND_WORKERS,
+                 max_retries: int = OUTBOUND_MAX_RETRIES) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.workers = workers
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self._ready: List[Tuple[int, int, Job]] = []
+        self._delayed: List[Tuple[float, int, Job]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.metrics = {'dispatched': 0, 'sent': 0, 'failed': 0, 'retried_429': 0,
+                        'wait_total': 0.0, 'wait_max': 0.0}
+
+    def submit(self, chat_id: int, func: Callable, /, *args, priority: int = INTERACTIVE, **kwargs) -> Future:
+        """
+        Ставит вызов func(*args, **kwargs) в очередь. Возвращает Future с результатом.
+        """
+        job = Job(chat_id, func, args, kwargs, priority)
+        with self._cond:
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='outbound')
+                self._thread = threading.Thread(target=self._run, name='outbound-scheduler', daemon=True)
+                self._thread.start()
+            heapq.heappush(self._ready, (priority, next(self._seq), job))
+            self._cond.notify()
+        return job.future
+
+    def call(self, chat_id: int, func: Callable, /, *args, priority: int = INTERACTIVE, **kwargs):
+        """
+        То же, что submit, но дожидается результата (или исключения).
+        """
+        return self.submit(chat_id, func, *args, priority=priority, **kwargs).result()
+
+    def reserve(self, chat_id: int, priority: int = INTERACTIVE) -> float:
+        """
+        Берёт токены для вызова мимо очереди (асинхронный режим) и возвращает 0,
+        либо сколько секунд подождать. Вёдра общие с очередью, поэтому
+        глобальный лимит один на оба режима и фоновые потоки.
+        """
+        with self._cond:
+            now = time.monotonic()
+            bucket = self._chat_bucket(chat_id)
+            chat_wait = bucket.wait_time(now)
+            if priority == INTERACTIVE:
+                chat_wait = max(bucket.paused_until - now, 0.0)
+            wait = max(self.global_bucket.wait_time(now), chat_wait)
+            if wait <= 0:
+                self.global_bucket.take()
+                bucket.take()
+            return wait
+
+    def chat_pause(self, chat_id: int) -> float:
+        """
+        Сколько секунд чат ещё на паузе после 429.
+        """
+        with self._cond:
+            return max(self._chat_bucket(chat_id).paused_until - time.monotonic(), 0.0)
+
+    def pause_chat(self, chat_id: int, until: float) -> None:
+        with self._cond:
+            self._chat_bucket(chat_id).pause(until)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._ready) + len(self._delayed)
+
+    def stats(self) -> dict:
+        """
+        Метрики очереди: глубина, отправлено, ожидание в очереди.
+        """
+        with self._cond:
+            dispatched = self.metrics['dispatched']
+            return {
+                **self.metrics,
+                'queue_depth': len(self._ready) + len(self._delayed),
+                'wait_avg': self.metrics['wait_total'] / dispatched if dispatched else 0.0,
+            }
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._prune_buckets()
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _prune_buckets(self) -> None:
+        """
+        Удаляет вёдра чатов, которые давно не использовались (они уже полные).
+        """
+        now = time.monotonic()
+        idle = self.chat_burst / self.chat_rate
+        for chat_id, bucket in list(self.chat_buckets.items()):
+            if now - bucket.updated > idle and now >= bucket.paused_until:
+                del self.chat_buckets[chat_id]
+
+    def _next_job(self) -> Job:
+        """
+        Ждёт и возвращает следующий вызов, который можно отправить прямо сейчас.
+        Вызывается под self._cond.
+        """
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, job = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (job.priority, next(self._seq), job))
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            if not self._ready:
+                self._cond.wait(timeout)
+                continue
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                self._cond.wait(global_wait)
+                continue
+            _, _, job = heapq.heappop(self._ready)
+            bucket = self._chat_bucket(job.chat_id)
+            chat_wait = bucket.wait_time(now)
+            if job.priority == INTERACTIVE:
+                chat_wait = max(bucket.paused_until - now, 0.0)
+            if chat_wait > 0:
+                # чат занят - остальные чаты не ждут
+                heapq.heappush(self._delayed, (now + chat_wait, next(self._seq), job))
+                continue
+            self.global_bucket.take()
+            bucket.take()
+            return job
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                if job.attempts == 0:
+                    self.metrics['dispatched'] += 1
+                    waited = time.monotonic() - job.enqueued
+                    self.metrics['wait_total'] += waited
+                    self.metrics['wait_max'] = max(self.metrics['wait_max'], waited)
+            try:
+                self._executor.submit(self._execute, job)
+            except RuntimeError as e:
+                # интерпретатор завершается и уже остановил пул: оставшиеся вызовы не отправятся
+                job.future.set_exception(e)
+                return
+
+    def _execute(self, job: Job) -> None:
+        job.attempts += 1
+        started = time.perf_counter()
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            telegram_errors.inc(job.func.__name__, str(e.error_code))
+            if e.error_code == 429 and job.attempts <= self.max_retries:
+                delay = retry_after(e)
+                with self._cond:
+                    self.metrics['retried_429'] += 1
+                    until = time.monotonic() + delay
+                    self._chat_bucket(job.chat_id).pause(until)
+                    heapq.heappush(self._delayed, (until, next(self._seq), job))
+                    self._cond.notify()
+                logger.warning(f'429 для чата {job.chat_id}, повтор через {delay} с')
+                return
+            self._finish(job, error=e)
+        except Exception as e:
+            telegram_errors.inc(job.func.__name__, type(e).__name__)
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+        finally:
+            telegram_seconds.observe(time.perf_counter() - started, job.func.__name__)
+
+    def _finish(self, job: Job, result=None, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self.metrics['failed' if error else 'sent'] += 1
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+
+outbound = OutboundDispatcher()
+metrics.gauge('bot_outbound_queue_depth', 'Вызовы Bot API в очереди исходящих', outbound.queue_depth)
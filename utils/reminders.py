@@ -0,0 +1,299 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.logger import logger
+from utils.model import Block
+from utils.outbound import outbound, BACKGROUND
+from utils.schedule import WEEK_DAYS, add_day_listener
+from utils.storage import storage, atomic_write, DATA_DIR
+from utils.validation import minutes_to_time
+from bot import bot
+
+REMINDERS_FILE = os.path.join(DATA_DIR, 'reminders.json')
+REMINDER_DEFAULT_MINUTES = int(os.getenv('REMINDER_DEFAULT_MINUTES', 15))
+# не больше суток: тогда напоминания дня загружаются не раньше, чем за день до него
+REMINDER_MAX_MINUTES = 24 * 60
+# напоминания, опоздавшие больше чем на столько секунд (например, после простоя), не отправляются
+REMINDER_GRACE = float(os.getenv('REMINDER_GRACE', 300))
+# сколько напоминаний одновременно может стоять в очереди исходящих
+REMINDER_MAX_IN_FLIGHT = int(os.getenv('REMINDER_MAX_IN_FLIGHT', 100))
+# максимальный сон потока: защищает от перевода часов
+MAX_SLEEP = 60
+# куча пересобирается, когда устаревших записей больше, чем живых, и больше этого числа
+HEAP_COMPACT_MIN = 1000
+
+
+class ReminderScheduler:
+    """
+    Напоминания о блоках расписания за N минут до начала (по подписке).
+    Все сроки лежат в одной куче. Дни загружаются по одному: сегодня и завтра,
+    следующий - после полуночи, и только для подписчиков.
+    Новые даты загружаются вне self._cond и кладутся в кучу одной пачкой, поэтому
+    загрузка всех подписчиков не задерживает пересчёт дней из обработчиков.
+    При изменении дня пересчитываются только записи этого пользователя на этот день:
+    поколение (user_id, дата) увеличивается, устаревшие записи отбрасываются при извлечении
+    или при пересборке кучи, если их накопилось слишком много.
+    Время - локальное время сервера; clock можно подменить в тестах.
+    """
+
+    def __init__(self, path: str = REMINDERS_FILE, clock: Callable[[], float] = time.time) -> None:
+        self.path = path
+        self.clock = clock
+        # user_id -> {'chat_id': ..., 'minutes': ...}
+        self.subscriptions: Dict[int, dict] = self._load()
+        self._heap: List[Tuple[float, int, int, date, int, Block]] = []
+        self._generations: Dict[Tuple[int, date], int] = {}
+        # число живых записей в куче для каждого (user_id, дата)
+        self._live: Dict[Tuple[int, date], int] = {}
+        self._live_total = 0
+        self._loaded: List[date] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = threading.BoundedSemaphore(REMINDER_MAX_IN_FLIGHT)
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.sent = 0
+
+    def _load(self) -> Dict[int, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return {int(uid): sub for uid, sub in json.load(f).items()}
+        except (json.JSONDecodeError, OSError, ValueError) as e:
+            logger.warning(f'Не удалось загрузить {self.path}: {e}')
+            return {}
+
+    def _persist(self) -> None:
+        atomic_write(self.path, json.dumps(
+            {str(uid): sub for uid, sub in self.subscriptions.items()}))
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            thread = self._thread
+            self._stopped = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._thread = None
+
+    def subscribe(self, user_id: int, chat_id: int, minutes: int = REMINDER_DEFAULT_MINUTES) -> None:
+        """
+        Включает напоминания пользователя за minutes минут до начала блоков.
+        """
+        if not 0 <= minutes <= REMINDER_MAX_MINUTES:
+            raise ValueError(f'minutes должно быть от 0 до {REMINDER_MAX_MINUTES}')
+        with self._cond:
+            self.subscriptions[int(user_id)] = {'chat_id': chat_id, 'minutes': minutes}
+            self._persist()
+            for day in self._loaded:
+                self._schedule_user_day(int(user_id), day)
+            self._cond.notify()
+
+    def unsubscribe(self, user_id: int) -> bool:
+        """
+        Выключает напоминания. Записи в куче становятся устаревшими.
+        """
+        with self._cond:
+            if self.subscriptions.pop(int(user_id), None) is None:
+                return False
+            for day in self._loaded:
+                self._forget(int(user_id), day)
+            self._persist()
+            return True
+
+    def reschedule_day(self, user_id: int, day: str) -> None:
+        """
+        Пересчитывает напоминания пользователя на загруженные даты с днём недели day.
+        """
+        user_id = int(user_id)
+        with self._cond:
+            if user_id not in self.subscriptions:
+                return
+            for loaded in self._loaded:
+                if WEEK_DAYS[loaded.weekday()] == day:
+                    self._schedule_user_day(user_id, loaded)
+            self._cond.notify()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _forget(self, user_id: int, day: date) -> None:
+        """
+        Делает записи пользователя на дату day устаревшими (под self._cond).
+        """
+        key = (user_id, day)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        self._live_total -= self._live.pop(key, 0)
+
+    def _compact(self) -> None:
+        """
+        Убирает из кучи устаревшие записи (под self._cond).
+        """
+        self._heap = [entry for entry in self._heap
+                      if entry[2] in self.subscriptions
+                      and self._generations.get((entry[2], entry[3])) == entry[4]]
+        heapq.heapify(self._heap)
+
+    @staticmethod
+    def _read_day(user_id: int, day: date, minutes: int, now: float) -> Optional[List[Tuple[float, Block]]]:
+        """
+        Сроки напоминаний пользователя на дату day, ещё не наступившие к now.
+        Читает хранилище и не требует self._cond; None - пользователя нет.
+        """
+        midnight = datetime.combine(day, datetime.min.time())
+        try:
+            # копия: список дня JsonStorage могут менять другие потоки
+            blocks = tuple(storage.get_day(user_id, WEEK_DAYS[day.weekday()]))
+        except KeyError:
+            return None
+        entries = []
+        for block in blocks:
+            fire_at = (midnight + timedelta(minutes=block.start - minutes)).timestamp()
+            if fire_at >= now:
+                entries.append((fire_at, block))
+        return entries
+
+    def _install(self, user_id: int, day: date, entries: List[Tuple[float, Block]],
+                 heapify: bool = True) -> None:
+        """
+        Заменяет записи пользователя на дату day в куче (под self._cond).
+        heapify=False - записи только дописываются, кучу восстанавливает вызывающий.
+        """
+        key = (user_id, day)
+        self._forget(user_id, day)
+        generation = self._generations[key]
+        for fire_at, block in entries:
+            entry = (fire_at, next(self._seq), user_id, day, generation, block)
+            if heapify:
+                heapq.heappush(self._heap, entry)
+            else:
+                self._heap.append(entry)
+        self._live[key] = len(entries)
+        self._live_total += len(entries)
+        if len(self._heap) - self._live_total > max(self._live_total, HEAP_COMPACT_MIN):
+            self._compact()
+
+    def _schedule_user_day(self, user_id: int, day: date) -> None:
+        """
+        Кладёт в кучу напоминания пользователя на дату day (под self._cond).
+        """
+        entries = self._read_day(user_id, day, self.subscriptions[user_id]['minutes'], self.clock())
+        if entries is None:
+            return
+        self._install(user_id, day, entries)
+
+    def _advance_days(self, today: date) -> None:
+        """
+        Держит загруженными сегодня и завтра: догружает недостающие даты
+        и забывает прошедшие. Блоки новых дат читаются вне self._cond;
+        если день пользователя пересчитали, пока шло чтение, прочитанное отбрасывается
+        (поколение уже другое, в куче свежие записи).
+        """
+        with self._cond:
+            new_days = [day for day in (today, today + timedelta(days=1)) if day not in self._loaded]
+            self._loaded.extend(new_days)
+            if self._loaded[0] < today:
+                self._loaded = [day for day in self._loaded if day >= today]
+                self._generations = {key: gen for key, gen in self._generations.items()
+                                     if key[1] >= today}
+                for key in [key for key in self._live if key[1] < today]:
+                    self._live_total -= self._live.pop(key)
+            pending = [(user_id, day, self._generations.get((user_id, day), 0), subscription['minutes'])
+                       for day in new_days for user_id, subscription in self.subscriptions.items()]
+        if not pending:
+            return
+        now = self.clock()
+        batch = [(user_id, day, generation, self._read_day(user_id, day, minutes, now))
+                 for user_id, day, generation, minutes in pending]
+        with self._cond:
+            for user_id, day, generation, entries in batch:
+                if entries is not None and user_id in self.subscriptions \
+                        and self._generations.get((user_id, day), 0) == generation:
+                    self._install(user_id, day, entries, heapify=False)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def _take_due(self) -> Tuple[List[Tuple[int, dict, Block]], float]:
+        """
+        Забирает созревшие напоминания и возвращает их вместе с временем следующего срока
+        (под self._cond, после _advance_days).
+        """
+        now = self.clock()
+        today = datetime.fromtimestamp(now).date()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, user_id, day, generation, block = heapq.heappop(self._heap)
+            if self._generations.get((user_id, day)) != generation:
+                continue  # устаревшая запись
+            self._live[(user_id, day)] -= 1
+            self._live_total -= 1
+            if now - fire_at <= REMINDER_GRACE:
+                due.append((user_id, self.subscriptions[user_id], block))
+        tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time()).timestamp()
+        next_due = min(self._heap[0][0], tomorrow) if self._heap else tomorrow
+        return due, next_due
+
+    def run_pending(self) -> int:
+        """
+        Отправляет все созревшие напоминания. Возвращает их количество.
+        """
+        self._advance_days(self._today())
+        with self._cond:
+            due, _ = self._take_due()
+        for user_id, subscription, block in due:
+            self._send(subscription, block)
+        return len(due)
+
+    def _send(self, subscription: dict, block: Block) -> None:
+        # семафор ограничивает число напоминаний в очереди исходящих,
+        # чтобы массовая рассылка не вытесняла ответы пользователям
+        self._in_flight.acquire()
+        chat_id = subscription['chat_id']
+        text = (f'⏰ Через {subscription["minutes"]} мин.: {block.title}\n'
+                f'{minutes_to_time(block.start)} – {minutes_to_time(block.end)}')
+        future = outbound.submit(chat_id, bot.send_message, chat_id, text, priority=BACKGROUND)
+        future.add_done_callback(partial(self._report, chat_id))
+        self.sent += 1
+
+    def _report(self, chat_id: int, future: Future) -> None:
+        self._in_flight.release()
+        if future.exception() is not None:
+            logger.warning(f'Не удалось отправить напоминание в чат {chat_id}: {future.exception()}')
+
+    def _today(self) -> date:
+        return datetime.fromtimestamp(self.clock()).date()
+
+    def _run(self) -> None:
+        while True:
+            self._advance_days(self._today())
+            with self._cond:
+                if self._stopped:
+                    return
+                due, next_due = self._take_due()
+                if not due:
+                    self._cond.wait(min(max(next_due - self.clock(), 0), MAX_SLEEP))
+                    continue
+            for user_id, subscription, block in due:
+                self._send(subscription, block)
+
+
+reminders = ReminderScheduler()
+add_day_listener(reminders.reschedule_day)
@@ -0,0 +1,126 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+from telebot.apihelper import ApiTelegramException, _convert_markup
+from bot import bot
+from utils.outbound import outbound
+
+RENDER_CACHE_SIZE = 10000
+MESSAGE_VIEWS_SIZE = 50000
+
+# Показанное в сообщении: хеш подписи (None - подпись не менялась) и хеш клавиатуры
+View = Tuple[Optional[int], int]
+
+
+class LRUCache:
+    """
+    Небольшой потокобезопасный LRU-словарь.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: 'OrderedDict[Hashable, object]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class RenderCache:
+    """
+    Кэш отрисованных текстов по версии данных:
+    пока версия не изменилась, render не вызывается.
+    """
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE) -> None:
+        self._cache = LRUCache(max_size)
+
+    def get(self, key: Hashable, version: int, render: Callable[[], str]) -> str:
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        text = render()
+        self._cache.set(key, (version, text))
+        return text
+
+
+def is_not_modified(error: ApiTelegramException) -> bool:
+    return error.error_code == 400 and 'message is not modified' in error.description
+
+
+class MessageViews:
+    """
+    Помнит, что сейчас показано в сообщении (chat_id, message_id):
+    хеш подписи и хеш клавиатуры. Правка, которая ничего не меняет,
+    не отправляется в Telegram вовсе.
+    Все правки отслеживаемых сообщений должны идти через этот класс,
+    иначе запомненное состояние устареет.
+    """
+
+    def __init__(self, max_size: int = MESSAGE_VIEWS_SIZE) -> None:
+        self._views = LRUCache(max_size)
+
+    @staticmethod
+    def caption_view(caption: str, reply_markup=None) -> View:
+        return hash(caption), hash(_convert_markup(reply_markup))
+
+    @staticmethod
+    def markup_view(reply_markup=None) -> View:
+        return None, hash(_convert_markup(reply_markup))
+
+    def needs_edit(self, chat_id: int, message_id: int, view: View) -> bool:
+        """
+        Отличается ли view от того, что уже показано в сообщении.
+        """
+        current = self._views.get((chat_id, message_id))
+        return current is None or (view[0] is not None and view[0] != current[0]) or view[1] != current[1]
+
+    def remember(self, chat_id: int, message_id: int, view: View) -> None:
+        """
+        Запоминает view после успешной правки (подпись без изменений, если view[0] - None).
+        """
+        key = (chat_id, message_id)
+        current = self._views.get(key)
+        caption_hash = view[0] if view[0] is not None else (current[0] if current else None)
+        self._views.set(key, (caption_hash, view[1]))
+
+    def _edit(self, chat_id: int, message_id: int, view: View, func: Callable, **kwargs) -> bool:
+        if not self.needs_edit(chat_id, message_id, view):
+            return False
+        try:
+            outbound.call(chat_id, func, chat_id=chat_id, message_id=message_id, **kwargs)
+        except ApiTelegramException as e:
+            if not is_not_modified(e):
+                raise
+        self.remember(chat_id, message_id, view)
+        return True
+
+    def edit_caption(self, chat_id: int, message_id: int, caption: str,
+                     reply_markup=None, parse_mode: Optional[str] = 'html') -> bool:
+        """
+        Меняет подпись и клавиатуру. Возвращает False, если правка была не нужна.
+        """
+        return self._edit(chat_id, message_id, self.caption_view(caption, reply_markup),
+                          bot.edit_message_caption,
+                          caption=caption, reply_markup=reply_markup, parse_mode=parse_mode)
+
+    def edit_reply_markup(self, chat_id: int, message_id: int, reply_markup=None) -> bool:
+        """
+        Меняет только клавиатуру. Возвращает False, если правка была не нужна.
+        """
+        return self._edit(chat_id, message_id, self.markup_view(reply_markup),
+                          bot.edit_message_reply_markup, reply_markup=reply_markup)
+
+
+views = MessageViews()
@@ -0,0 +1,94 @@
+from typing import Callable, Dict, Optional, Tuple
+from bot import bot
+from utils.logger import logger, log_context
+from utils.metrics import metrics
+
+# Разделитель параметров в callback_data: 'todo_page:3' -> handler(call, '3')
+PARAM_SEPARATOR = ':'
+_HANDLER = ''  # ключ обработчика в узле префиксного дерева
+
+
+class CallbackRouter:
+    """
+    Маршрутизатор callback_data вместо перебора лямбд telebot.
+    Точные ключи лежат в словаре, префиксы - в префиксном дереве,
+    поэтому поиск обработчика не зависит от их количества.
+    Параметры передаются в самой callback_data через ':'.
+    Если метрики включены, обработчики регистрируются обёрнутыми замером длительности.
+    """
+
+    def __init__(self) -> None:
+        self._exact: Dict[str, Callable] = {}
+        self._prefixes: dict = {}
+
+    def route(self, *keys: str):
+        """
+        Декоратор: обработчик для точных значений callback_data.
+        Если данные имеют вид 'key:a:b', обработчик вызывается как handler(call, 'a', 'b').
+        """
+        def decorator(handler: Callable) -> Callable:
+            instrumented = metrics.instrument(handler)
+            for key in keys:
+                if key in self._exact:
+                    raise ValueError(f'Маршрут {key} уже зарегистрирован')
+                self._exact[key] = instrumented
+            return handler
+        return decorator
+
+    def prefix(self, prefix: str):
+        """
+        Декоратор: обработчик для всех callback_data, начинающихся с prefix.
+        Из нескольких подходящих префиксов выбирается самый длинный.
+        """
+        def decorator(handler: Callable) -> Callable:
+            node = self._prefixes
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[_HANDLER] = metrics.instrument(handler)
+            return handler
+        return decorator
+
+    def resolve(self, data: str) -> Tuple[Optional[Callable], tuple]:
+        """
+        Находит обработчик и параметры для callback_data.
+        """
+        handler = self._exact.get(data)
+        if handler is not None:
+            return handler, ()
+        key, separator, params = data.partition(PARAM_SEPARATOR)
+        if separator:
+            handler = self._exact.get(key)
+            if handler is not None:
+                return handler, tuple(params.split(PARAM_SEPARATOR))
+        found = None
+        node = self._prefixes
+        for char in data:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(_HANDLER, found)
+        return found, ()
+
+    def dispatch(self, call) -> None:
+        handler, params = self.resolve(call.data or '')
+        if handler is None:
+            logger.warning(f'Нет обработчика для callback_data {call.data!r}')
+            return
+        with log_context(handler.__name__, call.from_user.id):
+            handler(call, *params)
+
+    async def dispatch_async(self, call) -> None:
+        """
+        То же для асинхронного режима: обработчики - корутины.
+        """
+        handler, params = self.resolve(call.data or '')
+        if handler is None:
+            logger.warning(f'Нет обработчика для callback_data {call.data!r}')
+            return
+        with log_context(handler.__name__, call.from_user.id):
+            await handler(call, *params)
+
+
+router = CallbackRouter()
+# Один обработчик telebot на все callback-запросы
+bot.callback_query_handler(func=lambda call: True)(router.dispatch)
@@ -1,19 +1,132 @@
-import copy
-from typing import Optional
-from utils.storage import load_users, save_users
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.storage import storage
+from utils.locks import user_lock
 from utils.logger import logger
+from utils.model import Block, insert_block, sorted_blocks
+from utils.intervals import DayIntervals
+from utils.history import DayHistory, Snapshot
+from utils.render import LRUCache
+from utils.validation import time_to_minutes
+
+WEEK_DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DAY_INDEX_CACHE_SIZE = 10000
+DAY_HISTORY_CACHE_SIZE = 10000
+
+# Версии дней (user_id, day): каждое изменение увеличивает версию,
+# по ней кэшируется отрисованный текст дня
+_versions: Dict[Tuple[int, str], int] = {}
+# Подписчики на изменения дней: listener(user_id, day)
+_listeners: List[Callable[[int, str], None]] = []
+# Индексы интервалов дней: (user_id, day) -> (версия, DayIntervals)
+_indexes = LRUCache(DAY_INDEX_CACHE_SIZE)
+# История отмены изменений дней: (user_id, day) -> DayHistory (только в памяти процесса)
+_histories = LRUCache(DAY_HISTORY_CACHE_SIZE)
+# Снимки текущего состояния дней: (user_id, day) -> (версия, Snapshot).
+# Следующее изменение берёт состояние "до" отсюда, не перечитывая день из хранилища
+_snapshots = LRUCache(DAY_HISTORY_CACHE_SIZE)
+
+
+def day_version(user_id: int, day: str) -> int:
+    """Возвращает текущую версию дня пользователя."""
+    return _versions.get((int(user_id), day), 0)
+
+
+def _bump(user_id: int, day: str) -> None:
+    """Увеличивает версию дня (вызывается под блокировкой пользователя)."""
+    key = (int(user_id), day)
+    _versions[key] = _versions.get(key, 0) + 1
+    for listener in _listeners:
+        try:
+            listener(int(user_id), day)
+        except Exception as e:
+            logger.warning(f'Ошибка обработчика изменения {day} пользователя {user_id}: {e}')
+
+
+def _snapshot(user_id: int, day: str) -> Snapshot:
+    """
+    Снимок текущего состояния дня: из кэша снимков, если он соответствует версии дня,
+    иначе - копия ссылок на неизменяемые блоки из хранилища.
+    """
+    cached = _snapshots.get((int(user_id), day))
+    if cached is not None and cached[0] == day_version(user_id, day):
+        return cached[1]
+    return tuple(storage.get_day(user_id, day))
+
+
+def _history(user_id: int, day: str) -> DayHistory:
+    key = (int(user_id), day)
+    history = _histories.get(key)
+    if history is None:
+        history = DayHistory()
+        _histories.set(key, history)
+    return history
+
+
+def _commit(user_id: int, day: str, before: Snapshot, after: Optional[List[Block]] = None) -> None:
+    """
+    Запоминает снимок дня до изменения в истории отмены и увеличивает версию дня
+    (вызывается под блокировкой пользователя после успешной записи).
+    after - новое состояние дня, если оно известно без чтения хранилища;
+    изменения по номеру блока его не передают, и следующий снимок читается из хранилища.
+    """
+    _history(user_id, day).push(before)
+    _bump(user_id, day)
+    if after is not None:
+        _snapshots.set((int(user_id), day), (day_version(user_id, day), tuple(after)))
+
+
+def add_day_listener(listener: Callable[[int, str], None]) -> None:
+    """Регистрирует функцию, вызываемую после каждого изменения дня пользователя."""
+    _listeners.append(listener)
+
+
+def get_day(user_id: int, day: str) -> List[Block]:
+    """Возвращает блоки дня пользователя, отсортированные по началу."""
+    return storage.get_day(user_id, day)
+
+
+def day_index(user_id: int, day: str) -> DayIntervals:
+    """Возвращает индекс интервалов дня; перестраивается только после изменения дня."""
+    key = (int(user_id), day)
+    version = day_version(user_id, day)
+    cached = _indexes.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    index = DayIntervals(storage.get_day(user_id, day))
+    _indexes.set(key, (version, index))
+    return index
+
+
+def find_conflicts(user_id: int, day: str, start: str, end: str,
+                   exclude: Optional[int] = None) -> List[Block]:
+    """
+    Возвращает блоки дня, пересекающиеся с интервалом start–end.
+    exclude - номер блока (с 1), который не учитывается при редактировании.
+    """
+    start_min, end_min = time_to_minutes(start), time_to_minutes(end)
+    if start_min is None or end_min is None:
+        return []
+    skip = exclude - 1 if exclude is not None else None
+    return [block for _, block in day_index(user_id, day).conflicts(start_min, end_min, skip)]
+
+
+def free_slots(user_id: int, days=WEEK_DAYS, min_duration: int = 0,
+               day_start: int = 0, day_end: int = 24 * 60) -> Dict[str, List[Tuple[int, int]]]:
+    """Возвращает свободные промежутки (в минутах) по дням не короче min_duration."""
+    return {day: day_index(user_id, day).free_slots(min_duration, day_start, day_end)
+            for day in days}
 
 
 def add_block(user_id: int, day: str, title: str, start: str, end: str) -> bool:
     """Добавляет блок в расписание пользователя."""
-    users = load_users()
     try:
-        users[str(user_id)]['schedule'][day].append({
-            'title': title,
-            'start': start,
-            'end': end
-        })
-        save_users(users)
+        with user_lock(user_id):
+            block = Block.parse(title, start, end)
+            before = _snapshot(user_id, day)
+            storage.append_block(user_id, day, block)
+            after = list(before)
+            insert_block(after, block)
+            _commit(user_id, day, before, after)
         return True
     except Exception as e:
         logger.warning(
@@ -22,19 +135,57 @@ def add_block(user_id: int, day: str, title: str, start: str, end: str) -> bool:
         return False
 
 
+def find_batch_conflicts(user_id: int, day: str, blocks: List[Block]) -> List[List[Block]]:
+    """
+    Для каждого блока пакета возвращает блоки, с которыми он пересекается:
+    уже существующие блоки дня и другие блоки того же пакета.
+    """
+    existing = day_index(user_id, day)
+    order = sorted(range(len(blocks)), key=lambda i: blocks[i].sort_key())
+    position = {i: p for p, i in enumerate(order)}
+    batch = DayIntervals([blocks[i] for i in order])
+    return [[block for _, block in existing.conflicts(new.start, new.end)]
+            + [block for _, block in batch.conflicts(new.start, new.end, position[i])]
+            for i, new in enumerate(blocks)]
+
+
+def add_blocks(user_id: int, day: str, blocks: List[Block]) -> bool:
+    """
+    Добавляет пакет блоков в день одной записью в хранилище:
+    либо все блоки сразу, либо (при ошибке) ни одного.
+    """
+    try:
+        with user_lock(user_id):
+            before = _snapshot(user_id, day)
+            after = sorted_blocks(before + tuple(blocks))
+            storage.set_day(user_id, day, after)
+            _commit(user_id, day, before, after)
+        return True
+    except Exception as e:
+        logger.warning(
+            f'Не удалось добавить блоки в {day} пользователя {user_id}: {e}'
+        )
+        return False
+
+
 def edit_block(user_id: int, day: str, index: int, title: Optional[str] = None,
                start: Optional[str] = None, end: Optional[str] = None) -> bool:
     """Редактирует блок в расписании пользователя по индексу(-1)."""
-    users = load_users()
     try:
-        block = users[str(user_id)]['schedule'][day][index-1]
+        fields = {}
         if title is not None:
-            block['title'] = title
-        if start is not None:
-            block['start'] = start
-        if end is not None:
-            block['end'] = end
-        save_users(users)
+            fields['title'] = title
+        for key, value in (('start', start), ('end', end)):
+            if value is not None:
+                fields[key] = time_to_minutes(value)
+                if fields[key] is None:
+                    raise ValueError(f'Некорректное время: {value}')
+        if index < 1:
+            raise IndexError(index)
+        with user_lock(user_id):
+            before = _snapshot(user_id, day)
+            storage.update_block(user_id, day, index-1, fields)
+            _commit(user_id, day, before)
         return True
     except Exception as e:
         logger.warning(
@@ -45,10 +196,13 @@ def edit_block(user_id: int, day: str, index: int, title: Optional[str] = None,
 
 def delete_block(user_id: int, day: str, index: int) -> bool:
     """Удаляет блок из расписания пользователя по индексу(-1)."""
-    users = load_users()
     try:
-        users[str(user_id)]['schedule'][day].pop(index-1)
-        save_users(users)
+        if index < 1:
+            raise IndexError(index)
+        with user_lock(user_id):
+            before = _snapshot(user_id, day)
+            storage.delete_block(user_id, day, index-1)
+            _commit(user_id, day, before)
         return True
     except Exception as e:
         logger.warning(
@@ -59,15 +213,71 @@ def delete_block(user_id: int, day: str, index: int) -> bool:
 
 def copy_day(user_id: int, day_to: str, day_from: str) -> bool:
     """Копирует расписание одного дня в другой."""
-    users = load_users()
-    uid = str(user_id)
     try:
-        users[uid]['schedule'][day_to] = copy.deepcopy(
-            users[uid]['schedule'][day_from])
-        save_users(users)
+        with user_lock(user_id):
+            # блоки неизменяемы, поэтому их можно разделять между днями
+            blocks = list(storage.get_day(user_id, day_from))
+            before = _snapshot(user_id, day_to)
+            storage.set_day(user_id, day_to, blocks)
+            _commit(user_id, day_to, before, sorted_blocks(blocks))
         return True
     except Exception as e:
         logger.warning(
             f'Не удалось скопировать {day_from} в {day_to} пользователя {user_id}: {e}'
         )
         return False
+
+
+def clear_day(user_id: int, day: str) -> bool:
+    """Удаляет все блоки дня."""
+    try:
+        with user_lock(user_id):
+            before = _snapshot(user_id, day)
+            storage.set_day(user_id, day, [])
+            _commit(user_id, day, before, [])
+        return True
+    except Exception as e:
+        logger.warning(
+            f'Не удалось очистить {day} пользователя {user_id}: {e}'
+        )
+        return False
+
+
+def _restore(user_id: int, day: str, redo: bool = False) -> bool:
+    """
+    Возвращает день к снимку из истории: к состоянию до последнего изменения
+    или (redo) к состоянию до последней отмены.
+    Возвращает False, если в истории нет подходящего снимка или запись не удалась.
+    """
+    try:
+        with user_lock(user_id):
+            history = _history(user_id, day)
+            step, inverse = (history.redo, history.undo) if redo else (history.undo, history.redo)
+            current = _snapshot(user_id, day)
+            target = step(current)
+            if target is None:
+                return False
+            after = sorted_blocks(target)
+            try:
+                storage.set_day(user_id, day, after)
+            except Exception:
+                inverse(target)  # день не изменился - возвращаем историю в прежнее состояние
+                raise
+            _bump(user_id, day)
+            _snapshots.set((int(user_id), day), (day_version(user_id, day), tuple(after)))
+        return True
+    except Exception as e:
+        logger.warning(
+            f'Не удалось восстановить {day} пользователя {user_id}: {e}'
+        )
+        return False
+
+
+def undo_day(user_id: int, day: str) -> bool:
+    """Отменяет последнее изменение дня."""
+    return _restore(user_id, day)
+
+
+def redo_day(user_id: int, day: str) -> bool:
+    """Повторяет последнее отменённое изменение дня."""
+    return _restore(user_id, day, redo=True)
@@ -1,7 +1,36 @@
+import copy
 import json
 import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Collection, Optional
+from utils.storage import atomic_write, DATA_DIR
+from utils.metrics import metrics, record_io
+from utils.locks import user_lock
+from utils.logger import logger, current_handler
 
-SESSION_FILE = 'data/session.json'
+SESSION_FILE = os.path.join(DATA_DIR, 'session.json')
+SESSION_TTL = float(os.getenv('SESSION_TTL', 24 * 60 * 60))
+SESSION_MAX_SIZE = int(os.getenv('SESSION_MAX_SIZE', 10000))
+# Файл незавершённых сессий пишется фоновым потоком не чаще раза в столько секунд
+SESSION_FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', 1))
+
+# Обращения к сессиям по обработчикам: (обработчик, операция) -> число.
+# reads/writes - в памяти, file_reads/file_writes - к файлу;
+# обработчик берётся из log_context, вне обработчика (поток записи, запуск) - '-'
+session_io = Counter()
+_session_io_lock = threading.Lock()
+session_ops = metrics.counter(
+    'bot_session_ops_total', 'Обращения к сессиям по обработчикам', ('handler', 'op'))
+
+
+def count_session_io(op: str) -> None:
+    handler = current_handler() or '-'
+    with _session_io_lock:
+        session_io[(handler, op)] += 1
+    session_ops.inc(handler, op)
 
 
 def load_sessions() -> dict:
@@ -9,22 +38,205 @@ def load_sessions() -> dict:
     Загружает все пользовательские сессии из файла.
     Если файла нет или он пустой, возвращает пустой словарь.
     """
+    count_session_io('file_reads')
     if os.path.exists(SESSION_FILE):
+        started = time.perf_counter()
         try:
             with open(SESSION_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                sessions = json.load(f)
         except json.JSONDecodeError:
             return {}
+        record_io('load_sessions', started, os.path.getsize(SESSION_FILE))
+        return sessions
     return {}
 
 
 def save_sessions(sessions: dict) -> None:
     """
-    Сохраняет все сессии в файл.
+    Сохраняет все сессии в файл (сами сессии при этом не должны меняться).
+    """
+    count_session_io('file_writes')
+    started = time.perf_counter()
+    record_io('save_sessions', started,
+              atomic_write(SESSION_FILE, json.dumps(sessions, ensure_ascii=False, indent=4)))
+
+
+def empty_state() -> dict:
+    return {
+        'action': None,
+        'day': None,
+        'step': None,
+        'data': None
+    }
+
+
+def is_in_progress(session: dict) -> bool:
+    """
+    Сессия с незавершённым действием (добавление, редактирование, удаление).
+    """
+    return session.get('state', {}).get('action') is not None
+
+
+class SessionStore:
+    """
+    Хранит сессии в памяти.
+    Сессии, к которым не обращались дольше ttl секунд, считаются истёкшими,
+    а при превышении max_size вытесняются самые давние (LRU).
+    На диск попадают только сессии с незавершённым действием,
+    чтобы после перезапуска пользователь мог продолжить ввод.
+    Файл пишется отложенно (write-behind): изменение лишь помечает сессии
+    изменёнными, а фоновый поток раз в flush_interval секунд записывает файл
+    вне self.lock, так что шаги сценариев не ждут диска.
+    Сессии не изменяются на месте (put всегда получает новый словарь),
+    поэтому для записи достаточно поверхностного снимка.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_size: int = SESSION_MAX_SIZE,
+                 flush_interval: float = SESSION_FLUSH_INTERVAL) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._sessions: 'OrderedDict[str, dict]' = OrderedDict()
+        self._touched: dict = {}
+        self.lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        now = time.monotonic()
+        for uid, session in load_sessions().items():
+            if is_in_progress(session):
+                self._sessions[uid] = session
+                self._touched[uid] = now
+        self._loaded = True
+
+    def _evict(self, now: float) -> None:
+        """
+        Удаляет истёкшие сессии и лишние сверх max_size.
+        Сессии упорядочены по последнему обращению, поэтому смотрим только в начало.
+        """
+        persisted_changed = False
+        while self._sessions:
+            uid = next(iter(self._sessions))
+            if len(self._sessions) <= self.max_size and now - self._touched[uid] < self.ttl:
+                break
+            session = self._sessions.pop(uid)
+            del self._touched[uid]
+            persisted_changed = persisted_changed or is_in_progress(session)
+        if persisted_changed:
+            self._persist()
+
+    def _persist(self) -> None:
+        """
+        Помечает файл сессий устаревшим и запускает поток записи (под self.lock).
+        """
+        self._dirty = True
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='sessions-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'Не удалось сохранить {SESSION_FILE}: {e}')
+
+    def flush(self) -> None:
+        """
+        Записывает незавершённые сессии, если они менялись с прошлой записи.
+        """
+        with self._write_lock:
+            with self.lock:
+                if not self._dirty:
+                    return
+                snapshot = {uid: session for uid, session in self._sessions.items()
+                            if is_in_progress(session)}
+                self._dirty = False
+            try:
+                save_sessions(snapshot)
+            except OSError:
+                with self.lock:
+                    self._dirty = True
+                raise
+
+    def close(self) -> None:
+        """
+        Останавливает поток записи и сохраняет оставшиеся изменения.
+        """
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def get(self, user_id: int):
+        """
+        Возвращает сессию пользователя (или None), отмечая обращение.
+        """
+        uid = str(user_id)
+        count_session_io('reads')
+        with self.lock:
+            self._load()
+            session = self._sessions.get(uid)
+            if session is None:
+                return None
+            now = time.monotonic()
+            if now - self._touched[uid] >= self.ttl:
+                self._evict(now)
+                return None
+            self._sessions.move_to_end(uid)
+            self._touched[uid] = now
+            return session
+
+    def put(self, user_id: int, session: dict) -> None:
+        """
+        Сохраняет сессию в памяти. Файл будет переписан, только если
+        сессия была или стала незавершённой.
+        """
+        uid = str(user_id)
+        count_session_io('writes')
+        with self.lock:
+            self._load()
+            previous = self._sessions.get(uid)
+            self._sessions[uid] = session
+            self._sessions.move_to_end(uid)
+            now = time.monotonic()
+            self._touched[uid] = now
+            if is_in_progress(session) or (previous is not None and is_in_progress(previous)):
+                self._persist()
+            self._evict(now)
+
+
+sessions = SessionStore()
+
+
+def flush_sessions() -> None:
+    """
+    Сохраняет незавершённые сессии и останавливает поток записи (вызывается при остановке).
     """
-    os.makedirs(os.path.dirname(SESSION_FILE), exist_ok=True)
-    with open(SESSION_FILE, 'w', encoding='utf-8') as f:
-        json.dump(sessions, f, ensure_ascii=False, indent=4)
+    sessions.close()
+
+
+@contextmanager
+def update_session(user_id: int):
+    """
+    Транзакционное изменение state пользователя:
+    читает сессию один раз, отдаёт state для изменения нескольких полей
+    и сохраняет один раз при выходе. При исключении изменения отбрасываются.
+
+        with update_session(user_id) as state:
+            state['day'] = 'day_mon'
+            state['day_message_id'] = 10
+    """
+    with user_lock(user_id):
+        session = copy.deepcopy(sessions.get(user_id)) or {'state': empty_state()}
+        yield session['state']
+        sessions.put(user_id, session)
 
 
 def set_user_session(user_id: int, key: str, value) -> None:
@@ -33,25 +245,12 @@ def set_user_session(user_id: int, key: str, value) -> None:
     Если key == "state", то перезаписывается весь state.
     Если другой key, то обновляется только поле внутри state.
     """
-    sessions = load_sessions()
-    uid = str(user_id)
-
-    if uid not in sessions:
-        sessions[uid] = {
-            'state': {
-                'action': None,
-                'day': None,
-                'step': None,
-                'data': None
-            }
-        }
-
-    if key == 'state':
-        sessions[uid]['state'] = value   # перезаписываем state целиком
-    else:
-        sessions[uid]['state'][key] = value  # меняем только поле
-
-    save_sessions(sessions)
+    with update_session(user_id) as state:
+        if key == 'state':
+            state.clear()
+            state.update(value)   # перезаписываем state целиком
+        else:
+            state[key] = value  # меняем только поле
 
 
 def get_user_session(user_id: int, key: str, default=None):
@@ -59,35 +258,43 @@ def get_user_session(user_id: int, key: str, default=None):
     Возвращает значение по ключу `key` для конкретного пользователя.
     Если ключ или пользователь не найдены — вернёт default.
     """
-    sessions = load_sessions()
-    user_session = sessions.get(str(user_id), {})
+    user_session = sessions.get(user_id) or {}
     state = user_session.get('state', {})
     if key == 'state':
-        return state
+        return copy.deepcopy(state)
     else:
         return state.get(key, default)
 
 
+def has_active_action(user_id: int, actions: Optional[Collection[str]] = None) -> bool:
+    """
+    Быстрая проверка для фильтра сообщений: есть ли у пользователя
+    незавершённое действие (одно из actions, если они заданы).
+    Только поиск в словаре, без чтения файлов.
+    """
+    user_session = sessions.get(user_id)
+    if user_session is None or not is_in_progress(user_session):
+        return False
+    return actions is None or user_session['state']['action'] in actions
+
+
 def clear_user_state(user_id: int):
     """
     Очищает состояние пользователя после завершения операции,
     но оставляет информацию о дне.
     """
-    sessions = load_sessions()
-    uid = str(user_id)
+    with user_lock(user_id):
+        user_session = sessions.get(user_id)
+        if user_session is None:
+            return  # нечего чистить
 
-    if uid not in sessions:
-        return  # нечего чистить
-
-    day = sessions[uid]['state'].get('day')  # сохраняем день
-    day_message_id = sessions[uid]['state'].get('day_message_id')
-
-    sessions[uid]['state'] = {
-        'action': None,
-        'day': day,   # восстанавливаем
-        'day_message_id': day_message_id,
-        'step': None,
-        'data': None
-    }
+        day = user_session['state'].get('day')  # сохраняем день
+        day_message_id = user_session['state'].get('day_message_id')
 
-    save_sessions(sessions)
+        sessions.put(user_id, {'state': {
+            'action': None,
+            'day': day,   # восстанавливаем
+            'day_message_id': day_message_id,
+            'step': None,
+            'data': None
+        }})
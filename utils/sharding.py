@@ -0,0 +1,225 @@
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Модуль импортируется и в процессах-шардах до того, как они настроили окружение,
+# поэтому utils.storage, utils.logger и обработчики импортируются внутри функций.
+
+# Число процессов-обработчиков; 1 - обычный однопроцессный режим
+BOT_SHARDS = int(os.getenv('BOT_SHARDS', 1))
+# Сколько апдейтов может ждать в очереди одного шарда
+SHARD_QUEUE_SIZE = int(os.getenv('SHARD_QUEUE_SIZE', 1000))
+# Потоки обработки апдейтов внутри шарда
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', 4))
+SHARD_POLL_TIMEOUT = int(os.getenv('SHARD_POLL_TIMEOUT', 20))
+
+
+def shard_of(user_id: int, shards: int) -> int:
+    """
+    Номер шарда пользователя. Все апдейты пользователя идут в один шард.
+    """
+    return int(user_id) % shards
+
+
+def shard_dir(base: str, index: int, shards: int) -> str:
+    """
+    Папка данных шарда: base при одном шарде, иначе base/shard-<index>.
+    """
+    return base if shards == 1 else os.path.join(base, f'shard-{index}')
+
+
+def shard_environ(index: int, shards: int) -> Dict[str, str]:
+    """
+    Переменные окружения процесса-шарда: своя папка данных, свой лог,
+    свой порт метрик и доля общего лимита исходящих запросов.
+    """
+    env = {'DATA_DIR': shard_dir(os.getenv('DATA_DIR', 'data'), index, shards)}
+    log_root, log_ext = os.path.splitext(os.getenv('LOG_FILE', 'logs/bot.log'))
+    env['LOG_FILE'] = f'{log_root}.shard-{index}{log_ext}'
+    metrics_port = int(os.getenv('METRICS_PORT', 0))
+    if metrics_port > 0:
+        # METRICS_PORT - у входного процесса, шарды - на следующих портах
+        env['METRICS_PORT'] = str(metrics_port + 1 + index)
+    # лимит Bot API общий на бота: делим его между шардами
+    env['OUTBOUND_GLOBAL_RATE'] = str(float(os.getenv('OUTBOUND_GLOBAL_RATE', 30)) / shards)
+    return env
+
+
+@contextmanager
+def _environ(env: Dict[str, str]):
+    """
+    Временно меняет os.environ: процессы spawn получают окружение на момент запуска
+    и с ним заново импортируют модули (в том числе main.py).
+    """
+    saved = {name: os.environ.get(name) for name in env}
+    # SQLITE_FILE по умолчанию лежит в DATA_DIR, а явно заданный путь был бы общим для всех шардов
+    saved.setdefault('SQLITE_FILE', os.environ.get('SQLITE_FILE'))
+    os.environ.pop('SQLITE_FILE', None)
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def run_shard(index: int, updates: multiprocessing.Queue) -> None:
+    """
+    Точка входа процесса-шарда: обработчики из handlers/*.py над своей частью
+    пользователей. Апдейты приходят словарями из очереди входного процесса,
+    None - сигнал остановки.
+    """
+    from telebot import types
+    from bot import bot
+    from utils.access import setup_access
+    from utils.logger import logger, bind_message_handlers
+    from utils.messages import deletions
+    from utils.metrics import instrument_message_handlers, start_metrics_server
+    from utils.reminders import reminders
+    from utils.session import flush_sessions
+    from utils.storage import flush_users, DATA_DIR
+    from utils.updates import UpdateWorkers
+    import handlers.start
+    import handlers.main_menu
+    import handlers.schedule
+    import handlers.todolist
+    import handlers.reminders
+
+    # Ctrl+C и SIGTERM при остановке сервиса получает вся группа процессов;
+    # шарды останавливает входной процесс, когда они доработают очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    parent = multiprocessing.parent_process()
+    setup_access(bot)
+    bind_message_handlers(bot)
+    instrument_message_handlers(bot)
+    start_metrics_server()
+    workers = UpdateWorkers(SHARD_WORKERS, name=f'shard-{index}-worker')
+    workers.start()
+    deletions.start()
+    reminders.start()
+    logger.info(f'Шард {index} запущен, данные в {DATA_DIR}')
+    try:
+        while True:
+            try:
+                data = updates.get(timeout=1)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    logger.error(f'Шард {index}: входной процесс завершился, останавливаемся')
+                    break
+                continue
+            if data is None:
+                break
+            try:
+                workers.submit(types.Update.de_json(data), block=True)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f'Шард {index}: некорректный апдейт {data.get("update_id")}: {e}')
+    finally:
+        workers.stop()
+        reminders.stop()
+        deletions.stop()
+        flush_sessions()
+        flush_users()
+
+
+class ShardPool:
+    """
+    Процессы-шарды и их очереди. Апдейт попадает в шард по from.id,
+    поэтому апдейты одного пользователя обрабатываются по порядку одним процессом.
+    """
+
+    def __init__(self, shards: int = BOT_SHARDS, queue_size: int = SHARD_QUEUE_SIZE) -> None:
+        self.context = multiprocessing.get_context('spawn')
+        self.queues: List[multiprocessing.Queue] = [self.context.Queue(queue_size) for _ in range(shards)]
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self) -> None:
+        shards = len(self.queues)
+        for index, updates in enumerate(self.queues):
+            process = self.context.Process(target=run_shard, args=(index, updates),
+                                           name=f'shard-{index}')
+            with _environ(shard_environ(index, shards)):
+                process.start()
+            self.processes.append(process)
+
+    def submit(self, data: dict, block: bool = True) -> bool:
+        """
+        Передаёт апдейт (JSON-словарь) в шард его пользователя.
+        Возвращает False, если очередь шарда заполнена (только при block=False).
+        """
+        from utils.updates import raw_update_user_id
+        index = shard_of(raw_update_user_id(data) or 0, len(self.queues))
+        try:
+            self.queues[index].put(data, block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def stop(self) -> None:
+        """
+        Дожидается, пока шарды обработают принятые апдейты и сохранят данные.
+        """
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            process.join()
+        self.processes = []
+
+
+def poll_updates(pool: ShardPool, timeout: int = SHARD_POLL_TIMEOUT) -> None:
+    """
+    Long polling без разбора апдейтов: входной процесс только раскладывает их по шардам.
+    """
+    from telebot import apihelper
+    from bot import bot
+    from utils.logger import logger
+    offset: Optional[int] = None
+    while True:
+        try:
+            updates = apihelper.get_updates(bot.token, offset=offset, timeout=timeout,
+                                            long_polling_timeout=timeout)
+        except Exception as e:
+            logger.error(f'Ошибка getUpdates: {e}')
+            time.sleep(3)
+            continue
+        for data in updates:
+            pool.submit(data)
+            offset = data['update_id'] + 1
+
+
+def interrupt_on_signal(signum, frame) -> None:
+    """
+    Обработчик SIGTERM: завершает процесс как Ctrl+C, чтобы сработали блоки finally
+    (остановка потоков и сброс отложенных изменений хранилища).
+    """
+    raise KeyboardInterrupt
+
+
+def run_sharded(shards: int, webhook: bool = False) -> None:
+    """
+    Точка входа многопроцессного режима (python main.py --shards N [--webhook]).
+    Этот процесс только получает апдейты; обработчики, хранилище, сессии,
+    напоминания и удаления работают в шардах.
+    """
+    from utils.logger import logger
+    signal.signal(signal.SIGTERM, interrupt_on_signal)
+    pool = ShardPool(shards)
+    pool.start()
+    logger.info(f'Запущено шардов: {shards}')
+    try:
+        if webhook:
+            from utils.webhook import ShardedWebhookServer, run_webhook
+            run_webhook(ShardedWebhookServer, pool=pool)
+        else:
+            poll_updates(pool)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
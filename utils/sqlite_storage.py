@@ -0,0 +1,246 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Dict, List, Optional
+from utils.storage import Storage, JsonStorage, create_user_template, USERS_FILE, SQLITE_FILE
+from utils.model import Block
+from utils.validation import minutes_to_time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_name TEXT NOT NULL DEFAULT '',
+    last_name TEXT NOT NULL DEFAULT '',
+    todolist TEXT NOT NULL DEFAULT '[]',
+    todo_next_id INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    start TEXT NOT NULL,
+    "end" TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_user_day ON blocks (user_id, day, position);
+'''
+
+
+class SqliteStorage(Storage):
+    """
+    Хранилище в SQLite (режим WAL).
+    Пользователи и блоки лежат отдельными строками, поэтому операция
+    над одним блоком затрагивает одну строку, а не весь набор данных.
+    Время хранится строкой HH:MM, блоки дня упорядочены по (start, end, position),
+    номер блока - его порядковый номер в этом порядке.
+    """
+
+    def __init__(self, path: str = SQLITE_FILE) -> None:
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """
+        Возвращает соединение текущего потока (telebot обрабатывает апдейты в пуле потоков).
+        Файл базы создаётся при первом соединении, а не при импорте
+        (входному процессу многопроцессного режима база не нужна).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                conn.executescript(SCHEMA)
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+                if 'todo_next_id' not in columns:
+                    # база, созданная до счётчика id дел
+                    conn.execute('ALTER TABLE users ADD COLUMN todo_next_id INTEGER NOT NULL DEFAULT 1')
+            self._local.conn = conn
+        return conn
+
+    def _block_id(self, conn: sqlite3.Connection, user_id: int, day: str, index: int) -> int:
+        """
+        Находит id строки блока по его номеру в дне.
+        """
+        if index < 0:
+            raise IndexError(index)
+        row = conn.execute(
+            'SELECT id FROM blocks WHERE user_id = ? AND day = ? '
+            'ORDER BY start, "end", position LIMIT 1 OFFSET ?',
+            (user_id, day, index)).fetchone()
+        if row is None:
+            raise IndexError(index)
+        return row[0]
+
+    def _check_user(self, conn: sqlite3.Connection, user_id: int) -> None:
+        if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone() is None:
+            raise KeyError(str(user_id))
+
+    def _check_day(self, day: str) -> None:
+        if day not in create_user_template()['schedule']:
+            raise KeyError(day)
+
+    def _insert_blocks(self, conn: sqlite3.Connection, user_id: int, day: str,
+                       blocks: List[Block], first_position: int = 0) -> None:
+        conn.executemany(
+            'INSERT INTO blocks (user_id, day, position, title, start, "end") '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(user_id, day, first_position + i, b.title, minutes_to_time(b.start), minutes_to_time(b.end))
+             for i, b in enumerate(blocks)])
+
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT first_name, last_name, todolist, todo_next_id FROM users WHERE user_id = ?',
+            (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = create_user_template(row[0], row[1])
+        user['todolist'] = json.loads(row[2])
+        user['todo_next_id'] = row[3]
+        for day, title, start, end in conn.execute(
+                'SELECT day, title, start, "end" FROM blocks WHERE user_id = ? '
+                'ORDER BY day, start, "end", position', (user_id,)):
+            user['schedule'].setdefault(day, []).append(Block.parse(title, start, end))
+        return user
+
+    def ensure_user(self, user_id: int, first_name: str = '', last_name: str = '') -> Dict:
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO users (user_id, first_name, last_name) VALUES (?, ?, ?)',
+                (user_id, first_name or '', last_name or ''))
+        return self.get_user(user_id)
+
+    def get_day(self, user_id: int, day: str) -> List[Block]:
+        conn = self._conn()
+        self._check_user(conn, user_id)
+        self._check_day(day)
+        return [Block.parse(title, start, end)
+                for title, start, end in conn.execute(
+                    'SELECT title, start, "end" FROM blocks WHERE user_id = ? AND day = ? '
+                    'ORDER BY start, "end", position', (user_id, day))]
+
+    def append_block(self, user_id: int, day: str, block: Block) -> None:
+        self._check_day(day)
+        with self._conn() as conn:
+            self._check_user(conn, user_id)
+            position = conn.execute(
+                'SELECT COALESCE(MAX(position) + 1, 0) FROM blocks WHERE user_id = ? AND day = ?',
+                (user_id, day)).fetchone()[0]
+            self._insert_blocks(conn, user_id, day, [block], position)
+
+    def update_block(self, user_id: int, day: str, index: int, fields: Dict) -> None:
+        columns = {'title': 'title', 'start': 'start', 'end': '"end"'}
+        fields = {k: v if k == 'title' else minutes_to_time(v)
+                  for k, v in fields.items() if k in columns}
+        with self._conn() as conn:
+            block_id = self._block_id(conn, user_id, day, index)
+            # как replace_block в JsonStorage: изменённый блок встаёт последним среди равных по времени
+            assignments = ''.join(f'{columns[k]} = ?, ' for k in fields)
+            conn.execute(f'UPDATE blocks SET {assignments}position = ('
+                         'SELECT MAX(position) + 1 FROM blocks WHERE user_id = ? AND day = ?) '
+                         'WHERE id = ?', (*fields.values(), user_id, day, block_id))
+
+    def delete_block(self, user_id: int, day: str, index: int) -> None:
+        with self._conn() as conn:
+            block_id = self._block_id(conn, user_id, day, index)
+            conn.execute('DELETE FROM blocks WHERE id = ?', (block_id,))
+
+    def set_day(self, user_id: int, day: str, blocks: List[Block]) -> None:
+        self._check_day(day)
+        with self._conn() as conn:
+            self._check_user(conn, user_id)
+            conn.execute('DELETE FROM blocks WHERE user_id = ? AND day = ?', (user_id, day))
+            self._insert_blocks(conn, user_id, day, blocks)
+
+    def get_todolist(self, user_id: int) -> List[Dict]:
+        row = self._conn().execute(
+            'SELECT todolist FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            raise KeyError(str(user_id))
+        return json.loads(row[0])
+
+    def get_todo_next_id(self, user_id: int) -> int:
+        row = self._conn().execute(
+            'SELECT todo_next_id FROM users WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            raise KeyError(str(user_id))
+        return row[0]
+
+    def set_todolist(self, user_id: int, items: List[Dict], next_id: int) -> None:
+        with self._conn() as conn:
+            cursor = conn.execute('UPDATE users SET todolist = ?, todo_next_id = ? WHERE user_id = ?',
+                                  (json.dumps(items, ensure_ascii=False), next_id, user_id))
+            if cursor.rowcount == 0:
+                raise KeyError(str(user_id))
+
+    def load_users(self) -> dict:
+        """
+        Собирает всех пользователей в словарь формата users.json (блоки - Block).
+        Дорогая операция - оставлена для совместимости и миграций.
+        """
+        conn = self._conn()
+        users = {}
+        for user_id, first_name, last_name, todolist, todo_next_id in conn.execute(
+                'SELECT user_id, first_name, last_name, todolist, todo_next_id FROM users'):
+            user = create_user_template(first_name, last_name)
+            user['todolist'] = json.loads(todolist)
+            user['todo_next_id'] = todo_next_id
+            users[str(user_id)] = user
+        for user_id, day, title, start, end in conn.execute(
+                'SELECT user_id, day, title, start, "end" FROM blocks '
+                'ORDER BY user_id, day, start, "end", position'):
+            users[str(user_id)]['schedule'].setdefault(day, []).append(
+                Block.parse(title, start, end))
+        return users
+
+    def save_users(self, users: dict) -> None:
+        """
+        Записывает словарь пользователей целиком (одной транзакцией).
+        """
+        with self._conn() as conn:
+            for uid, user in users.items():
+                user_id = int(uid)
+                conn.execute(
+                    'INSERT INTO users (user_id, first_name, last_name, todolist, todo_next_id) '
+                    'VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT(user_id) DO UPDATE SET first_name = excluded.first_name, '
+                    'last_name = excluded.last_name, todolist = excluded.todolist, '
+                    'todo_next_id = excluded.todo_next_id',
+                    (user_id, user.get('first_name') or '', user.get('last_name') or '',
+                     json.dumps(user.get('todolist', []), ensure_ascii=False),
+                     user.get('todo_next_id', 1)))
+                conn.execute('DELETE FROM blocks WHERE user_id = ?', (user_id,))
+                for day, blocks in user.get('schedule', {}).items():
+                    self._insert_blocks(conn, user_id, day, blocks)
+
+    def close(self) -> None:
+        """
+        Закрывает соединение текущего потока (соединения других потоков закроются с ними).
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def migrate_from_json(json_path: str = USERS_FILE, db_path: str = SQLITE_FILE) -> int:
+    """
+    Переносит пользователей из users.json в базу SQLite.
+    Возвращает количество перенесённых пользователей.
+    """
+    users = JsonStorage(json_path).load_users()
+    SqliteStorage(db_path).save_users(users)
+    return len(users)
+
+
+if __name__ == '__main__':
+    # python -m utils.sqlite_storage [data/users.json] [data/users.db]
+    count = migrate_from_json(*sys.argv[1:3])
+    print(f'Перенесено пользователей: {count}')
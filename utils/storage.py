@@ -1,44 +1,26 @@
 import json
+from abc import ABC, abstractmethod
 import os
-from typing import Dict
+import threading
+import time
+from typing import Dict, List, Optional, Set
+from utils.logger import logger
+from utils.metrics import record_io
+from utils.model import Block, insert_block, sorted_blocks, decode_user, encode_json
 
-USERS_FILE = 'data/users.json'
+# Папка данных пользователей; в многопроцессном режиме у каждого шарда своя (data/shard-N)
+DATA_DIR = os.getenv('DATA_DIR', 'data')
+USERS_FILE = os.path.join(DATA_DIR, 'users.json')
+# Белый список общий для всех шардов
 WHITELIST_FILE = 'data/whitelist.json'
-
-
-def load_users() -> dict:
-    """
-    Загружает данные пользователей из файла. Возвращает пустой словарь, если файл не найден.
-    """
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return {}
-    return {}
-
-
-def save_users(users: dict) -> None:
-    """
-    Сохраняет данные пользователей в файл.
-    """
-    os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, ensure_ascii=False, indent=4)
-
-
-def load_whitelist() -> list:
-    """
-    Загружает whitelist из файла. Возвращает пустой список при ошибках.
-    """
-    if os.path.exists(WHITELIST_FILE):
-        try:
-            with open(WHITELIST_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, OSError):
-            return []
-    return []
+SQLITE_FILE = os.getenv('SQLITE_FILE', os.path.join(DATA_DIR, 'users.db'))
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+FLUSH_INTERVAL = float(os.getenv('STORAGE_FLUSH_INTERVAL', 5))
+FLUSH_DIRTY_LIMIT = int(os.getenv('STORAGE_FLUSH_DIRTY_LIMIT', 100))
+JOURNAL_FILE = os.path.join(DATA_DIR, 'users.journal')
+JOURNAL_COMPACT_BYTES = int(os.getenv('JOURNAL_COMPACT_BYTES', 1024 * 1024))
+# Служебный ключ снимка users.json: номер последней записи журнала, вошедшей в снимок
+JOURNAL_SEQ_KEY = '_journal_seq'
 
 
 def create_user_template(first_name: str = '', last_name: str = '') -> Dict:
@@ -57,17 +39,358 @@ def create_user_template(first_name: str = '', last_name: str = '') -> Dict:
             'saturday': [],
             'sunday': []
         },
-        'todolist': []
+        'todolist': [],
+        # следующий id дела; не уменьшается, когда дела удаляются
+        'todo_next_id': 1
     }
 
 
+def atomic_write(path: str, data: str) -> int:
+    """
+    Записывает файл через временный файл и os.replace,
+    чтобы при падении на диске не остался обрезанный файл.
+    Возвращает число записанных байт.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        size = f.write(data.encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return size
+
+
+def replace_block(blocks: List[Block], index: int, fields: Dict) -> None:
+    """
+    Заменяет блок по индексу изменённой копией и возвращает его на место по сортировке.
+    """
+    block = blocks[index]
+    del blocks[index]
+    insert_block(blocks, block.replace(**fields))
+
+
+class Storage(ABC):
+    """
+    Интерфейс хранилища пользователей.
+    Базовая реализация выражает все операции через load_users/save_users
+    (их обязан реализовать каждый бэкенд), бэкенды переопределяют их точечными операциями.
+    Блоки дня - объекты Block, отсортированные по началу;
+    индексы блоков везде считаются с нуля в этом порядке.
+    """
+
+    @abstractmethod
+    def load_users(self) -> dict:
+        ...
+
+    @abstractmethod
+    def save_users(self, users: dict) -> None:
+        ...
+
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """
+        Возвращает данные пользователя или None.
+        """
+        return self.load_users().get(str(user_id))
+
+    def ensure_user(self, user_id: int, first_name: str = '', last_name: str = '') -> Dict:
+        """
+        Создаёт пользователя, если его ещё нет, и возвращает его данные.
+        """
+        users = self.load_users()
+        uid = str(user_id)
+        if uid not in users:
+            users[uid] = create_user_template(first_name, last_name)
+            self.save_users(users)
+        return users[uid]
+
+    def get_day(self, user_id: int, day: str) -> List[Block]:
+        """
+        Возвращает список блоков дня.
+        """
+        return self.load_users()[str(user_id)]['schedule'][day]
+
+    def append_block(self, user_id: int, day: str, block: Block) -> None:
+        users = self.load_users()
+        insert_block(users[str(user_id)]['schedule'][day], block)
+        self.save_users(users)
+
+    def update_block(self, user_id: int, day: str, index: int, fields: Dict) -> None:
+        users = self.load_users()
+        replace_block(users[str(user_id)]['schedule'][day], index, fields)
+        self.save_users(users)
+
+    def delete_block(self, user_id: int, day: str, index: int) -> None:
+        users = self.load_users()
+        users[str(user_id)]['schedule'][day].pop(index)
+        self.save_users(users)
+
+    def set_day(self, user_id: int, day: str, blocks: List[Block]) -> None:
+        users = self.load_users()
+        users[str(user_id)]['schedule'][day] = sorted_blocks(blocks)
+        self.save_users(users)
+
+    def get_todolist(self, user_id: int) -> List[Dict]:
+        """
+        Возвращает список дел пользователя (элементы не изменяются на месте).
+        """
+        return self.load_users()[str(user_id)]['todolist']
+
+    def get_todo_next_id(self, user_id: int) -> int:
+        """
+        Возвращает сохранённый следующий id дела (1, если счётчика ещё нет).
+        """
+        return self.load_users()[str(user_id)].get('todo_next_id', 1)
+
+    def set_todolist(self, user_id: int, items: List[Dict], next_id: int) -> None:
+        """
+        Заменяет список дел целиком вместе со счётчиком id - одной записью,
+        сколько бы дел ни изменилось.
+        """
+        users = self.load_users()
+        users[str(user_id)]['todolist'] = items
+        users[str(user_id)]['todo_next_id'] = next_id
+        self.save_users(users)
+
+    def flush(self) -> None:
+        """
+        Сбрасывает отложенные изменения на диск.
+        """
+
+    def close(self) -> None:
+        """
+        Освобождает ресурсы хранилища перед остановкой бота.
+        """
+        self.flush()
+
+
+class JsonStorage(Storage):
+    """
+    Хранилище в одном JSON-файле с кэшем в памяти (write-behind).
+    Чтения обслуживаются из памяти, изменения помечают пользователя "грязным",
+    а фоновый поток сбрасывает файл раз в flush_interval секунд
+    или как только грязных пользователей становится flush_dirty_limit.
+    """
+
+    def __init__(self, path: str = USERS_FILE, flush_interval: float = FLUSH_INTERVAL,
+                 flush_dirty_limit: int = FLUSH_DIRTY_LIMIT) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_dirty_limit = flush_dirty_limit
+        self._users: Optional[dict] = None
+        self._snapshot_seq = 0
+        self._dirty: Set[str] = set()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def _read_file(self) -> dict:
+        """
+        Загружает данные пользователей из файла. Возвращает пустой словарь, если файл не найден.
+        """
+        if os.path.exists(self.path):
+            started = time.perf_counter()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                try:
+                    users = json.load(f)
+                except json.JSONDecodeError:
+                    return {}
+            record_io('load_users', started, os.path.getsize(self.path))
+            self._snapshot_seq = users.pop(JOURNAL_SEQ_KEY, 0)
+            for user in users.values():
+                decode_user(user)
+            return users
+        return {}
+
+    def _get_users(self) -> dict:
+        if self._users is None:
+            with self._lock:
+                if self._users is None:
+                    self._users = self._read_file()
+        return self._users
+
+    def _mark_dirty(self, *uids: str) -> None:
+        """
+        Помечает пользователей изменёнными и при необходимости будит поток сброса.
+        """
+        with self._lock:
+            self._dirty.update(uids)
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name='users-flusher', daemon=True)
+                self._flusher.start()
+            if len(self._dirty) >= self.flush_dirty_limit:
+                self._wakeup.set()
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'Не удалось сохранить {self.path}: {e}')
+
+    def load_users(self) -> dict:
+        """
+        Возвращает словарь пользователей из памяти (при первом обращении читает файл).
+        Изменения в нём нужно фиксировать через save_users.
+        """
+        return self._get_users()
+
+    def save_users(self, users: dict) -> None:
+        """
+        Заменяет словарь пользователей целиком и помечает всех изменёнными.
+        """
+        with self._lock:
+            self._users = users
+            self._mark_dirty(*users.keys())
+
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        return self._get_users().get(str(user_id))
+
+    def ensure_user(self, user_id: int, first_name: str = '', last_name: str = '') -> Dict:
+        uid = str(user_id)
+        users = self._get_users()
+        with self._lock:
+            if uid not in users:
+                users[uid] = create_user_template(first_name, last_name)
+                self._mark_dirty(uid)
+            return users[uid]
+
+    def get_day(self, user_id: int, day: str) -> List[Block]:
+        return self._get_users()[str(user_id)]['schedule'][day]
+
+    def append_block(self, user_id: int, day: str, block: Block) -> None:
+        with self._lock:
+            insert_block(self._get_users()[str(user_id)]['schedule'][day], block)
+            self._mark_dirty(str(user_id))
+
+    def update_block(self, user_id: int, day: str, index: int, fields: Dict) -> None:
+        with self._lock:
+            replace_block(self._get_users()[str(user_id)]['schedule'][day], index, fields)
+            self._mark_dirty(str(user_id))
+
+    def delete_block(self, user_id: int, day: str, index: int) -> None:
+        with self._lock:
+            self._get_users()[str(user_id)]['schedule'][day].pop(index)
+            self._mark_dirty(str(user_id))
+
+    def set_day(self, user_id: int, day: str, blocks: List[Block]) -> None:
+        with self._lock:
+            schedule = self._get_users()[str(user_id)]['schedule']
+            if day not in schedule:
+                raise KeyError(day)
+            schedule[day] = sorted_blocks(blocks)
+            self._mark_dirty(str(user_id))
+
+    def get_todolist(self, user_id: int) -> List[Dict]:
+        return self._get_users()[str(user_id)]['todolist']
+
+    def get_todo_next_id(self, user_id: int) -> int:
+        return self._get_users()[str(user_id)].get('todo_next_id', 1)
+
+    def set_todolist(self, user_id: int, items: List[Dict], next_id: int) -> None:
+        with self._lock:
+            user = self._get_users()[str(user_id)]
+            user['todolist'] = items
+            user['todo_next_id'] = next_id
+            self._mark_dirty(str(user_id))
+
+    def flush(self) -> None:
+        """
+        Атомарно записывает файл, если есть несохранённые изменения.
+        """
+        with self._write_lock:
+            started = time.perf_counter()
+            with self._lock:
+                if not self._dirty:
+                    return
+                dirty = set(self._dirty)
+                data = json.dumps(self._users, ensure_ascii=False, indent=4, default=encode_json)
+                self._dirty.clear()
+            try:
+                record_io('save_users', started, atomic_write(self.path, data))
+            except OSError:
+                with self._lock:
+                    self._dirty.update(dirty)
+                raise
+
+    def close(self) -> None:
+        """
+        Останавливает фоновый поток и сбрасывает оставшиеся изменения.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+
+def create_storage(backend: str = STORAGE_BACKEND, data_dir: Optional[str] = None) -> Storage:
+    """
+    Создаёт хранилище по имени бэкенда (json, journal или sqlite).
+    data_dir - другая папка данных (например, шарда); по умолчанию - настройки процесса.
+    """
+    users_file, journal_file, sqlite_file = USERS_FILE, JOURNAL_FILE, SQLITE_FILE
+    if data_dir is not None:
+        users_file = os.path.join(data_dir, 'users.json')
+        journal_file = os.path.join(data_dir, 'users.journal')
+        sqlite_file = os.path.join(data_dir, 'users.db')
+    if backend == 'sqlite':
+        from utils.sqlite_storage import SqliteStorage
+        return SqliteStorage(sqlite_file)
+    if backend == 'journal':
+        from utils.journal_storage import JournalStorage
+        return JournalStorage(users_file, journal_file)
+    if backend == 'json':
+        return JsonStorage(users_file)
+    raise ValueError(f'Неизвестный бэкенд хранилища: {backend}')
+
+
+storage = create_storage()
+
+
+def load_users() -> dict:
+    """
+    Загружает данные всех пользователей.
+    """
+    return storage.load_users()
+
+
+def save_users(users: dict) -> None:
+    """
+    Сохраняет данные всех пользователей.
+    """
+    storage.save_users(users)
+
+
+def flush_users() -> None:
+    """
+    Закрывает хранилище, сохраняя все отложенные изменения (вызывается при остановке).
+    """
+    storage.close()
+
+
+def load_whitelist(path: str = WHITELIST_FILE) -> list:
+    """
+    Загружает whitelist из файла. Возвращает пустой список при ошибках.
+    """
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f'Не удалось загрузить {path}: {e}')
+            return []
+    return []
+
+
 def ensure_user(user_id: int, first_name: str = '', last_name: str = '') -> Dict:
     """
-    Проверяет есть ли пользователь в users.json
+    Проверяет есть ли пользователь в хранилище
     """
-    users = load_users()
-    uid = str(user_id)
-    if uid not in users:
-        users[uid] = create_user_template(first_name, last_name)
-        save_users(users)
-    return users[uid]
+    return storage.ensure_user(user_id, first_name, last_name)
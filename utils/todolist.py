@@ -0,0 +1,194 @@
+import copy
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from utils.storage import storage
+from utils.locks import user_lock
+from utils.logger import logger
+from utils.render import LRUCache
+
+TODO_INDEX_CACHE_SIZE = 10000
+TODO_MAX_ITEMS = int(os.getenv('TODO_MAX_ITEMS', 10000))
+# Дела без срока идут после всех дел со сроком
+NO_DUE = '9999-12-31'
+OPEN = 'open'
+DONE = 'done'
+
+# Версии списков дел: каждое изменение увеличивает версию,
+# по ней кэшируются индекс и отрисованные страницы
+_versions: Dict[int, int] = {}
+# Индексы списков дел: user_id -> (версия, TodoIndex)
+_indexes = LRUCache(TODO_INDEX_CACHE_SIZE)
+
+
+class TodoIndex:
+    """
+    Индексы списка дел, по которым страница берётся срезом:
+    текущие дела отсортированы по сроку (без срока - в конце), затем по порядку добавления,
+    выполненные - от последних добавленных к первым.
+    Элемент списка - словарь {'id', 'text', 'done', 'due'}, due - 'ГГГГ-ММ-ДД' или None.
+    """
+
+    def __init__(self, items: List[Dict], next_id: int = 1) -> None:
+        self.by_id: Dict[int, Dict] = {item['id']: item for item in items}
+        # сохранённый счётчик не даёт выдать заново id удалённых дел: на них могут
+        # ссылаться кнопки старых сообщений; max - для списков, сохранённых до счётчика
+        self.next_id = max(next_id, max(self.by_id, default=0) + 1)
+        self.open: List[Dict] = sorted((item for item in items if not item['done']), key=_open_key)
+        # ключи сортировки в том же порядке - для бинарного поиска
+        self.open_keys: List[Tuple[str, int]] = [_open_key(item) for item in self.open]
+        self.done: List[Dict] = sorted((item for item in items if item['done']), key=_done_key)
+        self.done_keys: List[int] = [_done_key(item) for item in self.done]
+
+    def toggled(self, item_id: int) -> 'TodoIndex':
+        """
+        Индекс после переключения отметки дела: дело переносится между списками
+        бинарным поиском, без пересортировки. Старый индекс не меняется -
+        на него могут ссылаться закэшированные страницы.
+        """
+        item = self.by_id[item_id]
+        changed = dict(item, done=not item['done'])
+        index = copy.copy(self)
+        index.by_id = dict(self.by_id)
+        index.by_id[item_id] = changed
+        index.open, index.open_keys = list(self.open), list(self.open_keys)
+        index.done, index.done_keys = list(self.done), list(self.done_keys)
+        if item['done']:
+            position = bisect_left(index.done_keys, _done_key(item))
+            del index.done[position], index.done_keys[position]
+            position = bisect_left(index.open_keys, _open_key(changed))
+            index.open.insert(position, changed)
+            index.open_keys.insert(position, _open_key(changed))
+        else:
+            position = bisect_left(index.open_keys, _open_key(item))
+            del index.open[position], index.open_keys[position]
+            position = bisect_left(index.done_keys, _done_key(changed))
+            index.done.insert(position, changed)
+            index.done_keys.insert(position, _done_key(changed))
+        return index
+
+    def view(self, name: str) -> List[Dict]:
+        return self.done if name == DONE else self.open
+
+    def pages(self, name: str, page_size: int) -> int:
+        return max(1, -(-len(self.view(name)) // page_size))
+
+    def page(self, name: str, page: int, page_size: int) -> Tuple[List[Dict], int]:
+        """
+        Возвращает дела страницы page (с нуля) и номер страницы,
+        приведённый к допустимому диапазону.
+        """
+        page = min(max(page, 0), self.pages(name, page_size) - 1)
+        return self.view(name)[page * page_size:(page + 1) * page_size], page
+
+    def overdue(self, today: date) -> int:
+        """Число текущих дел со сроком раньше today."""
+        return bisect_left(self.open_keys, (today.isoformat(), 0))
+
+    def due_today(self, today: date) -> int:
+        """Число текущих дел со сроком today."""
+        key = today.isoformat()
+        return bisect_right(self.open_keys, (key, float('inf'))) - bisect_left(self.open_keys, (key, 0))
+
+
+def _open_key(item: Dict) -> Tuple[str, int]:
+    return item['due'] or NO_DUE, item['id']
+
+
+def _done_key(item: Dict) -> int:
+    return -item['id']
+
+
+def todo_version(user_id: int) -> int:
+    """Возвращает текущую версию списка дел пользователя."""
+    return _versions.get(int(user_id), 0)
+
+
+def _save(user_id: int, items: List[Dict], next_id: int, index: Optional[TodoIndex] = None) -> None:
+    """
+    Записывает список со счётчиком id и увеличивает версию (вызывается под блокировкой пользователя).
+    index - уже обновлённый индекс нового списка, если его не нужно перестраивать.
+    """
+    storage.set_todolist(user_id, items, next_id)
+    version = todo_version(user_id) + 1
+    _versions[int(user_id)] = version
+    if index is not None:
+        _indexes.set(int(user_id), (version, index))
+
+
+def todo_index(user_id: int) -> TodoIndex:
+    """Возвращает индекс списка дел; перестраивается только после изменения списка."""
+    key = int(user_id)
+    version = todo_version(user_id)
+    cached = _indexes.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    index = TodoIndex(storage.get_todolist(user_id), storage.get_todo_next_id(user_id))
+    _indexes.set(key, (version, index))
+    return index
+
+
+def add_items(user_id: int, entries: List[Tuple[str, Optional[date]]]) -> int:
+    """
+    Добавляет дела (текст, срок) одной записью в хранилище.
+    Сверх TODO_MAX_ITEMS дела не добавляются. Возвращает число добавленных дел.
+    """
+    try:
+        with user_lock(user_id):
+            items = storage.get_todolist(user_id)
+            next_id = todo_index(user_id).next_id
+            added = [{'id': next_id + i, 'text': text, 'done': False,
+                      'due': due.isoformat() if due else None}
+                     for i, (text, due) in enumerate(entries[:max(TODO_MAX_ITEMS - len(items), 0)])]
+            if added:
+                _save(user_id, items + added, next_id + len(added))
+        return len(added)
+    except Exception as e:
+        logger.warning(f'Не удалось добавить дела пользователя {user_id}: {e}')
+        return 0
+
+
+def toggle_item(user_id: int, item_id: int) -> bool:
+    """Отмечает дело выполненным или снимает отметку."""
+    try:
+        with user_lock(user_id):
+            index = todo_index(user_id).toggled(item_id)
+            changed = index.by_id[item_id]
+            # элементы не изменяются на месте: старый индекс и кэш страниц ссылаются на них
+            _save(user_id, [changed if item['id'] == item_id else item
+                            for item in storage.get_todolist(user_id)], index.next_id, index)
+        return True
+    except Exception as e:
+        logger.warning(f'Не удалось отметить дело {item_id} пользователя {user_id}: {e}')
+        return False
+
+
+def complete_all(user_id: int) -> int:
+    """Отмечает выполненными все текущие дела. Возвращает их число."""
+    try:
+        with user_lock(user_id):
+            items = storage.get_todolist(user_id)
+            changed = sum(not item['done'] for item in items)
+            if changed:
+                _save(user_id, [item if item['done'] else dict(item, done=True) for item in items],
+                      todo_index(user_id).next_id)
+        return changed
+    except Exception as e:
+        logger.warning(f'Не удалось отметить все дела пользователя {user_id}: {e}')
+        return 0
+
+
+def clear_done(user_id: int) -> int:
+    """Удаляет выполненные дела. Возвращает их число."""
+    try:
+        with user_lock(user_id):
+            items = storage.get_todolist(user_id)
+            kept = [item for item in items if not item['done']]
+            if len(kept) != len(items):
+                # счётчик берётся до удаления: id удалённых дел больше не выдаются
+                _save(user_id, kept, todo_index(user_id).next_id)
+        return len(items) - len(kept)
+    except Exception as e:
+        logger.warning(f'Не удалось удалить выполненные дела пользователя {user_id}: {e}')
+        return 0
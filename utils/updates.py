@@ -0,0 +1,83 @@
+import queue
+import threading
+from typing import List, Optional
+from telebot import types
+from bot import bot
+from utils.logger import logger
+
+# Поля апдейта, в которых есть from (порядок как в types.Update)
+USER_UPDATE_FIELDS = ('message', 'edited_message', 'callback_query', 'inline_query',
+                      'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+                      'my_chat_member', 'chat_member', 'chat_join_request')
+
+
+def update_user_id(update: types.Update) -> Optional[int]:
+    """
+    Возвращает id пользователя, от которого пришёл апдейт (или None).
+    """
+    event = update.message or update.callback_query
+    return event.from_user.id if event is not None and event.from_user else None
+
+
+def raw_update_user_id(update: dict) -> Optional[int]:
+    """
+    То же для апдейта в виде JSON-словаря (без разбора в types.Update).
+    """
+    for field in USER_UPDATE_FIELDS:
+        event = update.get(field)
+        if event is not None:
+            return (event.get('from') or {}).get('id')
+    return None
+
+
+class UpdateWorkers:
+    """
+    Потоки обработки апдейтов: у каждого своя очередь на queue_size апдейтов,
+    апдейты одного пользователя всегда попадают в одну очередь,
+    поэтому обрабатываются по порядку.
+    """
+
+    def __init__(self, workers: int, queue_size: int = 0, name: str = 'update-worker') -> None:
+        self.name = name
+        self.queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, update: types.Update, block: bool = False) -> bool:
+        """
+        Ставит апдейт в очередь его пользователя.
+        Возвращает False, если очередь заполнена (только при block=False).
+        """
+        user_id = update_user_id(update) or 0
+        try:
+            self.queues[user_id % len(self.queues)].put(update, block=block)
+            return True
+        except queue.Full:
+            return False
+
+    def _work(self, updates: queue.Queue) -> None:
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            try:
+                bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f'Ошибка обработки апдейта {update.update_id}: {e}')
+
+    def start(self) -> None:
+        bot.threaded = False  # обработчики выполняются в потоках очередей
+        for i, updates in enumerate(self.queues):
+            thread = threading.Thread(target=self._work, args=(updates,),
+                                      name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        Дожидается обработки уже принятых апдейтов и останавливает потоки.
+        """
+        for updates in self.queues:
+            updates.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
@@ -1,7 +1,9 @@
 import re
-from datetime import time
 
 TIME_PATTERN = re.compile(r'^\d{1,2}:\d{2}$')
+# Строка блока для пакетного ввода: "09:00-10:30 Лекция" (тире любое, пробелы вокруг него не важны)
+BLOCK_LINE_PATTERN = re.compile(r'^\s*(\S+?)\s*[-–—]\s*(\S+)\s+(.+?)\s*$')
+BLOCK_TITLE_LIMIT = 20
 
 
 def validate_time(time_str: str) -> bool:
@@ -29,16 +31,51 @@ def normalize_time(time_str: str) -> str | None:
     return f'{hours:02d}:{minutes:02d}'
 
 
+def time_to_minutes(time_str: str) -> int | None:
+    """
+    Переводит время HH:MM в минуты от полуночи.
+    Возвращает None, если время некорректно.
+    """
+    if not validate_time(time_str):
+        return None
+    hours, minutes = map(int, time_str.split(':'))
+    return hours * 60 + minutes
+
+
+def minutes_to_time(minutes: int) -> str:
+    """
+    Переводит минуты от полуночи во время формата HH:MM.
+    """
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
 def is_end_after_start(start: str, end: str) -> bool:
     """
     Проверяет, что время окончания не раньше времени начала.
     Возвращает True, если конец >= начало, иначе False.
     """
-    start_norm = normalize_time(start)
-    end_norm = normalize_time(end)
-    if not start_norm or not end_norm:
+    start_min = time_to_minutes(start)
+    end_min = time_to_minutes(end)
+    if start_min is None or end_min is None:
         return False
+    return end_min >= start_min
 
-    start_h, start_m = map(int, start_norm.split(':'))
-    end_h, end_m = map(int, end_norm.split(':'))
-    return time(end_h, end_m) >= time(start_h, start_m)
+
+def parse_block_line(line: str) -> tuple[str, str, str]:
+    """
+    Разбирает строку блока "ЧЧ:ММ-ЧЧ:ММ Название".
+    Возвращает (название, начало, конец) с нормализованным временем;
+    название обрезается до BLOCK_TITLE_LIMIT символов.
+    При ошибке выбрасывает ValueError с описанием для пользователя.
+    """
+    match = BLOCK_LINE_PATTERN.match(line)
+    if not match:
+        raise ValueError('ожидается строка вида «09:00-10:30 Название»')
+    start, end = normalize_time(match[1]), normalize_time(match[2])
+    if start is None:
+        raise ValueError(f'некорректное время начала «{match[1]}»')
+    if end is None:
+        raise ValueError(f'некорректное время окончания «{match[2]}»')
+    if not is_end_after_start(start, end):
+        raise ValueError('время окончания раньше времени начала')
+    return match[3][:BLOCK_TITLE_LIMIT], start, end
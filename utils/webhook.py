@@ -0,0 +1,163 @@
+import hmac
+import json
+import os
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Type
+from telebot import types
+from bot import bot
+from utils.logger import logger
+from utils.updates import UpdateWorkers
+
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+# Публичный адрес для setWebhook; если пусто - вебхук регистрируется вручную (например, за прокси)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+# Секрет заголовка X-Telegram-Bot-Api-Secret-Token; обязателен, если вебхук регистрируется вручную.
+# При заданном WEBHOOK_URL без секрета он создаётся при запуске и передаётся в setWebhook
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', 4))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    """
+    Принимает апдейт, кладёт его в очередь и сразу отвечает.
+    """
+
+    def do_POST(self):
+        server: WebhookServer = self.server.webhook
+        if self.path != server.path:
+            return self._reply(404)
+        secret = self.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(secret, server.secret):
+            return self._reply(403)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length))
+        except (ValueError, TypeError):
+            return self._reply(400)
+        # Telegram повторит доставку, если очередь переполнена
+        self._reply(server.accept(data))
+
+    def _reply(self, code: int) -> None:
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(f'webhook {self.address_string()}: {format % args}')
+
+
+class WebhookServer:
+    """
+    HTTP-сервер для приёма апдейтов вместо infinity_polling.
+    У каждого из workers потоков своя очередь на queue_size апдейтов;
+    апдейты одного пользователя всегда попадают в одну очередь, поэтому
+    обрабатываются по порядку.
+    Запросы без верного секретного заголовка отклоняются с кодом 403.
+    """
+
+    def __init__(self, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                 workers: int = WEBHOOK_WORKERS, queue_size: int = WEBHOOK_QUEUE_SIZE) -> None:
+        if not secret:
+            raise ValueError('Вебхук без секрета принимал бы апдейты от кого угодно')
+        self.path = path
+        self.secret = secret
+        self.workers = UpdateWorkers(workers, queue_size, name='webhook-worker')
+        self.httpd = ThreadingHTTPServer((host, port), WebhookRequestHandler)
+        self.httpd.webhook = self
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def enqueue(self, update: types.Update) -> bool:
+        """
+        Ставит апдейт в очередь. Возвращает False, если очередь заполнена.
+        """
+        if self.workers.submit(update):
+            return True
+        logger.warning(f'Очередь вебхука переполнена, апдейт {update.update_id} отклонён')
+        return False
+
+    def accept(self, data: dict) -> int:
+        """
+        Принимает апдейт из тела запроса. Возвращает HTTP-код ответа.
+        """
+        try:
+            update = types.Update.de_json(data)
+        except (ValueError, KeyError, TypeError):
+            return 400
+        return 200 if self.enqueue(update) else 503
+
+    def start(self) -> None:
+        """
+        Запускает обработчики и HTTP-сервер в фоновых потоках.
+        """
+        self.workers.start()
+        threading.Thread(target=self.httpd.serve_forever, name='webhook-http', daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Останавливает приём и дожидается обработки уже принятых апдейтов.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.workers.stop()
+
+
+class ShardedWebhookServer(WebhookServer):
+    """
+    Вебхук многопроцессного режима: апдейты не разбираются,
+    а передаются словарями в процессы-шарды (utils.sharding.ShardPool).
+    """
+
+    def __init__(self, pool, **kwargs) -> None:
+        super().__init__(workers=0, **kwargs)
+        self.pool = pool
+
+    def accept(self, data: dict) -> int:
+        if not isinstance(data, dict) or 'update_id' not in data:
+            return 400
+        if self.pool.submit(data, block=False):
+            return 200
+        logger.warning(f'Очередь шарда переполнена, апдейт {data["update_id"]} отклонён')
+        return 503
+
+
+def webhook_secret() -> str:
+    """
+    Возвращает секрет вебхука: WEBHOOK_SECRET или, если бот сам регистрирует
+    вебхук (задан WEBHOOK_URL), случайный. Без того и другого режим не запускается.
+    """
+    if WEBHOOK_SECRET:
+        return WEBHOOK_SECRET
+    if not WEBHOOK_URL:
+        raise SystemExit('Для режима вебхука задайте WEBHOOK_SECRET '
+                         '(или WEBHOOK_URL - тогда секрет создаётся при запуске)')
+    return secrets.token_urlsafe(32)
+
+
+def run_webhook(server_class: Type[WebhookServer] = WebhookServer, **kwargs) -> None:
+    """
+    Точка входа режима вебхука (python main.py --webhook).
+    kwargs передаются в конструктор server_class.
+    """
+    secret = webhook_secret()
+    server = server_class(secret=secret, **kwargs)
+    server.start()
+    if WEBHOOK_URL:
+        bot.set_webhook(url=WEBHOOK_URL, secret_token=secret)
+    logger.info(f'Вебхук слушает {WEBHOOK_HOST}:{server.port}{WEBHOOK_PATH}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()